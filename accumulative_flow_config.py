@@ -2,6 +2,8 @@
 Конфигурация для работы с накопительным потоком
 """
 
+from bisect import bisect_left
+
 # Таблица коэффициентов для накопительного потока
 # Ключ: кортеж (период_в_годах, сумма_вклада)
 # Значение: коэффициент умножения
@@ -76,10 +78,19 @@ AVAILABLE_PERIODS = [3, 5, 7, 10, 15, 20, 25]
 # Доступные суммы вкладов
 AVAILABLE_AMOUNTS = [1000, 2500, 5000, 10000, 25000, 50000, 100000]
 
+def get_closest_amount_index(amount: float) -> int:
+    """Индекс ближайшего доступного номинала (при равенстве - меньший). | Index of the closest available amount (the smaller one on a tie)."""
+    i = bisect_left(AVAILABLE_AMOUNTS, amount)
+    if i == 0:
+        return 0
+    if i == len(AVAILABLE_AMOUNTS):
+        return len(AVAILABLE_AMOUNTS) - 1
+    return i - 1 if amount - AVAILABLE_AMOUNTS[i - 1] <= AVAILABLE_AMOUNTS[i] - amount else i
+
 def get_multiplier(period: int, amount: float) -> float:
     """Получить коэффициент умножения для заданного периода и суммы. | Get the multiplier for the given period and amount."""
     # Округляем сумму до ближайшего доступного номинала
-    closest_amount = min(AVAILABLE_AMOUNTS, key=lambda x: abs(x - amount))
+    closest_amount = AVAILABLE_AMOUNTS[get_closest_amount_index(amount)]
     
     # Получаем коэффициент
-    return ACCUMULATIVE_FLOW_MULTIPLIERS.get((period, closest_amount), 0) 
\ No newline at end of file
+    return ACCUMULATIVE_FLOW_MULTIPLIERS.get((period, closest_amount), 0)
@@ -4,7 +4,7 @@
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 
 from config import CURRENCY_SYMBOLS
@@ -16,9 +16,11 @@ from accumulative_flow_keyboards import (
 )
 from accumulative_flow_utils import (
     calculate_accumulative_flow_data,
-    format_accumulative_flow_result
+    format_accumulative_flow_result,
+    format_accumulative_flow_comparison
 )
 from keyboards import get_simulators_menu
+from message_renderer import render_message
 
 # Создаем роутер для накопительного потока
 accumulative_flow_router = Router()
@@ -30,7 +32,8 @@ async def start_accumulative_flow(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(AccumulativeFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для Накопительного Потока:*\n\n"
         "*Select the currency for the Accumulation Flow:*\n\n"
         "👇👇👇",
@@ -49,7 +52,8 @@ async def process_accumulative_flow_currency_selection(callback: CallbackQuery,
     await state.update_data(currency=currency)
     await state.set_state(AccumulativeFlowState.entering_amount)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"Введите сумму Накопительного Потока\n\n"
         f"*Цифрами без пробелов от 1000 до 100000*\n\n"
         f"👇👇👇",
@@ -120,13 +124,36 @@ async def process_accumulative_flow_period_selection(callback: CallbackQuery, st
     # Формируем сообщение с результатом
     message_text = format_accumulative_flow_result(flow_data)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=get_accumulative_flow_control_keyboard(),
         parse_mode="Markdown"
     )
     await callback.answer()
 
+# Обработчик сравнения всех периодов накопительного потока
+@accumulative_flow_router.callback_query(
+    StateFilter(AccumulativeFlowState.selecting_period, AccumulativeFlowState.viewing_result),
+    F.data == "accflow_compare"
+)
+async def compare_accumulative_flow_periods(callback: CallbackQuery, state: FSMContext):
+    """Таблица результатов по всем периодам для введенной суммы. | Result table for all periods for the entered amount."""
+    data = await state.get_data()
+    currency = data.get("currency")
+    amount = data.get("amount")
+    
+    # Переходим к просмотру результата
+    await state.set_state(AccumulativeFlowState.viewing_result)
+    
+    await render_message(
+        callback,
+        format_accumulative_flow_comparison(currency, amount),
+        reply_markup=get_accumulative_flow_control_keyboard(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
 # Обработчик нажатия кнопки "Заново"
 @accumulative_flow_router.callback_query(F.data == "accflow_restart")
 async def restart_accumulative_flow(callback: CallbackQuery, state: FSMContext):
@@ -134,7 +161,8 @@ async def restart_accumulative_flow(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(AccumulativeFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для Накопительного Потока:*\n\n"
         "*Select the currency for the Accumulation Flow:*\n\n"
         "👇👇👇",
@@ -149,7 +177,8 @@ async def back_to_amount_input(callback: CallbackQuery, state: FSMContext):
     """Возврат к вводу суммы. | Return to the amount input."""
     await state.set_state(AccumulativeFlowState.entering_amount)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"Введите сумму Накопительного Потока\n\n"
         f"*Цифрами без пробелов от 1000 до 100000*\n\n"
         f"👇👇👇",
@@ -167,7 +196,8 @@ async def back_to_simulators(callback: CallbackQuery, state: FSMContext):
     """Возврат в меню симуляторов. | Return to the simulators menu."""
     await state.clear()
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите симулятор:*\n\n"
         "*Choose the simulator:*\n\n"
         "👇👇👇",
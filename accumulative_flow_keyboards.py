@@ -37,6 +37,11 @@ def get_accumulative_flow_period_keyboard() -> InlineKeyboardMarkup:
     if row:
         keyboard.inline_keyboard.append(row)
     
+    # Добавляем кнопку сравнения всех периодов
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text="📊 Сравнить все периоды | Compare all periods", callback_data="accflow_compare")
+    ])
+    
     # Добавляем кнопку "Назад"
     keyboard.inline_keyboard.append([
         InlineKeyboardButton(text="◀️ Назад | Back", callback_data="accflow_back_to_amount")
@@ -47,6 +52,9 @@ def get_accumulative_flow_period_keyboard() -> InlineKeyboardMarkup:
 def get_accumulative_flow_control_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для управления накопительным потоком после расчета. | Keyboard for managing the accumulative flow after calculation."""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="📊 Сравнить все периоды | Compare all periods", callback_data="accflow_compare")
+        ],
         [
             InlineKeyboardButton(text="🔄 Заново | Restart", callback_data="accflow_restart")
         ],
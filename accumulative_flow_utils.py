@@ -2,29 +2,86 @@
 Вспомогательные функции для работы с накопительным потоком
 """
 
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+import config
 from accumulative_flow_states import AccumulativeFlowData
-from accumulative_flow_config import get_multiplier
-from config import CURRENCY_SYMBOLS, ECR_BUY_RATE, CURRENCY_RATES, ECR_ACCUMULATIVE_BUY_RATE
-from currency_rates import get_ecr_count_for_amount
+from accumulative_flow_config import (
+    ACCUMULATIVE_FLOW_MULTIPLIERS,
+    AVAILABLE_PERIODS,
+    AVAILABLE_AMOUNTS,
+    get_closest_amount_index
+)
+from config import CURRENCY_SYMBOLS, ECR_BUY_RATE, ECR_ACCUMULATIVE_BUY_RATE
+
+# Индекс периода в таблице результатов
+_PERIOD_INDEX = {period: i for i, period in enumerate(AVAILABLE_PERIODS)}
+
+# Коэффициенты умножения в виде таблицы [период][номинал] (значения из конфигурации как есть)
+_MULTIPLIER_TABLE = tuple(
+    tuple(ACCUMULATIVE_FLOW_MULTIPLIERS.get((period, amount), 0) for amount in AVAILABLE_AMOUNTS)
+    for period in AVAILABLE_PERIODS
+)
+
+# Таблица результатов для текущего снимка курсов: {"snapshot": ключ курсов, "grid": таблица}
+_grid_cache = {"snapshot": None, "grid": None}
+
+def _get_rates_snapshot() -> Tuple:
+    """Ключ текущих курсов: при его изменении таблица пересчитывается. | Key of the current rates: the grid is recomputed when it changes."""
+    return tuple(config.CURRENCY_RATES.items()), config.ECR_ACCUMULATIVE_BUY_RATE
+
+def _build_accumulative_flow_grid(snapshot: Tuple) -> Dict[str, Any]:
+    """Расчет таблицы результатов для всех валют, периодов и номиналов. | Calculation of the result grid for all currencies, periods and amounts."""
+    rates, ecr_rate = snapshot
+    currencies = tuple(currency for currency, _ in rates)
+    
+    multipliers = np.array(_MULTIPLIER_TABLE, dtype=np.float64)             # [период, номинал]
+    rates_rub = np.array([rate for _, rate in rates], dtype=np.float64)      # [валюта]
+    months = np.array(AVAILABLE_PERIODS, dtype=np.float64) * 12              # [период]
+    
+    # Все величины считаются на единицу суммы вклада и масштабируются суммой при запросе:
+    # бонус в рублях = сумма * (КФ - 1) * курс, ECR = бонус в рублях / курс приема ECR
+    ecr_per_unit = (multipliers - 1)[np.newaxis, :, :] * rates_rub[:, np.newaxis, np.newaxis] / ecr_rate
+    
+    return {
+        "currency_index": {currency: i for i, currency in enumerate(currencies)},
+        "ecr_rate": ecr_rate,
+        "ecr_per_unit": ecr_per_unit,                                        # [валюта, период, номинал]
+        "input_per_unit": months,                                            # [период]
+        "output_per_unit": multipliers * months[:, np.newaxis],              # [период, номинал]
+    }
+
+def get_accumulative_flow_grid() -> Dict[str, Any]:
+    """Таблица результатов накопительного потока для текущих курсов. | Accumulative flow result grid for the current rates."""
+    snapshot = _get_rates_snapshot()
+    if _grid_cache["snapshot"] != snapshot:
+        _grid_cache["grid"] = _build_accumulative_flow_grid(snapshot)
+        _grid_cache["snapshot"] = snapshot
+    return _grid_cache["grid"]
 
 def calculate_accumulative_flow_data(currency: str, amount: float, period_years: int) -> Optional[AccumulativeFlowData]:
     """Расчет данных накопительного потока. | Calculation of the accumulative flow data."""
-    # Получаем коэффициент умножения
-    multiplier = get_multiplier(period_years, amount)
-    if not multiplier:
+    period_index = _PERIOD_INDEX.get(period_years)
+    if period_index is None:
         return None
     
-    # Конвертируем сумму в рубли для расчета ECR
-    amount_rub = amount * CURRENCY_RATES.get(currency, 1.0)
+    # Получаем коэффициент умножения для ближайшего доступного номинала
+    amount_index = get_closest_amount_index(amount)
+    multiplier = _MULTIPLIER_TABLE[period_index][amount_index]
+    if not multiplier:
+        return None
     
-    # Рассчитываем бонус (дополнительную сумму от умножения)
-    bonus_amount = amount * (multiplier - 1)
-    bonus_amount_rub = bonus_amount * CURRENCY_RATES.get(currency, 1.0)
+    grid = get_accumulative_flow_grid()
     
     # Рассчитываем количество необходимых ECR на основе бонуса
     # Используем специальный курс для накопительного потока
-    ecr_required = get_ecr_count_for_amount(bonus_amount_rub, is_accumulative=True)
+    currency_index = grid["currency_index"].get(currency)
+    if currency_index is not None:
+        ecr_per_unit = grid["ecr_per_unit"][currency_index, period_index, amount_index]
+    else:
+        ecr_per_unit = (multiplier - 1) / grid["ecr_rate"]
+    ecr_required = round(float(amount * ecr_per_unit), 2)
     
     # Создаем данные потока
     flow_data = AccumulativeFlowData(
@@ -36,22 +93,18 @@ def calculate_accumulative_flow_data(currency: str, amount: float, period_years:
         ecr_monthly=ecr_required  # Используем рассчитанное значение
     )
     
-    # Рассчитываем общую сумму вложений
-    # Ежемесячный взнос * количество месяцев
-    flow_data.total_input = flow_data.monthly_contribution * (period_years * 12)
+    # Общая сумма вложений: ежемесячный взнос * количество месяцев
+    flow_data.total_input = float(amount * grid["input_per_unit"][period_index])
     
-    # Рассчитываем общую сумму выплат
-    # Начальная сумма * коэффициент умножения
-    flow_data.total_output = flow_data.amount * flow_data.multiplier * (period_years * 12)
-    
-    print(f"Накопительный поток: сумма {amount} {currency}, множитель {multiplier}, необходимо ECR: {ecr_required:.2f}")
+    # Общая сумма выплат: начальная сумма * коэффициент умножения * количество месяцев
+    flow_data.total_output = float(amount * grid["output_per_unit"][period_index, amount_index])
     
     return flow_data
 
 def format_accumulative_flow_result(flow_data: AccumulativeFlowData) -> str:
     """Форматирование результата накопительного потока для вывода. | Formatting the accumulative flow result for output."""
     currency_symbol = CURRENCY_SYMBOLS[flow_data.currency]
-    period_text = f"{flow_data.period_years} {'год | year' if flow_data.period_years == 1 else 'года | years' if 2 <= flow_data.period_years <= 4 else 'лет | years'}"
+    period_text = _format_period(flow_data.period_years)
     
     # Рассчитываем ежемесячную выплату
     monthly_payment = flow_data.amount * flow_data.multiplier
@@ -71,4 +124,42 @@ def format_accumulative_flow_result(flow_data: AccumulativeFlowData) -> str:
     message += f"Итого отдадите: *{int(flow_data.total_input)}*{currency_symbol}, "
     message += f"а получите: *{int(flow_data.total_output)}*{currency_symbol}"
     
-    return message 
\ No newline at end of file
+    return message
+
+def _format_period(period_years: int) -> str:
+    """Период с подписью на двух языках. | Period with a bilingual label."""
+    return f"{period_years} {'год | year' if period_years == 1 else 'года | years' if 2 <= period_years <= 4 else 'лет | years'}"
+
+def _format_compact(value: float) -> str:
+    """Короткая запись суммы для таблицы: 36K, 1.09M, 1.5B. | Short amount notation for the table: 36K, 1.09M, 1.5B."""
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= limit:
+            return f"{value / limit:.3g}{suffix}"
+    return f"{value:.0f}"
+
+def format_accumulative_flow_comparison(currency: str, amount: float) -> str:
+    """Таблица сравнения всех периодов для суммы вклада. | Comparison table of all periods for the contribution amount."""
+    currency_symbol = CURRENCY_SYMBOLS[currency]
+    
+    # Таблица шириной 34 символа, чтобы не переносилась на экране телефона
+    # (выплата в месяц = сумма вклада * КФ, отдельной колонкой не показывается)
+    rows = []
+    for period_years in AVAILABLE_PERIODS:
+        flow_data = calculate_accumulative_flow_data(currency, amount, period_years)
+        if not flow_data:
+            continue
+        rows.append(
+            f"{period_years:>3} {'х' + str(flow_data.multiplier):<3} "
+            f"{flow_data.ecr_monthly:>8.2f} "
+            f"{_format_compact(flow_data.total_input):>8} "
+            f"{_format_compact(flow_data.total_output):>8}"
+        )
+    
+    message = f"СРАВНЕНИЕ ПЕРИОДОВ | PERIOD COMPARISON: *{amount}*{currency_symbol} ежемесячно | monthly\n\n"
+    message += "```\n"
+    message += f"{'Лет':>3} {'КФ':<3} {'ECR/мес':>8} {'Отдадите':>8} {'Получите':>8}\n"
+    message += "\n".join(rows)
+    message += "\n```\n"
+    message += f"Курс приема | Acceptance rate: 1 ECR = *{get_accumulative_flow_grid()['ecr_rate']:.2f}*{currency_symbol}"
+    
+    return message
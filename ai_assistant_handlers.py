@@ -6,15 +6,17 @@ import logging
 import asyncio
 import os
 import tempfile
+from typing import Awaitable, Callable, List, NamedTuple, Tuple, TypeVar, Union
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 
-from rag_system import RAGAssistant
 from keyboards import get_main_menu
-from audio_transcriber import AudioTranscriber
+from lazy_models import LazyModel
+from user_queue import UserQueue
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,25 +25,66 @@ logger = logging.getLogger(__name__)
 # Создаем роутер для AI-ассистента
 ai_assistant_router = Router()
 
+# Потоковый вывод ответов: сообщение появляется с первым фрагментом и дописывается по мере генерации
+ASSISTANT_STREAMING = os.getenv("ASSISTANT_STREAMING", "1") == "1"
+
+# Минимальный интервал между редактированиями сообщения при потоковом выводе (секунды)
+STREAM_EDIT_INTERVAL = 1.0
+
+# Сообщения, отправленные подряд, объединяются в один вопрос: сколько ждать продолжения серии
+# после первого сообщения (секунды) и сколько сообщений объединять не более
+ASSISTANT_COALESCE_WINDOW = float(os.getenv("ASSISTANT_COALESCE_WINDOW", "0.5"))
+ASSISTANT_COALESCE_MAX = int(os.getenv("ASSISTANT_COALESCE_MAX", "5"))
+
+# Ограничение длины ответа (лимит Telegram - 4096 символов)
+MAX_RESPONSE_LENGTH = 4000
+
 # Определяем состояния диалога
 class AssistantDialog(StatesGroup):
     waiting_for_question = State()
 
-# Инициализируем RAG-ассистента
-try:
-    assistant = RAGAssistant()
-    logger.info("RAG-ассистент успешно инициализирован")
-except Exception as e:
-    logger.error(f"Ошибка при инициализации RAG-ассистента: {e}")
-    assistant = None
-
-# Инициализируем транскрибер аудио
-try:
-    transcriber = AudioTranscriber(model_name="base")  # Используем модель 'base' для лучшего распознавания
-    logger.info("Транскрибер аудио успешно инициализирован")
-except Exception as e:
-    logger.error(f"Ошибка при инициализации транскрибера аудио: {e}")
-    transcriber = None
+# Тяжелые модули (PyTorch, SentenceTransformers, FAISS, Whisper) импортируются внутри фабрик,
+# чтобы импорт обработчиков не задерживал запуск бота
+def _create_assistant():
+    """Создает RAG-ассистента."""
+    from rag_system import RAGAssistant
+    return RAGAssistant()
+
+def _create_transcriber():
+    """Создает транскрибер аудио."""
+    from audio_transcriber import AudioTranscriber
+    return AudioTranscriber(model_name="base")  # Используем модель 'base' для лучшего распознавания
+
+# RAG-ассистент и транскрибер загружаются в фоне после запуска бота (или при первом обращении)
+# После загрузки ассистент отслеживает пересборку векторной БД и подхватывает ее без перезапуска
+assistant_holder = LazyModel("RAG-ассистент", _create_assistant,
+                             on_ready=lambda assistant: assistant.start_vector_db_watcher())
+transcriber_holder = LazyModel("Транскрибер аудио", _create_transcriber)
+
+async def warm_up_models():
+    """Загружает модели в фоне: сначала ассистента, затем Whisper."""
+    await assistant_holder.start()
+    await transcriber_holder.start()
+
+async def reply_if_not_ready(message: Message, holder: LazyModel, unavailable_text: str) -> bool:
+    """
+    Отвечает пользователю, если модель еще загружается или недоступна.
+    
+    Returns:
+        True, если ответ отправлен и обработку нужно прекратить
+    """
+    if holder.get() is not None:
+        return False
+    
+    if holder.is_failed:
+        await message.answer(unavailable_text, reply_markup=get_assistant_keyboard())
+    else:
+        await message.answer(
+            "⏳ AI-ассистент загружается после перезапуска. "
+            "Пожалуйста, повторите сообщение через несколько секунд.",
+            reply_markup=get_assistant_keyboard()
+        )
+    return True
 
 # Функция для генерации реферальной ссылки
 def generate_referral_link(user_id: int) -> str:
@@ -56,12 +99,95 @@ def get_assistant_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+def truncate_response(response: str) -> str:
+    """Обрезает ответ до допустимой длины сообщения Telegram."""
+    if len(response) > MAX_RESPONSE_LENGTH:
+        return response[:MAX_RESPONSE_LENGTH] + "...\n(ответ был сокращен из-за ограничений Telegram)"
+    return response
+
+T = TypeVar("T")
+
+async def call_after_flood_wait(request: Callable[[], Awaitable[T]]) -> T:
+    """Выполняет запрос к Telegram; при ограничении частоты ждет указанное время и повторяет запрос."""
+    try:
+        return await request()
+    except TelegramRetryAfter as e:
+        logger.warning(f"Telegram ограничил частоту запросов, повтор через {e.retry_after} с")
+        await asyncio.sleep(e.retry_after)
+        return await request()
+
+async def finalize_streamed_message(sent_message: Message, response: str):
+    """Окончательно оформляет ответ: разметка Markdown и клавиатура ассистента."""
+    # Gemini выделяет жирный текст как **текст**, а Markdown в Telegram - как *текст*
+    markdown_text = response.replace("**", "*")
+    try:
+        await call_after_flood_wait(lambda: sent_message.edit_text(
+            markdown_text, reply_markup=get_assistant_keyboard(), parse_mode="Markdown"
+        ))
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return
+        # Разметка не разобралась - оставляем обычный текст
+        await call_after_flood_wait(lambda: sent_message.edit_text(response, reply_markup=get_assistant_keyboard()))
+
+async def stream_answer(message: Message, question: str, user_info: dict, user_id: str) -> str:
+    """
+    Показывает ответ ассистента по мере генерации, редактируя одно сообщение.
+    
+    Args:
+        message: Сообщение пользователя
+        question: Вопрос пользователя
+        user_info: Информация о пользователе
+        user_id: Идентификатор пользователя для истории диалога
+        
+    Returns:
+        Окончательный ответ
+    """
+    assistant = assistant_holder.instance
+    loop = asyncio.get_running_loop()
+    sent_message = None
+    shown_text = ""
+    next_edit_time = 0.0
+    response = ""
+    
+    async for response in assistant.answer_query_stream(question, user_info, user_id):
+        text = truncate_response(response)
+        if not text.strip() or text == shown_text:
+            continue
+        
+        # Первый фрагмент показываем сразу, дальше редактируем не чаще STREAM_EDIT_INTERVAL
+        if loop.time() < next_edit_time:
+            continue
+        try:
+            if sent_message is None:
+                sent_message = await message.answer(text)
+            else:
+                await sent_message.edit_text(text)
+        except TelegramRetryAfter as e:
+            # Telegram просит подождать - пропускаем фрагменты до окончания паузы
+            next_edit_time = loop.time() + e.retry_after
+            continue
+        except TelegramBadRequest as e:
+            logger.warning(f"Не удалось обновить сообщение при потоковом выводе: {e}")
+        
+        shown_text = text
+        next_edit_time = loop.time() + STREAM_EDIT_INTERVAL
+    
+    final_text = truncate_response(response)
+    if sent_message is None:
+        sent_message = await call_after_flood_wait(lambda: message.answer(final_text))
+    await finalize_streamed_message(sent_message, final_text)
+    
+    return response
+
 # Обработчик команды /assistant
 @ai_assistant_router.message(Command("assistant"))
 async def start_assistant(message: Message, state: FSMContext):
     """Запускает диалог с AI-ассистентом"""
     
-    if not assistant:
+    # Приветствие не требует моделей: если они еще загружаются, вопрос придет позже
+    assistant_holder.get()
+    if assistant_holder.is_failed:
         await message.answer(
             "К сожалению, AI-ассистент временно недоступен. "
             "Пожалуйста, попробуйте позже или обратитесь к администратору."
@@ -94,7 +220,8 @@ async def start_assistant(message: Message, state: FSMContext):
 async def start_assistant_callback(callback: CallbackQuery, state: FSMContext):
     """Запускает диалог с AI-ассистентом при нажатии на кнопку"""
     
-    if not assistant:
+    assistant_holder.get()
+    if assistant_holder.is_failed:
         await callback.message.answer(
             "К сожалению, AI-ассистент временно недоступен. "
             "Пожалуйста, попробуйте позже или обратитесь к администратору."
@@ -145,150 +272,167 @@ async def exit_assistant_callback(callback: CallbackQuery, state: FSMContext):
     )
     await callback.answer()
 
-# Обработчик голосовых сообщений
-@ai_assistant_router.message(AssistantDialog.waiting_for_question, F.voice)
-async def process_voice_message(message: Message, state: FSMContext):
-    """Обрабатывает голосовое сообщение, транскрибирует его и отправляет запрос к AI-ассистенту"""
+class PendingQuestion(NamedTuple):
+    """Вопрос в очереди пользователя"""
     
-    if not assistant:
-        await message.answer(
-            "К сожалению, AI-ассистент временно недоступен. "
-            "Пожалуйста, попробуйте позже или обратитесь к администратору.",
-            reply_markup=get_assistant_keyboard()
-        )
-        return
+    message: Message
+    user_info: dict
+    # Текст вопроса или задача транскрибирования голосового сообщения
+    question: Union[str, "asyncio.Task[str]"]
+
+async def get_user_info(message: Message, state: FSMContext) -> Tuple[str, dict]:
+    """
+    Собирает контекст пользователя из состояния диалога.
     
-    if not transcriber:
-        await message.answer(
-            "К сожалению, обработка голосовых сообщений временно недоступна. "
-            "Пожалуйста, отправьте ваш вопрос текстом.",
-            reply_markup=get_assistant_keyboard()
-        )
-        return
+    Returns:
+        Идентификатор пользователя для истории диалога и информация о пользователе
+    """
+    data = await state.get_data()
+    user_data = data.get("user_data", {})
     
-    # Отправляем индикатор набора текста
-    await message.bot.send_chat_action(message.chat.id, "typing")
+    # Получаем идентификатор пользователя для отслеживания истории диалога
+    user_id = user_data.get("user_id", str(message.from_user.id))
     
+    user_info = {
+        "name": user_data.get("user_name", message.from_user.first_name if message.from_user else "Участник"),
+        "id": user_id,
+        "referral_link": user_data.get("referral_link", generate_referral_link(int(user_id))),
+        "language": message.from_user.language_code if message.from_user else None
+    }
+    return user_id, user_info
+
+async def transcribe_voice(message: Message, transcriber) -> str:
+    """Скачивает голосовое сообщение и транскрибирует его."""
+    voice = await message.bot.get_file(message.voice.file_id)
+    voice_path = os.path.join(tempfile.gettempdir(), f"{voice.file_id}.oga")
     try:
-        # Скачиваем голосовое сообщение
-        voice = await message.bot.get_file(message.voice.file_id)
-        voice_path = os.path.join(tempfile.gettempdir(), f"{voice.file_id}.oga")
         await message.bot.download_file(voice.file_path, destination=voice_path)
         
         # Отправляем сообщение о начале транскрибирования
         processing_msg = await message.answer("🎤 Обрабатываю голосовое сообщение...")
-        
-        # Транскрибируем аудио
         transcribed_text = await transcriber.transcribe_audio(voice_path)
         
+        # Удаляем сообщение о обработке
+        await message.bot.delete_message(chat_id=message.chat.id, message_id=processing_msg.message_id)
+        return transcribed_text
+    finally:
         # Удаляем временный файл
         try:
             os.unlink(voice_path)
-        except:
+        except OSError:
             pass
+
+async def answer_questions(user_id: str, items: List[PendingQuestion]):
+    """
+    Отвечает на вопросы пользователя из очереди (вызывается последовательно для каждого пользователя).
+    
+    Несколько сообщений, отправленных подряд, объединяются в один вопрос и получают один ответ.
+    
+    Args:
+        user_id: Идентификатор пользователя
+        items: Вопросы в порядке поступления
+    """
+    assistant = assistant_holder.instance
+    
+    questions = []
+    for item in items:
+        if isinstance(item.question, str):
+            questions.append(item.question)
+            continue
+        try:
+            questions.append(await item.question)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке голосового сообщения: {e}")
+            await item.message.answer(
+                "Извините, произошла ошибка при обработке голосового сообщения. "
+                "Пожалуйста, попробуйте отправить ваш вопрос текстом.",
+                reply_markup=get_assistant_keyboard()
+            )
+    
+    if not questions:
+        return
+    
+    # Отвечаем на последнее сообщение серии с актуальным контекстом пользователя
+    message, user_info = items[-1].message, items[-1].user_info
+    question = "\n".join(questions)
+    if len(questions) > 1:
+        logger.info(f"Сообщения пользователя {user_id} объединены в один вопрос: {len(questions)}")
+    
+    # Отправляем индикатор набора текста
+    await message.bot.send_chat_action(message.chat.id, "typing")
+    
+    try:
+        # Потоковый режим: пользователь видит ответ с первого фрагмента
+        if ASSISTANT_STREAMING:
+            response = await stream_answer(message, question, user_info, user_id)
+        else:
+            # Получаем ответ от RAG-системы (повторные попытки и circuit breaker - в бэкенде LLM)
+            response = await assistant.answer_query_async(
+                question,
+                user_info,
+                user_id  # Передаем user_id для отслеживания истории диалога
+            )
+            
+            # Ставим разумный лимит на длину ответа
+            response = truncate_response(response)
+            
+            # Отправляем ответ пользователю
+            await message.answer(response, reply_markup=get_assistant_keyboard())
         
-        # Удаляем сообщение о обработке
-        await message.bot.delete_message(chat_id=message.chat.id, message_id=processing_msg.message_id)
-        
-        # Получаем данные пользователя из состояния
-        data = await state.get_data()
-        user_data = data.get("user_data", {})
-        
-        # Получаем идентификатор пользователя для отслеживания истории диалога
-        user_id = user_data.get("user_id", str(message.from_user.id))
-        
-        # Создаем контекст пользователя
-        user_info = {
-            "name": user_data.get("user_name", message.from_user.first_name if message.from_user else "Участник"),
-            "id": user_id,
-            "referral_link": user_data.get("referral_link", generate_referral_link(int(user_id)))
-        }
-        
-        # Отправляем индикатор набора текста
-        await message.bot.send_chat_action(message.chat.id, "typing")
-        
-        # Максимальное количество попыток получить ответ
-        max_attempts = 2
-        current_attempt = 0
-        
-        while current_attempt < max_attempts:
-            try:
-                # Получаем ответ от RAG-системы (используем asyncio чтобы не блокировать бота)
-                response = await asyncio.to_thread(
-                    assistant.answer_query, 
-                    transcribed_text, 
-                    user_info,
-                    user_id  # Передаем user_id для отслеживания истории диалога
-                )
-                
-                # Если получили сообщение об ошибке от системы, пробуем еще раз
-                if "Извините, возникли технические проблемы" in response and current_attempt < max_attempts - 1:
-                    current_attempt += 1
-                    logger.warning(f"Получено сообщение об ошибке от RAG-системы. Попытка {current_attempt+1}")
-                    await message.bot.send_chat_action(message.chat.id, "typing")
-                    await asyncio.sleep(1.5)  # Небольшая пауза перед повторной попыткой
-                    continue
-                
-                # Ставим разумный лимит на длину ответа
-                max_length = 4000
-                if len(response) > max_length:
-                    response = response[:max_length] + "...\n(ответ был сокращен из-за ограничений Telegram)"
-                
-                # Отправляем ответ пользователю
-                await message.answer(response, reply_markup=get_assistant_keyboard())
-                
-                # Логируем запрос и ответ
-                logger.info(f"Запрос пользователя {user_id} (голосовое): {transcribed_text}")
-                logger.info(f"Ответ для пользователя {user_id}: {response[:100]}...")
-                
-                # Если успешно получили ответ, выходим из цикла
-                break
-                
-            except Exception as e:
-                current_attempt += 1
-                error_msg = str(e) if str(e) else "Неизвестная ошибка"
-                logger.error(f"Ошибка при обработке запроса (попытка {current_attempt}/{max_attempts}): {error_msg}")
-                
-                # Если это не последняя попытка, пробуем еще раз
-                if current_attempt < max_attempts:
-                    await message.bot.send_chat_action(message.chat.id, "typing")
-                    await asyncio.sleep(1.5)  # Пауза перед повторной попыткой
-                    continue
-                
-                # Если все попытки исчерпаны, отправляем сообщение об ошибке
-                await message.answer(
-                    "Извините, произошла ошибка при обработке вашего запроса. "
-                    "Пожалуйста, попробуйте еще раз через несколько секунд.",
-                    reply_markup=get_assistant_keyboard()
-                )
-                break
+        # Логируем запрос и ответ
+        logger.info(f"Запрос пользователя {user_id}: {question}")
+        logger.info(f"Ответ для пользователя {user_id}: {response[:100]}...")
         
     except Exception as e:
-        logger.error(f"Ошибка при обработке голосового сообщения: {e}")
+        logger.error(f"Ошибка при обработке запроса: {e}")
         await message.answer(
-            "Извините, произошла ошибка при обработке голосового сообщения. "
-            "Пожалуйста, попробуйте отправить ваш вопрос текстом.",
+            "Извините, произошла ошибка при обработке вашего запроса. "
+            "Пожалуйста, попробуйте еще раз через несколько секунд.",
             reply_markup=get_assistant_keyboard()
         )
-        
-        # Удаляем временный файл в случае ошибки
-        if 'voice_path' in locals():
-            try:
-                os.unlink(voice_path)
-            except:
-                pass
+
+# Очереди вопросов: вопросы одного пользователя - по порядку, разных пользователей - параллельно
+question_queue = UserQueue(answer_questions, ASSISTANT_COALESCE_WINDOW, ASSISTANT_COALESCE_MAX)
+
+# Обработчик голосовых сообщений
+@ai_assistant_router.message(AssistantDialog.waiting_for_question, F.voice)
+async def process_voice_message(message: Message, state: FSMContext):
+    """Обрабатывает голосовое сообщение, транскрибирует его и отправляет запрос к AI-ассистенту"""
+    
+    if await reply_if_not_ready(
+        message, assistant_holder,
+        "К сожалению, AI-ассистент временно недоступен. "
+        "Пожалуйста, попробуйте позже или обратитесь к администратору."
+    ):
+        return
+    
+    if await reply_if_not_ready(
+        message, transcriber_holder,
+        "К сожалению, обработка голосовых сообщений временно недоступна. "
+        "Пожалуйста, отправьте ваш вопрос текстом."
+    ):
+        return
+    
+    # Отправляем индикатор набора текста
+    await message.bot.send_chat_action(message.chat.id, "typing")
+    
+    user_id, user_info = await get_user_info(message, state)
+    
+    # Транскрибирование начинается сразу, а место в очереди пользователя занимается
+    # в момент получения сообщения - порядок вопросов сохраняется
+    transcription = asyncio.create_task(transcribe_voice(message, transcriber_holder.instance))
+    await question_queue.submit(user_id, PendingQuestion(message, user_info, transcription))
 
 # Обработчик вопросов к ассистенту
 @ai_assistant_router.message(AssistantDialog.waiting_for_question)
 async def process_question(message: Message, state: FSMContext):
     """Обрабатывает вопрос пользователя и отправляет ответ от AI-ассистента"""
     
-    if not assistant:
-        await message.answer(
-            "К сожалению, AI-ассистент временно недоступен. "
-            "Пожалуйста, попробуйте позже или обратитесь к администратору.",
-            reply_markup=get_assistant_keyboard()
-        )
+    if await reply_if_not_ready(
+        message, assistant_holder,
+        "К сожалению, AI-ассистент временно недоступен. "
+        "Пожалуйста, попробуйте позже или обратитесь к администратору."
+    ):
         return
     
     # Получаем текст вопроса
@@ -305,97 +449,19 @@ async def process_question(message: Message, state: FSMContext):
     # Отправляем индикатор набора текста
     await message.bot.send_chat_action(message.chat.id, "typing")
     
-    try:
-        # Получаем данные пользователя из состояния
-        data = await state.get_data()
-        user_data = data.get("user_data", {})
-        
-        # Получаем идентификатор пользователя для отслеживания истории диалога
-        user_id = user_data.get("user_id", str(message.from_user.id))
-        
-        # Создаем контекст пользователя
-        user_info = {
-            "name": user_data.get("user_name", message.from_user.first_name if message.from_user else "Участник"),
-            "id": user_id,
-            "referral_link": user_data.get("referral_link", generate_referral_link(int(user_id)))
-        }
-        
-        # Максимальное количество попыток получить ответ
-        max_attempts = 2
-        current_attempt = 0
-        
-        while current_attempt < max_attempts:
-            try:
-                # Получаем ответ от RAG-системы (используем asyncio чтобы не блокировать бота)
-                response = await asyncio.to_thread(
-                    assistant.answer_query, 
-                    question, 
-                    user_info,
-                    user_id  # Передаем user_id для отслеживания истории диалога
-                )
-                
-                # Если получили сообщение об ошибке от системы, пробуем еще раз
-                if "Извините, возникли технические проблемы" in response and current_attempt < max_attempts - 1:
-                    current_attempt += 1
-                    logger.warning(f"Получено сообщение об ошибке от RAG-системы. Попытка {current_attempt+1}")
-                    await message.bot.send_chat_action(message.chat.id, "typing")
-                    await asyncio.sleep(1.5)  # Небольшая пауза перед повторной попыткой
-                    continue
-                
-                # Ставим разумный лимит на длину ответа
-                max_length = 4000
-                if len(response) > max_length:
-                    response = response[:max_length] + "...\n(ответ был сокращен из-за ограничений Telegram)"
-                
-                # Отправляем ответ пользователю
-                await message.answer(response, reply_markup=get_assistant_keyboard())
-                
-                # Логируем запрос и ответ
-                logger.info(f"Запрос пользователя {user_id}: {question}")
-                logger.info(f"Ответ для пользователя {user_id}: {response[:100]}...")
-                
-                # Если успешно получили ответ, выходим из цикла
-                break
-                
-            except Exception as e:
-                current_attempt += 1
-                error_msg = str(e) if str(e) else "Неизвестная ошибка"
-                logger.error(f"Ошибка при обработке запроса (попытка {current_attempt}/{max_attempts}): {error_msg}")
-                
-                # Если это не последняя попытка, пробуем еще раз
-                if current_attempt < max_attempts:
-                    await message.bot.send_chat_action(message.chat.id, "typing")
-                    await asyncio.sleep(1.5)  # Пауза перед повторной попыткой
-                    continue
-                
-                # Если все попытки исчерпаны, отправляем сообщение об ошибке
-                await message.answer(
-                    "Извините, произошла ошибка при обработке вашего запроса. "
-                    "Пожалуйста, попробуйте еще раз через несколько секунд.",
-                    reply_markup=get_assistant_keyboard()
-                )
-                break
-                
-    except Exception as e:
-        logger.error(f"Ошибка при обработке запроса: {e}")
-        await message.answer(
-            "Извините, произошла ошибка при обработке вашего запроса. "
-            "Пожалуйста, попробуйте еще раз через несколько секунд.",
-            reply_markup=get_assistant_keyboard()
-        )
+    user_id, user_info = await get_user_info(message, state)
+    await question_queue.submit(user_id, PendingQuestion(message, user_info, question))
 
 # Обработчик команды для очистки истории диалога
 @ai_assistant_router.message(Command("clear_history"))
 async def clear_history(message: Message, state: FSMContext):
     """Очищает историю диалога с AI-ассистентом"""
     
-    if not assistant:
-        await message.answer(
-            "К сожалению, AI-ассистент временно недоступен.",
-            reply_markup=get_assistant_keyboard()
-        )
+    if await reply_if_not_ready(message, assistant_holder, "К сожалению, AI-ассистент временно недоступен."):
         return
     
+    assistant = assistant_holder.instance
+    
     # Получаем идентификатор пользователя
     user_id = str(message.from_user.id)
     
@@ -0,0 +1,154 @@
+"""
+Семантический кэш ответов AI-ассистента.
+
+Хранит пары (нормализованный эмбеддинг вопроса -> ответ, id найденных чанков) и
+возвращает готовый ответ, если новый вопрос достаточно близок по косинусному сходству
+к уже отвеченному.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """Кэш ответов с поиском по косинусному сходству эмбеддингов вопросов"""
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 24 * 3600, max_size: int = 1000):
+        """
+        Инициализирует кэш.
+
+        Args:
+            threshold: Минимальное косинусное сходство вопросов для попадания в кэш
+            ttl: Время жизни записи в секундах
+            max_size: Максимальное количество записей (самые старые вытесняются)
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # id записи -> {"embedding", "answer", "doc_ids", "created"}; порядок - от старых к новым
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+
+        # Матрица эмбеддингов всех записей для поиска одним умножением (пересобирается при изменениях)
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+        # Версия векторной БД, для которой получены ответы
+        self.index_version: Optional[str] = None
+
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        """Возвращает нормализованную копию эмбеддинга."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_version(self, index_version: Optional[str]):
+        """Сбрасывает кэш, если векторная БД была пересобрана."""
+        if index_version != self.index_version:
+            if self.entries:
+                logger.info("Векторная БД изменилась, семантический кэш ответов очищен")
+                self.stats["invalidations"] += 1
+            self.clear()
+            self.index_version = index_version
+
+    def _remove_expired(self):
+        """Удаляет устаревшие записи (они лежат в начале словаря)."""
+        now = time.time()
+        while self.entries:
+            entry_id, entry = next(iter(self.entries.items()))
+            if now - entry["created"] < self.ttl:
+                break
+            del self.entries[entry_id]
+            self._matrix = None
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        """Возвращает матрицу эмбеддингов записей."""
+        if self._matrix is None and self.entries:
+            self._matrix_ids = list(self.entries.keys())
+            self._matrix = np.stack([self.entries[entry_id]["embedding"] for entry_id in self._matrix_ids])
+        return self._matrix
+
+    def lookup(self, embedding: np.ndarray, index_version: Optional[str] = None,
+               threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ищет ответ на похожий вопрос.
+
+        Args:
+            embedding: Эмбеддинг нового вопроса
+            index_version: Текущая версия векторной БД
+            threshold: Порог сходства вместо self.threshold (например, ниже - когда LLM недоступен)
+
+        Returns:
+            Запись кэша ({"answer", "doc_ids", "similarity"}) или None
+        """
+        self._check_version(index_version)
+        self._remove_expired()
+
+        matrix = self._get_matrix()
+        if matrix is None:
+            self.stats["misses"] += 1
+            return None
+
+        similarities = matrix @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+
+        if similarity < (self.threshold if threshold is None else threshold):
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        entry = self.entries[self._matrix_ids[best]]
+        return {"answer": entry["answer"], "doc_ids": entry["doc_ids"], "similarity": similarity}
+
+    def store(self, embedding: np.ndarray, answer: str, doc_ids: List[Any], index_version: Optional[str] = None):
+        """
+        Сохраняет ответ на вопрос.
+
+        Args:
+            embedding: Эмбеддинг вопроса
+            answer: Ответ
+            doc_ids: Идентификаторы чанков, на основе которых получен ответ
+            index_version: Версия векторной БД
+        """
+        self._check_version(index_version)
+
+        self.entries[self._next_id] = {
+            "embedding": self._normalize(embedding),
+            "answer": answer,
+            "doc_ids": list(doc_ids),
+            "created": time.time(),
+        }
+        self._next_id += 1
+        self.stats["stores"] += 1
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+        self._matrix = None
+
+    def clear(self):
+        """Очищает кэш."""
+        self.entries.clear()
+        self._matrix = None
+        self._matrix_ids = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики кэша, включая долю попаданий."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self.entries),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
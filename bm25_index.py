@@ -0,0 +1,251 @@
+"""
+Лексический индекс BM25 для гибридного поиска по базе знаний.
+
+Дополняет векторный поиск: модель all-MiniLM-L6-v2 обучена в основном на английском,
+поэтому запросы с ключевыми словами (ECR, AML, имена) плохо находятся по эмбеддингам.
+Результаты двух поисков объединяются методом reciprocal rank fusion (RRF).
+
+Индекс хранится в векторной БД в виде массивов .npy (инвертированный индекс в формате CSR),
+которые открываются через mmap, и словаря терминов в JSON.
+
+Использование:
+    python bm25_index.py build       # построить индекс по текущей векторной БД
+    python bm25_index.py benchmark   # сравнить dense, BM25 и гибридный поиск
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Файлы индекса в директории векторной БД
+BM25_VOCAB_FILE = "bm25_vocab.json"
+BM25_TERM_OFFSETS_FILE = "bm25_term_offsets.npy"
+BM25_DOC_IDS_FILE = "bm25_doc_ids.npy"
+BM25_TERM_FREQS_FILE = "bm25_term_freqs.npy"
+BM25_DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+
+# Параметры BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Константа RRF: чем больше, тем меньше вес первых позиций
+RRF_K = 60
+
+# Длина основы слова: грубая замена стемминга для русского языка (окончания отбрасываются)
+STEM_LENGTH = 6
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на термины: нижний регистр, ё -> е, основа из первых STEM_LENGTH символов."""
+    text = text.lower().replace("ё", "е")
+    return [token[:STEM_LENGTH] for token in TOKEN_PATTERN.findall(text) if len(token) > 1 or token.isdigit()]
+
+class BM25Index:
+    """Инвертированный индекс с ранжированием BM25"""
+
+    def __init__(self, vocab: Dict[str, int], term_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray):
+        """
+        Инициализирует индекс из готовых массивов.
+
+        Args:
+            vocab: Термин -> номер термина
+            term_offsets: Границы списков документов каждого термина (длина len(vocab) + 1)
+            doc_ids: Номера документов всех терминов подряд
+            term_freqs: Частоты термина в документах (параллельно doc_ids)
+            doc_lengths: Длины документов в терминах
+        """
+        self.vocab = vocab
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+
+        self.n_docs = len(doc_lengths)
+        self.avg_doc_length = float(np.mean(doc_lengths)) if self.n_docs else 0.0
+
+        # Нормировка длины документа не зависит от запроса - считаем один раз
+        self._length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(doc_lengths, dtype=np.float32)
+                                        / max(self.avg_doc_length, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        """Строит индекс по текстам чанков."""
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, freq))
+
+        term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for term_id, term_postings in enumerate(postings):
+            term_offsets[term_id + 1] = term_offsets[term_id] + len(term_postings)
+
+        doc_ids = np.fromiter((doc_id for p in postings for doc_id, _ in p), dtype=np.int32, count=int(term_offsets[-1]))
+        term_freqs = np.fromiter((freq for p in postings for _, freq in p), dtype=np.float32, count=int(term_offsets[-1]))
+
+        return cls(vocab, term_offsets, doc_ids, term_freqs, doc_lengths)
+
+    def save(self, directory: str):
+        """Сохраняет индекс в директорию векторной БД."""
+        with open(os.path.join(directory, BM25_VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        for file_name, array in (
+            (BM25_TERM_OFFSETS_FILE, self.term_offsets),
+            (BM25_DOC_IDS_FILE, self.doc_ids),
+            (BM25_TERM_FREQS_FILE, self.term_freqs),
+            (BM25_DOC_LENGTHS_FILE, self.doc_lengths),
+        ):
+            with open(os.path.join(directory, file_name), "wb") as f:
+                np.save(f, array)
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """Открывает индекс (массивы отображаются в память)."""
+        with open(os.path.join(directory, BM25_VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(
+            vocab,
+            np.load(os.path.join(directory, BM25_TERM_OFFSETS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, BM25_DOC_IDS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, BM25_TERM_FREQS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, BM25_DOC_LENGTHS_FILE), mmap_mode="r"),
+        )
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """Проверяет, построен ли индекс в директории."""
+        return os.path.exists(os.path.join(directory, BM25_VOCAB_FILE))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Ищет документы по запросу.
+
+        Args:
+            query: Текст запроса
+            k: Количество результатов
+
+        Returns:
+            Список (номер документа, оценка BM25) по убыванию оценки
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+
+            doc_freq = end - start
+            idf = np.log(1 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Объединяет несколько ранжированных списков документов методом RRF.
+
+    Args:
+        rankings: Списки номеров документов, каждый - по убыванию релевантности
+        k: Константа RRF
+
+    Returns:
+        Список (номер документа, оценка RRF) по убыванию оценки
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+# Запросы для оценки качества поиска: запрос -> документы базы знаний, в которых есть ответ
+BENCHMARK_QUERIES = {
+    "Что такое AML политика?": ("AML_Policy",),
+    "Как проект проверяет источник средств и борется с отмыванием денег?": ("AML_Policy",),
+    "Когда основан проект?": ("About_Project", "FAQ"),
+    "Кто основатель проекта?": ("About_Project", "FAQ"),
+    "Какие преимущества у платформы?": ("Advantages",),
+    "Что такое ECR?": ("Crypto_Info", "About_Project", "Income_Streams"),
+    "Как купить криптовалюту?": ("Crypto_Info",),
+    "Как вывести деньги?": ("FAQ", "Income_Streams"),
+    "Какая минимальная сумма для старта?": ("FAQ", "About_Project", "Income_Streams"),
+    "Какие есть потоки дохода?": ("Income_Streams",),
+    "Чем отличается быстрый поток от растущего?": ("Income_Streams", "FAQ"),
+    "Какую стратегию инвестирования выбрать?": ("Investment_Strategies",),
+    "Это пирамида?": ("Objections",),
+    "Я боюсь потерять деньги": ("Objections", "FAQ"),
+}
+
+def benchmark(vector_db_path: str = "vector_db", k: int = 3):
+    """Сравнивает dense, BM25 и гибридный поиск: hit@k по документу-источнику, задержка и размер контекста."""
+    import faiss
+    from sentence_transformers import SentenceTransformer
+    from vector_store import ids_to_positions, load_chunk_ids, load_documents, load_index, resolve_generation_path
+
+    vector_db_path = resolve_generation_path(vector_db_path)
+    texts, metadatas = load_documents(vector_db_path)
+    index = load_index(vector_db_path)
+    chunk_ids = load_chunk_ids(vector_db_path)
+    bm25 = BM25Index.load(vector_db_path)
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+
+    def dense_search(query: str, n: int) -> List[int]:
+        embedding = np.ascontiguousarray(model.encode([query]), dtype=np.float32)
+        faiss.normalize_L2(embedding)
+        return [int(i) for i in ids_to_positions(chunk_ids, index.search(embedding, n)[1][0]) if i >= 0]
+
+    methods = {
+        "dense@5": lambda query: dense_search(query, 5),
+        f"dense@{k}": lambda query: dense_search(query, k),
+        f"bm25@{k}": lambda query: [doc_id for doc_id, _ in bm25.search(query, k)],
+        f"hybrid@{k}": lambda query: [doc_id for doc_id, _ in reciprocal_rank_fusion(
+            [dense_search(query, k * 4), [doc_id for doc_id, _ in bm25.search(query, k * 4)]])[:k]],
+    }
+
+    for name, search in methods.items():
+        hits, context_chars = 0, 0
+        started = time.perf_counter()
+        for query, sources in BENCHMARK_QUERIES.items():
+            doc_ids = search(query)
+            hits += any(metadatas[doc_id]["source"] in sources for doc_id in doc_ids)
+            context_chars += sum(len(texts[doc_id]) for doc_id in doc_ids)
+        latency_ms = (time.perf_counter() - started) / len(BENCHMARK_QUERIES) * 1000
+        print(f"{name:>10}: hit = {hits / len(BENCHMARK_QUERIES):.2f}, задержка = {latency_ms:.1f} мс, "
+              f"контекст = {context_chars / len(BENCHMARK_QUERIES):.0f} символов")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        from vector_store import load_documents, resolve_generation_path
+        vector_db_path = resolve_generation_path("vector_db")
+        BM25Index.build(list(load_documents(vector_db_path)[0])).save(vector_db_path)
+        print("Индекс BM25 построен")
+    elif command == "benchmark":
+        benchmark()
+    else:
+        print(__doc__)
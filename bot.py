@@ -1,6 +1,3 @@
-# Патч для исправления ошибки torch.get_default_device
-import whisper_patch
-
 import asyncio
 import logging
 from datetime import datetime
@@ -13,7 +10,7 @@ from config import BOT_TOKEN
 from handlers import router
 from fast_flow_handlers import fast_flow_router
 from middlewares import LoggingMiddleware, UserSavingMiddleware
-from ai_assistant_handlers import ai_assistant_router  # Новый импорт для AI-ассистента
+from ai_assistant_handlers import ai_assistant_router, warm_up_models  # Новый импорт для AI-ассистента
 from broadcast_handlers import broadcast_router, init_db  # Импорт для функционала рассылки
 
 # Импортируем функцию обновления курсов
@@ -94,6 +91,10 @@ async def main():
     if update_currency_rates:
         asyncio.create_task(update_currencies_periodically())
     
+    # Загружаем модели AI-ассистента в фоне: бот отвечает на команды, не дожидаясь их
+    # (патч whisper_patch применяется при загрузке транскрибера)
+    asyncio.create_task(warm_up_models())
+    
     # Запускаем бота
     logger.info("Starting bot")
     await dp.start_polling(bot)
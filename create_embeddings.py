@@ -1,17 +1,26 @@
 import os
 import glob
-from typing import List, Dict, Any
+import time
+import argparse
+from typing import List, Dict, Any, Iterable
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
-import pickle
 import json
 from tqdm import tqdm
+from bm25_index import BM25Index
+from vector_store import (
+    INDEX_FILE, INDEX_TYPES, MODEL_INFO_FILE, build_index, choose_index_type, chunk_id, load_chunk_ids,
+    load_index, new_generation_path, publish_generation, resolve_generation_path, supports_removal,
+    text_hash, write_chunk_ids, write_documents
+)
 
 # Пути к файлам
 KNOWLEDGE_DIR = "knowledge_base"
 OUTPUT_DIR = "vector_db"
 MODEL_NAME = "all-MiniLM-L6-v2"  # Модель для создания эмбеддингов
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")  # Тип FAISS-индекса: auto, flat, hnsw, ivf_flat, ivf_pq
+EMBEDDING_CACHE_FILE = "embedding_cache.npz"  # Кэш эмбеддингов чанков между запусками (по хэшу текста)
 
 # Создаем директорию для хранения векторной БД
 if not os.path.exists(OUTPUT_DIR):
@@ -48,8 +57,7 @@ def create_text_chunks(documents: Dict[str, str]) -> List[Dict[str, Any]]:
                     chunks.append({
                         "text": current_chunk,
                         "metadata": {
-                            "source": doc_name,
-                            "chunk_id": len(chunks)
+                            "source": doc_name
                         }
                     })
                     current_chunk = ""
@@ -68,8 +76,7 @@ def create_text_chunks(documents: Dict[str, str]) -> List[Dict[str, Any]]:
                         chunks.append({
                             "text": sentence_chunk,
                             "metadata": {
-                                "source": doc_name,
-                                "chunk_id": len(chunks)
+                                "source": doc_name
                             }
                         })
                         sentence_chunk = sentence
@@ -78,8 +85,7 @@ def create_text_chunks(documents: Dict[str, str]) -> List[Dict[str, Any]]:
                     chunks.append({
                         "text": sentence_chunk,
                         "metadata": {
-                            "source": doc_name,
-                            "chunk_id": len(chunks)
+                            "source": doc_name
                         }
                     })
             
@@ -96,8 +102,7 @@ def create_text_chunks(documents: Dict[str, str]) -> List[Dict[str, Any]]:
                 chunks.append({
                     "text": current_chunk,
                     "metadata": {
-                        "source": doc_name,
-                        "chunk_id": len(chunks)
+                        "source": doc_name
                     }
                 })
                 current_chunk = paragraph
@@ -108,51 +113,232 @@ def create_text_chunks(documents: Dict[str, str]) -> List[Dict[str, Any]]:
             chunks.append({
                 "text": current_chunk,
                 "metadata": {
-                    "source": doc_name,
-                    "chunk_id": len(chunks)
+                    "source": doc_name
                 }
             })
     
     return chunks
 
-def create_embeddings_and_save(chunks: List[Dict[str, Any]], output_dir: str, model_name: str = MODEL_NAME):
-    """Создает эмбеддинги с помощью SentenceTransformers и сохраняет их в FAISS."""
-    # Загружаем модель SentenceTransformers
-    model = SentenceTransformer(model_name)
+class EmbeddingCache:
+    """Кэш нормализованных эмбеддингов чанков на диске: хэш текста -> эмбеддинг"""
+    
+    def __init__(self, path: str, model_name: str):
+        """
+        Загружает кэш (кэш другой модели не используется).
+        
+        Args:
+            path: Путь к файлу кэша
+            model_name: Модель, которой созданы эмбеддинги
+        """
+        self.path = path
+        self.model_name = model_name
+        self.vectors: Dict[str, np.ndarray] = {}
+        
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if str(data["model_name"]) == model_name:
+                    self.vectors = dict(zip(data["keys"].astype(str), data["embeddings"]))
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.vectors
+    
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.vectors[key]
+    
+    def update(self, keys: List[str], embeddings: np.ndarray):
+        """Добавляет эмбеддинги в кэш."""
+        self.vectors.update(zip(keys, embeddings))
+    
+    def retain(self, keys: Iterable[str]):
+        """Оставляет в кэше только эмбеддинги текущих чанков."""
+        keys = set(keys)
+        self.vectors = {key: vector for key, vector in self.vectors.items() if key in keys}
+    
+    def save(self):
+        """Атомарно сохраняет кэш на диск."""
+        keys = list(self.vectors)
+        embeddings = np.stack([self.vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=np.array(keys, dtype="S40"), embeddings=embeddings, model_name=np.array(self.model_name))
+        os.replace(tmp_path, self.path)
+
+def create_embeddings_and_save(chunks: List[Dict[str, Any]], output_dir: str, model_name: str = MODEL_NAME,
+                               index_type: str = INDEX_TYPE, full_rebuild: bool = False):
+    """
+    Обновляет векторную БД: кодирует только новые и измененные чанки и записывает новое поколение.
+    
+    Чанки идентифицируются хэшем источника и текста. Эмбеддинги берутся из кэша на диске
+    (по хэшу текста), модель загружается, только если есть новые тексты. Если тип индекса
+    позволяет удаление, индекс предыдущего поколения обновляется: векторы удаленных чанков
+    удаляются, новых - добавляются; иначе индекс строится заново из эмбеддингов кэша.
+    
+    Args:
+        chunks: Чанки базы знаний
+        output_dir: Директория векторной БД
+        model_name: Модель SentenceTransformers
+        index_type: Тип индекса или "auto"
+        full_rebuild: Пересоздать все эмбеддинги и индекс, не используя кэш и предыдущее поколение
+    """
+    # Одинаковые чанки одного источника храним один раз; порядок - по возрастанию идентификатора
+    chunks_by_id = {}
+    for chunk in chunks:
+        chunks_by_id.setdefault(chunk_id(chunk["metadata"]["source"], chunk["text"]), chunk)
+    ids = np.array(sorted(chunks_by_id), dtype=np.int64)
     
     # Извлекаем тексты и метаданные
-    texts = [chunk["text"] for chunk in chunks]
-    metadatas = [chunk["metadata"] for chunk in chunks]
+    texts = [chunks_by_id[i]["text"] for i in ids]
+    # В метаданных - тот же идентификатор, что в FAISS-индексе (по нему ссылается кэш ответов)
+    metadatas = [{**chunks_by_id[i]["metadata"], "chunk_id": int(i)} for i in ids]
+    hashes = [text_hash(text) for text in texts]
+    
+    # Кодируем только тексты, которых нет в кэше
+    cache = EmbeddingCache(os.path.join(output_dir, EMBEDDING_CACHE_FILE), model_name)
+    if full_rebuild:
+        cache.retain(())
+    missing = {h: text for h, text in zip(hashes, texts) if h not in cache}
     
-    print(f"Создание эмбеддингов для {len(texts)} чанков...")
-    # Создаем эмбеддинги
-    embeddings = model.encode(texts, show_progress_bar=True)
+    print(f"Чанков: {len(texts)}, новых или измененных текстов: {len(missing)}")
+    if missing:
+        # Загружаем модель SentenceTransformers
+        model = SentenceTransformer(model_name)
+        embeddings = np.ascontiguousarray(model.encode(list(missing.values()), show_progress_bar=True), dtype=np.float32)
+        # Нормализуем для косинусного сходства (скалярное произведение нормализованных векторов)
+        faiss.normalize_L2(embeddings)
+        cache.update(list(missing), embeddings)
+    
+    embeddings = np.ascontiguousarray(np.stack([cache[h] for h in hashes]), dtype=np.float32)
+    cache.retain(hashes)
+    cache.save()
     
-    # Создаем FAISS индекс
     dimension = embeddings.shape[1]  # Размерность эмбеддингов
-    index = faiss.IndexFlatL2(dimension)  # Используем L2 расстояние (евклидово)
+    if index_type == "auto":
+        index_type = choose_index_type(len(ids))
+    
+    # Предыдущее поколение векторной БД
+    previous_path = resolve_generation_path(output_dir)
+    previous_ids = load_chunk_ids(previous_path)
+    previous_info = {}
+    if os.path.exists(os.path.join(previous_path, MODEL_INFO_FILE)):
+        with open(os.path.join(previous_path, MODEL_INFO_FILE), "r") as f:
+            previous_info = json.load(f)
+    
+    can_update = (
+        not full_rebuild
+        and previous_ids is not None
+        and previous_info.get("model_name") == model_name
+        and previous_info.get("index_type") == index_type
+        and supports_removal(index_type)
+    )
     
-    # Добавляем эмбеддинги в индекс
-    faiss.normalize_L2(embeddings)  # Нормализуем для косинусного сходства
-    index = faiss.IndexFlatIP(dimension)  # Используем скалярное произведение для нормализованных векторов
-    index.add(embeddings)
+    if can_update:
+        # Обновляем индекс предыдущего поколения (читаем целиком: отображенный в память индекс только для чтения)
+        index = faiss.read_index(os.path.join(previous_path, INDEX_FILE))
+        index_params = previous_info.get("index_params", {})
+        
+        removed = np.setdiff1d(previous_ids, ids)
+        added = np.isin(ids, previous_ids, invert=True)
+        if len(removed):
+            index.remove_ids(removed)
+        if added.any():
+            index.add_with_ids(embeddings[added], ids[added])
+        print(f"Индекс обновлен: удалено {len(removed)}, добавлено {int(added.sum())} векторов")
+    else:
+        # Создаем FAISS индекс (тип выбирается по размеру корпуса, если не задан явно)
+        index, index_type, index_params = build_index(embeddings, index_type, ids=ids)
+        print("Индекс построен заново")
+    
+    # Записываем новое поколение и атомарно переключаемся на него
+    generation_path = new_generation_path(output_dir)
     
     # Сохраняем индекс
-    faiss.write_index(index, os.path.join(output_dir, "faiss_index.bin"))
+    faiss.write_index(index, os.path.join(generation_path, INDEX_FILE))
+    
+    # Сохраняем тексты, метаданные и идентификаторы (формат для отображения в память, без pickle)
+    write_documents(generation_path, texts, metadatas)
+    write_chunk_ids(generation_path, ids)
+    
+    # Строим лексический индекс BM25 для гибридного поиска
+    BM25Index.build(texts).save(generation_path)
     
-    # Сохраняем тексты и метаданные
-    with open(os.path.join(output_dir, "documents.pkl"), "wb") as f:
-        pickle.dump({"texts": texts, "metadatas": metadatas}, f)
+    # Сохраняем информацию о модели и индексе
+    with open(os.path.join(generation_path, MODEL_INFO_FILE), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "dimension": dimension,
+            "index_type": index_type,
+            "index_params": index_params,
+            "id_mapped": True
+        }, f)
     
-    # Сохраняем информацию о модели
-    with open(os.path.join(output_dir, "model_info.json"), "w") as f:
-        json.dump({"model_name": model_name, "dimension": dimension}, f)
+    publish_generation(output_dir, generation_path)
     
-    print(f"Векторная БД успешно создана и сохранена в {output_dir}")
-    print(f"Всего чанков: {len(chunks)}")
+    print(f"Векторная БД успешно создана и сохранена в {generation_path}")
+    print(f"Всего чанков: {len(ids)}")
     print(f"Размерность эмбеддингов: {dimension}")
+    print(f"Тип индекса: {index_type} {index_params}")
+
+def benchmark_indexes(vector_db_path: str = OUTPUT_DIR, corpus_size: int = 50_000, n_queries: int = 200, k: int = 5):
+    """
+    Сравнивает типы индексов с точным поиском: recall@k, задержка запроса и время построения.
+    
+    Корпус состоит из эмбеддингов текущей базы знаний, дополненных синтетическими векторами
+    (шумовыми копиями реальных) до corpus_size, чтобы оценить поведение при росте базы.
+    Запросы - зашумленные эмбеддинги чанков базы знаний.
+    """
+    cache = EmbeddingCache(os.path.join(vector_db_path, EMBEDDING_CACHE_FILE), MODEL_NAME)
+    if cache.vectors:
+        base = np.stack(list(cache.vectors.values()))
+    else:
+        # Векторная БД без кэша эмбеддингов - восстанавливаем векторы из плоского индекса
+        flat = load_index(resolve_generation_path(vector_db_path))
+        base = flat.reconstruct_n(0, flat.ntotal)
+    rng = np.random.default_rng(42)
+    
+    def jitter(vectors: np.ndarray, scale: float) -> np.ndarray:
+        noisy = (vectors + rng.normal(scale=scale, size=vectors.shape)).astype(np.float32)
+        faiss.normalize_L2(noisy)
+        return noisy
+    
+    extra = max(0, corpus_size - len(base))
+    corpus = np.vstack([base, jitter(base[rng.integers(0, len(base), extra)], 0.3)]) if extra else base
+    queries = jitter(base[rng.integers(0, len(base), n_queries)], 0.1)
+    
+    print(f"Корпус: {len(corpus)} векторов, запросов: {n_queries}, k={k}")
+    
+    exact_ids = None
+    for index_type in INDEX_TYPES:
+        started = time.perf_counter()
+        index, _, params = build_index(corpus, index_type)
+        build_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        for query in queries:
+            _, ids = index.search(query[np.newaxis, :], k)
+        latency_ms = (time.perf_counter() - started) / n_queries * 1000
+        
+        _, ids = index.search(queries, k)
+        if exact_ids is None:
+            exact_ids = ids  # flat - точный поиск, эталон для остальных
+        recall = np.mean([len(set(found) & set(exact)) / k for found, exact in zip(ids, exact_ids)])
+        
+        print(f"{index_type:>9}: recall@{k} = {recall:.3f}, задержка = {latency_ms:.3f} мс, "
+              f"построение = {build_seconds:.1f} с, параметры = {params}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Создание векторной БД базы знаний")
+    parser.add_argument("--index-type", default=INDEX_TYPE, choices=("auto",) + INDEX_TYPES,
+                        help="Тип FAISS-индекса (auto - выбор по размеру корпуса)")
+    parser.add_argument("--benchmark", type=int, metavar="CORPUS_SIZE",
+                        help="Сравнить типы индексов на корпусе заданного размера вместо создания БД")
+    parser.add_argument("--full", action="store_true",
+                        help="Пересоздать все эмбеддинги и индекс, не используя кэш")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark_indexes(corpus_size=args.benchmark)
+        return
+    
     # Загружаем документы
     print("Загрузка документов...")
     documents = load_documents(KNOWLEDGE_DIR)
@@ -165,7 +351,7 @@ def main():
     
     # Создаем эмбеддинги и сохраняем в БД
     print("Создание эмбеддингов и сохранение в векторную БД...")
-    create_embeddings_and_save(chunks, OUTPUT_DIR)
+    create_embeddings_and_save(chunks, OUTPUT_DIR, index_type=args.index_type, full_rebuild=args.full)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
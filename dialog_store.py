@@ -0,0 +1,410 @@
+"""
+Хранилище историй диалогов AI-ассистента с ограничением памяти.
+
+История каждого пользователя - кольцевой буфер (deque с maxlen) из последних сообщений.
+Общий объем историй в памяти ограничен DIALOG_STORE_MAX_BYTES: при превышении
+вытесняются истории пользователей, которые дольше всех не писали (LRU).
+По желанию (DIALOG_DB_PATH) сообщения сохраняются в SQLite - история переживает
+перезапуск бота, а вытесненная из памяти история загружается заново при следующем вопросе.
+Запись в SQLite выполняет отдельный поток (накопившиеся операции - одной транзакцией),
+поэтому добавление сообщения не ждет диска и не блокирует цикл событий.
+
+Все операции с памятью защищены одной блокировкой: ответы могут формироваться в рабочих потоках.
+Загрузка истории из SQLite идет вне этой блокировки и не задерживает других пользователей.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Количество взаимодействий (вопрос + ответ) в истории одного пользователя
+DIALOG_MAX_HISTORY = int(os.getenv("DIALOG_MAX_HISTORY", "5"))
+
+# Максимальный общий объем историй в памяти (байты текста сообщений с накладными расходами)
+DIALOG_STORE_MAX_BYTES = int(os.getenv("DIALOG_STORE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Файл SQLite для сохранения историй (пустая строка - хранить только в памяти)
+DIALOG_DB_PATH = os.getenv("DIALOG_DB_PATH", "")
+
+# Оценка накладных расходов на одно сообщение (словарь, строки, элемент deque)
+MESSAGE_OVERHEAD_BYTES = 256
+
+def message_size(message: Dict[str, str]) -> int:
+    """Оценивает объем сообщения истории в памяти."""
+    return len(message["content"].encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+class DialogHistory:
+    """Класс для управления историей диалога с пользователем"""
+
+    def __init__(self, max_history: int = DIALOG_MAX_HISTORY, messages: Iterable[Dict[str, str]] = (),
+                 user_id: Optional[str] = None, store: Optional["DialogStore"] = None):
+        """
+        Инициализирует историю диалога.
+
+        Args:
+            max_history: Максимальное количество взаимодействий (вопрос + ответ) в истории
+            messages: Начальные сообщения (например, загруженные из SQLite)
+            user_id: Идентификатор пользователя
+            store: Хранилище, которое учитывает объем истории и сохраняет сообщения
+        """
+        self.max_history = max_history
+        self.user_id = user_id
+        self.store = store
+        self._lock = store.lock if store else threading.RLock()
+
+        # * 2, так как каждое взаимодействие - это 2 сообщения; старые вытесняются самим deque
+        self._messages: deque = deque(messages, maxlen=max_history * 2)
+        self.size_bytes = sum(message_size(message) for message in self._messages)
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """Копия сообщений истории (от старых к новым)."""
+        with self._lock:
+            return list(self._messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add_message(self, role: str, content: str):
+        """
+        Добавляет сообщение в историю.
+
+        Args:
+            role: Роль отправителя сообщения ('user' или 'assistant')
+            content: Содержание сообщения
+        """
+        self.add_messages([{"role": role, "content": content}])
+
+    def add_exchange(self, query: str, answer: str):
+        """
+        Добавляет вопрос пользователя и ответ ассистента одной операцией.
+
+        Args:
+            query: Вопрос пользователя
+            answer: Ответ ассистента
+        """
+        self.add_messages([{"role": "user", "content": query}, {"role": "assistant", "content": answer}])
+
+    def add_messages(self, messages: List[Dict[str, str]]):
+        """Добавляет сообщения, пересчитывает объем и сообщает хранилищу."""
+        with self._lock:
+            delta_bytes = self._append(messages)
+            if self.store:
+                self.store._on_messages_added(self, messages, delta_bytes)
+
+    def _append(self, messages: List[Dict[str, str]]) -> int:
+        """Дописывает сообщения в буфер (без уведомления хранилища) и возвращает изменение объема."""
+        old_size = self.size_bytes
+        for message in messages:
+            if len(self._messages) == self._messages.maxlen:
+                self.size_bytes -= message_size(self._messages[0])
+            self._messages.append(message)
+            self.size_bytes += message_size(message)
+        return self.size_bytes - old_size
+
+    def clear(self):
+        """Удаляет все сообщения истории (только в памяти)."""
+        with self._lock:
+            self._messages.clear()
+            self.size_bytes = 0
+
+    def get_history_text(self) -> str:
+        """
+        Возвращает историю диалога в виде текста.
+
+        Returns:
+            Текст истории диалога
+        """
+        return "\n\n".join(
+            f"{'Пользователь: ' if message['role'] == 'user' else 'Ассистент: '}{message['content']}"
+            for message in self.messages
+        ).strip()
+
+class DialogStore:
+    """Истории диалогов всех пользователей с LRU-вытеснением по объему и сохранением в SQLite"""
+
+    def __init__(self, max_history: int = DIALOG_MAX_HISTORY, max_bytes: int = DIALOG_STORE_MAX_BYTES,
+                 db_path: Optional[str] = DIALOG_DB_PATH):
+        """
+        Инициализирует хранилище.
+
+        Args:
+            max_history: Максимальное количество взаимодействий в истории пользователя
+            max_bytes: Максимальный общий объем историй в памяти
+            db_path: Файл SQLite для сохранения историй (None или пустая строка - без сохранения)
+        """
+        self.max_history = max_history
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+
+        # id пользователя -> история; порядок - от давно не писавших к недавним
+        self.histories: "OrderedDict[str, DialogHistory]" = OrderedDict()
+        self.total_bytes = 0
+
+        self.stats = {"created": 0, "loaded": 0, "evictions": 0, "persist_errors": 0}
+
+        # Соединение для чтения (под своей блокировкой, не блокировкой хранилища); пишет только поток записи
+        self.conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+        # Количество незаписанных операций по пользователям (своя блокировка - ее берет поток записи);
+        # поток записи оповещает ожидающих загрузки истории после каждой транзакции
+        self._pending_writes: Counter = Counter()
+        self._pending_lock = threading.Lock()
+        self._writes_done = threading.Condition(self._pending_lock)
+
+        if db_path:
+            self._init_db(db_path)
+
+    @staticmethod
+    def _connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+        """Открывает соединение с базой SQLite в режиме WAL (чтение не ждет записи)."""
+        conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self, db_path: str):
+        """Создает таблицу сообщений и запускает поток записи."""
+        self.conn = self._connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS dialog_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_dialog_messages_user ON dialog_messages (user_id, id)")
+        self.conn.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, args=(db_path,), name="dialog-store-writer",
+                                        daemon=True)
+        self._writer.start()
+        # Поток записи - фоновый: при выходе из программы дописываем очередь
+        atexit.register(self.close)
+        logger.info(f"История диалогов сохраняется в {db_path}")
+
+    def _write_loop(self, db_path: str):
+        """Поток записи: выполняет накопившиеся операции одной транзакцией."""
+        conn = self._connect(db_path)
+        stop = False
+        while not stop:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            operations = [operation for operation in batch if operation is not None]
+
+            try:
+                for user_id, messages in operations:
+                    self._write(conn, user_id, messages)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка при сохранении историй диалогов: {e}")
+                conn.rollback()
+                with self._pending_lock:
+                    self.stats["persist_errors"] += 1
+            finally:
+                with self._pending_lock:
+                    for user_id, _ in operations:
+                        self._pending_writes[user_id] -= 1
+                        if self._pending_writes[user_id] <= 0:
+                            del self._pending_writes[user_id]
+                    self._writes_done.notify_all()
+                for _ in batch:
+                    self._writes.task_done()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, user_id: str, messages: Optional[List[Dict[str, str]]]):
+        """Сохраняет новые сообщения пользователя (None - удаляет историю) и обрезает историю в SQLite."""
+        if messages is None:
+            conn.execute("DELETE FROM dialog_messages WHERE user_id = ?", (user_id,))
+            return
+        conn.executemany(
+            "INSERT INTO dialog_messages (user_id, role, content) VALUES (?, ?, ?)",
+            [(user_id, message["role"], message["content"]) for message in messages]
+        )
+        conn.execute('''
+        DELETE FROM dialog_messages WHERE user_id = ? AND id NOT IN (
+            SELECT id FROM dialog_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?
+        )
+        ''', (user_id, user_id, self.max_history * 2))
+
+    def _has_pending_writes(self, user_id: str) -> bool:
+        """Проверяет, есть ли незаписанные операции пользователя."""
+        with self._pending_lock:
+            return self._pending_writes.get(user_id, 0) > 0
+
+    def _load(self, user_id: str) -> List[Dict[str, str]]:
+        """
+        Загружает последние сообщения пользователя из SQLite (один запрос по индексу).
+
+        Вызывается без блокировки хранилища: ждет записи только операций этого пользователя.
+        """
+        if self.conn is None:
+            return []
+        # История пользователя вытеснена, но еще не записана - дожидаемся записи (бывает редко)
+        with self._writes_done:
+            self._writes_done.wait_for(lambda: self._pending_writes.get(user_id, 0) == 0)
+        try:
+            with self._read_lock:
+                if self.conn is None:
+                    return []
+                rows = self.conn.execute(
+                    "SELECT role, content FROM dialog_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                    (user_id, self.max_history * 2)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при загрузке истории диалога {user_id}: {e}")
+            with self._pending_lock:
+                self.stats["persist_errors"] += 1
+            return []
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def _persist(self, user_id: str, messages: Optional[List[Dict[str, str]]]):
+        """Ставит операцию в очередь потока записи (messages=None - удалить историю пользователя)."""
+        if self._writer is None:
+            return
+        with self._pending_lock:
+            self._pending_writes[user_id] += 1
+        self._writes.put((user_id, messages))
+
+    def peek(self, user_id: str) -> Optional[DialogHistory]:
+        """
+        Возвращает историю пользователя, если она в памяти (без обращения к SQLite).
+
+        Args:
+            user_id: Идентификатор пользователя
+
+        Returns:
+            История диалога или None, если ее нужно загрузить (get)
+        """
+        with self.lock:
+            history = self.histories.get(user_id)
+            if history is not None:
+                self.histories.move_to_end(user_id)
+            return history
+
+    def get(self, user_id: str) -> DialogHistory:
+        """
+        Возвращает историю диалога пользователя (загружает из SQLite или создает новую).
+
+        Загрузка из SQLite идет без блокировки хранилища; из цикла событий вызывайте get
+        в пуле потоков (история в памяти доступна без ожидания через peek).
+
+        Args:
+            user_id: Идентификатор пользователя
+
+        Returns:
+            История диалога пользователя
+        """
+        while True:
+            history = self.peek(user_id)
+            if history is not None:
+                return history
+
+            messages = self._load(user_id)
+            with self.lock:
+                # Пока шла загрузка, историю мог загрузить другой поток
+                history = self.histories.get(user_id)
+                if history is not None:
+                    self.histories.move_to_end(user_id)
+                    return history
+                # Или в очередь записи попали новые сообщения пользователя - загружаем заново
+                if self._has_pending_writes(user_id):
+                    continue
+
+                history = DialogHistory(self.max_history, messages, user_id, self)
+                self.stats["loaded" if messages else "created"] += 1
+                self._track(history)
+                return history
+
+    def _track(self, history: DialogHistory):
+        """Добавляет историю в память как самую недавнюю и вытесняет лишние."""
+        self.histories[history.user_id] = history
+        self.total_bytes += history.size_bytes
+        self._evict()
+
+    def _on_messages_added(self, history: DialogHistory, messages: List[Dict[str, str]], delta_bytes: int):
+        """Учитывает новые сообщения истории (вызывается под блокировкой)."""
+        self._persist(history.user_id, messages)
+        current = self.histories.get(history.user_id)
+        if current is None:
+            # История была вытеснена, пока по ней формировался ответ. Сообщения уже в очереди записи -
+            # при следующем вопросе история загрузится из SQLite; без SQLite возвращаем ее в память
+            if self.conn is None:
+                self._track(history)
+            return
+        if current is not history:
+            # Пока формировался ответ, пользователь получил новую историю - дописываем сообщения в нее
+            delta_bytes = current._append(messages)
+        self.total_bytes += delta_bytes
+        self.histories.move_to_end(history.user_id)
+        self._evict()
+
+    def _evict(self):
+        """Вытесняет истории давно не писавших пользователей, пока объем превышает лимит."""
+        # Последнюю (текущую) историю не вытесняем, даже если она одна больше лимита
+        while self.total_bytes > self.max_bytes and len(self.histories) > 1:
+            _, history = self.histories.popitem(last=False)
+            self.total_bytes -= history.size_bytes
+            self.stats["evictions"] += 1
+
+    def clear(self, user_id: str):
+        """
+        Удаляет историю диалога пользователя из памяти и SQLite.
+
+        Args:
+            user_id: Идентификатор пользователя
+        """
+        with self.lock:
+            history = self.histories.pop(user_id, None)
+            if history is not None:
+                self.total_bytes -= history.size_bytes
+                history.clear()
+            self._persist(user_id, None)
+
+    def flush(self):
+        """Дожидается записи всех поставленных в очередь операций."""
+        if self._writer is not None:
+            self._writes.join()
+
+    def close(self):
+        """Дописывает очередь, останавливает поток записи и закрывает соединение с SQLite."""
+        with self.lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            atexit.unregister(self.close)
+            self._writes.put(None)
+            writer.join()
+        with self.lock, self._read_lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает количество историй в памяти, их объем и счетчики вытеснений."""
+        with self.lock:
+            return {
+                **self.stats,
+                "users": len(self.histories),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "persistent": self.conn is not None,
+                "pending_writes": self._writes.qsize(),
+            }
@@ -0,0 +1,157 @@
+"""
+Локальный сервер с OpenAI-совместимым API для проверок и замеров без обращения к Gemini.
+
+Ответы детерминированы (зависят только от вопроса в промпте, см. llm_backend.fake_answer). Сервер моделирует кэш
+префикса у провайдера: системное сообщение, которое уже встречалось, считается
+закэшированным - такие токены отдаются в usage.prompt_tokens_details.cached_tokens и
+почти не добавляют задержки. Задержка ответа = FAKE_LLM_BASE_MS + FAKE_LLM_MS_PER_TOKEN
+на каждый незакэшированный входной токен.
+
+Использование:
+    python fake_llm_server.py serve       # запустить сервер (LLM_PROVIDER=openai для бота)
+    python fake_llm_server.py benchmark   # сравнить промпт одним текстом и с системной инструкцией
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+from llm_backend import fake_answer
+from prompt_builder import estimate_tokens
+
+FAKE_LLM_HOST = os.getenv("FAKE_LLM_HOST", "127.0.0.1")
+FAKE_LLM_PORT = int(os.getenv("FAKE_LLM_PORT", "8089"))
+
+# Модель задержки: базовая задержка и стоимость незакэшированного входного токена (мс)
+FAKE_LLM_BASE_MS = float(os.getenv("FAKE_LLM_BASE_MS", "50"))
+FAKE_LLM_MS_PER_TOKEN = float(os.getenv("FAKE_LLM_MS_PER_TOKEN", "0.1"))
+
+class FakeLLMServer:
+    """Обработчик /v1/chat/completions с моделью кэша системных сообщений"""
+
+    def __init__(self):
+        """Инициализирует сервер."""
+        self.cached_prefixes = set()
+        self.requests = 0
+
+    def _usage(self, messages: List[Dict[str, str]], answer: str) -> Tuple[Dict[str, Any], int]:
+        """Считает usage запроса и количество незакэшированных входных токенов."""
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        cached_tokens = 0
+        for message in messages:
+            if message["role"] != "system":
+                continue
+            key = hashlib.sha1(message["content"].encode("utf-8")).hexdigest()
+            if key in self.cached_prefixes:
+                cached_tokens += estimate_tokens(message["content"])
+            self.cached_prefixes.add(key)
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(answer),
+            "total_tokens": prompt_tokens + estimate_tokens(answer),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        return usage, prompt_tokens - cached_tokens
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        """Обрабатывает запрос /v1/chat/completions (обычный и потоковый)."""
+        body = await request.json()
+        messages = body.get("messages", [])
+        answer = fake_answer(messages[-1]["content"] if messages else "")
+        usage, uncached_tokens = self._usage(messages, answer)
+        self.requests += 1
+
+        await asyncio.sleep((FAKE_LLM_BASE_MS + FAKE_LLM_MS_PER_TOKEN * uncached_tokens) / 1000)
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": f"fake-{self.requests}",
+                "object": "chat.completion",
+                "model": body.get("model", "fake-llm"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in answer.split(" "):
+            event = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+def create_app() -> web.Application:
+    """Создает приложение aiohttp с фейковым LLM."""
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", FakeLLMServer().chat_completions)
+    return app
+
+async def start_fake_llm_server(host: str = FAKE_LLM_HOST, port: int = FAKE_LLM_PORT) -> web.AppRunner:
+    """
+    Запускает сервер в текущем event loop.
+
+    Args:
+        host: Адрес
+        port: Порт (0 - любой свободный)
+
+    Returns:
+        AppRunner; адрес - runner.addresses[0], остановка - await runner.cleanup()
+    """
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+async def benchmark(vector_db_path: str = "vector_db", k: int = 3):
+    """Сравнивает входные токены и задержку: промпт одним текстом и статическая часть системной инструкцией."""
+    from bm25_index import BENCHMARK_QUERIES, BM25Index
+    from llm_backend import OpenAICompatibleBackend
+    from prompt_builder import PromptBuilder
+    from prompts import CONTINUATION_INSTRUCTION, STATIC_SYSTEM_PROMPT
+    from vector_store import load_documents, resolve_generation_path
+
+    vector_db_path = resolve_generation_path(vector_db_path)
+    texts, metadatas = load_documents(vector_db_path)
+    bm25 = BM25Index.load(vector_db_path)
+    builder = PromptBuilder()
+
+    prompts = []
+    for query in BENCHMARK_QUERIES:
+        docs = [{"text": texts[doc_id], "metadata": metadatas[doc_id]} for doc_id, _ in bm25.search(query, k)]
+        prompts.append(builder.build(STATIC_SYSTEM_PROMPT, query, docs, "Участник", (), CONTINUATION_INSTRUCTION))
+
+    runner = await start_fake_llm_server(port=0)
+    host, port = runner.addresses[0][:2]
+    try:
+        for name, use_system_instruction in (("одним текстом", False), ("system", True)):
+            backend = OpenAICompatibleBackend(f"http://{host}:{port}/v1", use_system_instruction=use_system_instruction)
+            started = time.perf_counter()
+            for prompt in prompts:
+                await backend.generate(prompt)
+            await backend.close()
+            stats = backend.get_stats()
+            print(f"{name:>13}: входных токенов = {stats['avg_input_tokens']:.0f}, "
+                  f"из них в кэше = {stats['avg_cached_tokens']:.0f}, "
+                  f"незакэшированных = {stats['avg_input_tokens'] - stats['avg_cached_tokens']:.0f}, "
+                  f"задержка = {(time.perf_counter() - started) / len(prompts) * 1000:.0f} мс")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "serve":
+        print(f"Фейковый LLM: http://{FAKE_LLM_HOST}:{FAKE_LLM_PORT}/v1")
+        web.run_app(create_app(), host=FAKE_LLM_HOST, port=FAKE_LLM_PORT)
+    elif command == "benchmark":
+        asyncio.run(benchmark())
+    else:
+        print(__doc__)
@@ -2,6 +2,9 @@
 Конфигурация для симулятора быстрого потока
 """
 
+import math
+from types import MappingProxyType
+
 # Количество дней в быстром потоке
 FAST_FLOW_DAYS = 30
 
@@ -99,20 +102,52 @@ FAST_FLOW_IMAGES = {
     "PLN": "images/fast_flow_pln.jpg"
 }
 
+# Валюты, для которых настроен быстрый поток
+FAST_FLOW_CURRENCIES = ("RUB", "EUR", "PLN")
+
+_RAW_FAST_FLOW_OPTIONS = {
+    "RUB": RUB_FAST_FLOW_OPTIONS,
+    "EUR": EUR_FAST_FLOW_OPTIONS,
+    "PLN": PLN_FAST_FLOW_OPTIONS,
+}
+
+def _validate_fast_flow_option(currency, option):
+    """Проверка согласованности опции быстрого потока. | Consistency check of a fast flow option."""
+    amount = option["amount"]
+    expected_profit = amount * option["percent"] / 100
+    if not math.isclose(option["profit"], expected_profit, abs_tol=1e-6):
+        raise ValueError(f"Быстрый поток {currency} {amount}: profit {option['profit']} != {expected_profit}")
+    if not math.isclose(option["total"], amount + option["profit"], abs_tol=1e-6):
+        raise ValueError(f"Быстрый поток {currency} {amount}: total {option['total']} != amount + profit")
+    # Ежедневная выплата в таблицах округлена до копеек
+    expected_daily = round(option["total"] / FAST_FLOW_DAYS, 2)
+    if not math.isclose(option["daily"], expected_daily, abs_tol=1e-6):
+        raise ValueError(f"Быстрый поток {currency} {amount}: daily {option['daily']} != {expected_daily}")
+
+def _compile_fast_flow_options():
+    """Компиляция таблиц опций в неизменяемые индексы. | Compiling option tables into immutable indexes."""
+    options_by_currency = {}
+    option_index = {}
+    for currency, raw_options in _RAW_FAST_FLOW_OPTIONS.items():
+        options = []
+        for raw_option in raw_options:
+            _validate_fast_flow_option(currency, raw_option)
+            key = (currency, raw_option["amount"])
+            if key in option_index:
+                raise ValueError(f"Быстрый поток {currency}: номинал {raw_option['amount']} указан дважды")
+            option = MappingProxyType(dict(raw_option))
+            options.append(option)
+            option_index[key] = option
+        options_by_currency[currency] = tuple(options)
+    return MappingProxyType(options_by_currency), MappingProxyType(option_index)
+
+# Индексы строятся один раз при импорте: валюта -> опции и (валюта, номинал) -> опция
+_FAST_FLOW_OPTIONS_BY_CURRENCY, _FAST_FLOW_OPTION_INDEX = _compile_fast_flow_options()
+
 # Получить опции быстрого потока по валюте
 def get_fast_flow_options(currency):
-    if currency == "RUB":
-        return RUB_FAST_FLOW_OPTIONS
-    elif currency == "EUR":
-        return EUR_FAST_FLOW_OPTIONS
-    elif currency == "PLN":
-        return PLN_FAST_FLOW_OPTIONS
-    return []
+    return _FAST_FLOW_OPTIONS_BY_CURRENCY.get(currency, ())
 
 # Получить опцию быстрого потока по валюте и сумме
 def get_fast_flow_option(currency, amount):
-    options = get_fast_flow_options(currency)
-    for option in options:
-        if option["amount"] == amount:
-            return option
-    return None 
\ No newline at end of file
+    return _FAST_FLOW_OPTION_INDEX.get((currency, amount))
@@ -2,6 +2,8 @@
 Обработчики для работы с симулятором быстрого потока
 """
 
+import logging
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -14,15 +16,22 @@ from fast_flow_keyboards import (
     get_fast_flow_currency_keyboard,
     get_fast_flow_amount_keyboard,
     get_fast_flow_confirmation_keyboard,
-    get_fast_flow_control_keyboard
+    get_fast_flow_control_keyboard,
+    get_fast_flow_playback_keyboard
 )
 from fast_flow_utils import (
     calculate_fast_flow_data,
     process_day,
+    calculate_fast_flow_schedule,
+    apply_fast_flow_day,
     format_fast_flow_confirmation,
     format_fast_flow_stats
 )
 from keyboards import get_simulators_menu
+from message_renderer import render_message
+from image_registry import answer_photo_cached
+
+logger = logging.getLogger(__name__)
 
 # Создаем роутер для быстрого потока
 fast_flow_router = Router()
@@ -34,7 +43,8 @@ async def start_fast_flow(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(FastFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для Быстрого Потока:*\n\n"
         "*Select the currency for the fast flow:*\n\n"
         "👇👇👇",
@@ -57,54 +67,23 @@ async def process_fast_flow_currency_selection(callback: CallbackQuery, state: F
     image_path = FAST_FLOW_IMAGES.get(currency)
     if image_path:
         try:
-            import os
-            from aiogram.types import FSInputFile
-            
-            # Прямой путь к файлу изображения
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            full_image_path = os.path.join(current_dir, "..", image_path)
-            print(f"Current directory: {current_dir}")
-            print(f"Image path from config: {image_path}")
-            print(f"Full image path: {full_image_path}")
-            print(f"File exists: {os.path.exists(full_image_path)}")
-            
-            if os.path.exists(full_image_path):
-                photo = FSInputFile(full_image_path)
-                await callback.message.answer_photo(
-                    photo=photo,
-                    caption=f"*Выберите номинал Быстрого Потока | Select the fast flow amount:  {CURRENCY_SYMBOLS[currency]}*\n\n"
-                    "👇👇👇",
-                    reply_markup=get_fast_flow_amount_keyboard(currency),
-                    parse_mode="Markdown"
-                )
-                print("Photo sent successfully")
+            sent_message = await answer_photo_cached(
+                callback.message,
+                image_path,
+                caption=f"*Выберите номинал Быстрого Потока | Select the fast flow amount:  {CURRENCY_SYMBOLS[currency]}*\n\n"
+                "👇👇👇",
+                reply_markup=get_fast_flow_amount_keyboard(currency),
+                parse_mode="Markdown"
+            )
+            if sent_message:
                 await callback.answer()
                 return
-            else:
-                print(f"Image file not found at: {full_image_path}")
-                # Попробуем найти файл в текущей директории
-                alt_path = os.path.join(current_dir, "images", f"fast_flow_{currency.lower()}.jpg")
-                print(f"Trying alternative path: {alt_path}")
-                if os.path.exists(alt_path):
-                    photo = FSInputFile(alt_path)
-                    await callback.message.answer_photo(
-                        photo=photo,
-                        caption=f"*Выберите номинал Быстрого Потока | Select the fast flow amount:  {CURRENCY_SYMBOLS[currency]}*\n\n"
-                        "👇👇👇",
-                        reply_markup=get_fast_flow_amount_keyboard(currency),
-                        parse_mode="Markdown"
-                    )
-                    print("Photo sent successfully from alternative path")
-                    await callback.answer()
-                    return
         except Exception as e:
-            print(f"Ошибка при отправке фото: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.error(f"Ошибка при отправке фото: {e}")
     
     # Если не удалось отправить фото, просто отправляем текст
-    print("Falling back to text-only message")
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"*Выберите номинал Быстрого Потока | Select the fast flow amount:  {CURRENCY_SYMBOLS[currency]}*\n\n"
         "👇👇👇",
         reply_markup=get_fast_flow_amount_keyboard(currency),
@@ -133,7 +112,8 @@ async def process_fast_flow_amount_selection(callback: CallbackQuery, state: FSM
     # Формируем сообщение подтверждения
     message_text = format_fast_flow_confirmation(flow_data)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=get_fast_flow_confirmation_keyboard(),
         parse_mode="Markdown"
@@ -158,7 +138,8 @@ async def confirm_fast_flow(callback: CallbackQuery, state: FSMContext):
     # Отправляем информацию о текущем дне
     message_text = format_fast_flow_stats(flow_data)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=get_fast_flow_control_keyboard(),
         parse_mode="Markdown"
@@ -191,13 +172,59 @@ async def process_fast_flow_next_day(callback: CallbackQuery, state: FSMContext)
     if flow_data.completed:
         message_text += "\n\n✅ Быстрый поток завершен! | The fast flow is completed!"
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=get_fast_flow_control_keyboard(),
         parse_mode="Markdown"
     )
     await callback.answer()
 
+# Обработчик перехода в режим просмотра по дням
+@fast_flow_router.callback_query(FastFlowState.viewing_flow, F.data == "fastflow_playback")
+async def start_fast_flow_playback(callback: CallbackQuery, state: FSMContext):
+    """Переключение симуляции в режим просмотра по дням. | Switching the simulation to day-by-day view."""
+    data = await state.get_data()
+    flow_data = data.get("flow_data")
+    
+    # График считается один раз для параметров потока и берется из кэша, в состоянии FSM его не храним
+    schedule = calculate_fast_flow_schedule(flow_data)
+    flow_data = apply_fast_flow_day(flow_data, schedule, max(flow_data.day_counter, 1))
+    await state.update_data(flow_data=flow_data)
+    
+    await _show_fast_flow_day(callback, flow_data)
+    await callback.answer()
+
+# Обработчик выбора дня в режиме просмотра по дням
+@fast_flow_router.callback_query(FastFlowState.viewing_flow, F.data.startswith("fastflow_day_"))
+async def process_fast_flow_day_selection(callback: CallbackQuery, state: FSMContext):
+    """Показ выбранного дня быстрого потока в том же сообщении. | Showing the selected fast flow day in the same message."""
+    day = int(callback.data.split("_")[2])
+    
+    data = await state.get_data()
+    flow_data = data.get("flow_data")
+    
+    # Этот день уже показан - сообщение не меняется
+    if day == flow_data.day_counter:
+        await callback.answer()
+        return
+    
+    schedule = calculate_fast_flow_schedule(flow_data)
+    flow_data = apply_fast_flow_day(flow_data, schedule, day)
+    await state.update_data(flow_data=flow_data)
+    
+    await _show_fast_flow_day(callback, flow_data)
+    await callback.answer()
+
+async def _show_fast_flow_day(callback: CallbackQuery, flow_data: FastFlowData):
+    """Показывает статистику дня в текущем сообщении. | Shows the day statistics in the current message."""
+    message_text = format_fast_flow_stats(flow_data)
+    if flow_data.completed:
+        message_text += "\n\n✅ Быстрый поток завершен! | The fast flow is completed!"
+    keyboard = get_fast_flow_playback_keyboard(flow_data.day_counter, flow_data.days_total)
+    
+    await render_message(callback, message_text, reply_markup=keyboard)
+
 # Обработчик возврата к выбору валюты
 @fast_flow_router.callback_query(F.data == "fastflow_back_to_currency")
 async def back_to_currency_selection(callback: CallbackQuery, state: FSMContext):
@@ -207,24 +234,15 @@ async def back_to_currency_selection(callback: CallbackQuery, state: FSMContext)
     
     await state.set_state(FastFlowState.selecting_currency)
     
-    # Проверяем, есть ли у сообщения текст
-    if callback.message.text:
-        await callback.message.answer(
-            "*Выберите валюту для Быстрого Потока:*\n\n"
-            "*Select the currency for the fast flow:*\n\n"
-            "👇👇👇",
-            reply_markup=get_fast_flow_currency_keyboard(),
-            parse_mode="Markdown"
-        )
-    else:
-        # Если сообщение содержит изображение, отправляем новое текстовое сообщение
-        await callback.message.answer(
-            "*Выберите валюту для Быстрого Потока:*\n\n"
-            "*Select the currency for the fast flow:*\n\n"
-            "👇👇👇",
-            reply_markup=get_fast_flow_currency_keyboard(),
-            parse_mode="Markdown"
-        )
+    # Если сообщение содержит изображение, render_message отправит новое текстовое сообщение
+    await render_message(
+        callback,
+        "*Выберите валюту для Быстрого Потока:*\n\n"
+        "*Select the currency for the fast flow:*\n\n"
+        "👇👇👇",
+        reply_markup=get_fast_flow_currency_keyboard(),
+        parse_mode="Markdown"
+    )
     
     await callback.answer()
 
@@ -238,7 +256,8 @@ async def back_to_amount_selection(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(FastFlowState.selecting_amount)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"*Выберите номинал Быстрого Потока | Select the fast flow amount:  {CURRENCY_SYMBOLS[currency]}*\n\n"
         "👇👇👇",
         reply_markup=get_fast_flow_amount_keyboard(currency),
@@ -253,7 +272,8 @@ async def restart_fast_flow(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(FastFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для Быстрого Потока:*\n\n"
         "*Select the currency for the fast flow:*\n\n"
         "👇👇👇",
@@ -268,7 +288,8 @@ async def back_to_simulators(callback: CallbackQuery, state: FSMContext):
     """Возврат в меню симуляторов. | Return to the simulators menu."""
     await state.clear()
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите симулятор:*\n\n"
         "*Select the simulator:*\n\n"
         "👇👇👇",
@@ -283,7 +304,8 @@ async def back_to_currency_from_amount(callback: CallbackQuery, state: FSMContex
     """Возврат к выбору валюты из экрана выбора номинала. | Return to the currency selection from the amount selection screen."""
     await state.set_state(FastFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для Быстрого Потока:*\n\n"
         "*Select the currency for the fast flow:*\n\n"
         "👇👇👇",
@@ -2,8 +2,10 @@
 Клавиатуры для работы с быстрым потоком
 """
 
+from typing import Tuple
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from fast_flow_config import get_fast_flow_options
+from fast_flow_config import FAST_FLOW_CURRENCIES, get_fast_flow_options
 from config import CURRENCY_NAMES
 
 def get_fast_flow_currency_keyboard() -> InlineKeyboardMarkup:
@@ -24,43 +26,32 @@ def get_fast_flow_currency_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
-def get_fast_flow_amount_keyboard(currency: str) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора номинала быстрого потока. | Keyboard for selecting the fast flow amount."""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
+def _build_fast_flow_amount_rows(currency: str) -> Tuple[Tuple[Tuple[str, str], ...], ...]:
+    """Ряды кнопок номиналов для валюты: (текст, callback_data). | Amount button rows for a currency: (text, callback_data)."""
     # Получаем все опции для выбранной валюты
-    options = get_fast_flow_options(currency)
+    buttons = tuple(
+        (f"{option['amount']}", f"fastflow_amount_{currency}_{option['amount']}")
+        for option in get_fast_flow_options(currency)
+    )
     
-    # Группируем по 4 кнопки в ряд
-    current_row = []
-    for option in options:
-        amount = option["amount"]
-        if len(current_row) < 4:
-            current_row.append(
-                InlineKeyboardButton(
-                    text=f"{amount}", 
-                    callback_data=f"fastflow_amount_{currency}_{amount}"
-                )
-            )
-        else:
-            keyboard.inline_keyboard.append(current_row)
-            current_row = [
-                InlineKeyboardButton(
-                    text=f"{amount}", 
-                    callback_data=f"fastflow_amount_{currency}_{amount}"
-                )
-            ]
-    
-    # Добавляем последний ряд, если остались кнопки
-    if current_row:
-        keyboard.inline_keyboard.append(current_row)
-    
-    # Добавляем кнопку "Назад"
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="◀️ Назад | Back", callback_data="fastflow_back_to_currency")
+    # Группируем по 4 кнопки в ряд и добавляем кнопку "Назад"
+    rows = tuple(buttons[i:i + 4] for i in range(0, len(buttons), 4))
+    return rows + ((("◀️ Назад | Back", "fastflow_back_to_currency"),),)
+
+# Ряды кнопок номиналов считаются один раз при импорте; кортежи неизменяемы, а клавиатура
+# (изменяемый объект aiogram) создается из них при каждом запросе
+_FAST_FLOW_AMOUNT_ROWS = {currency: _build_fast_flow_amount_rows(currency) for currency in FAST_FLOW_CURRENCIES}
+
+def get_fast_flow_amount_keyboard(currency: str) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора номинала быстрого потока. | Keyboard for selecting the fast flow amount."""
+    rows = _FAST_FLOW_AMOUNT_ROWS.get(currency)
+    if rows is None:
+        # Для неизвестной валюты остается только кнопка "Назад"
+        rows = _build_fast_flow_amount_rows(currency)
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=callback_data) for text, callback_data in row]
+        for row in rows
     ])
-    
-    return keyboard
 
 def get_fast_flow_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для подтверждения номинала быстрого потока. | Keyboard for confirming the fast flow amount."""
@@ -80,6 +71,9 @@ def get_fast_flow_control_keyboard() -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(text="📊 Начислить | Accrue", callback_data="fastflow_next_day")
         ],
+        [
+            InlineKeyboardButton(text="📅 По дням | Day by day", callback_data="fastflow_playback")
+        ],
         [
             InlineKeyboardButton(text="🔄 Заново | Restart", callback_data="fastflow_restart")
         ],
@@ -87,4 +81,22 @@ def get_fast_flow_control_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="◀️ К симуляторам | Back to simulators", callback_data="back_to_simulators")
         ]
     ])
-    return keyboard 
\ No newline at end of file
+    return keyboard
+
+def get_fast_flow_playback_keyboard(day: int, days_total: int) -> InlineKeyboardMarkup:
+    """Клавиатура для просмотра графика быстрого потока по дням. | Keyboard for viewing the fast flow schedule day by day."""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="⏮", callback_data="fastflow_day_1"),
+            InlineKeyboardButton(text="◀️", callback_data=f"fastflow_day_{max(day - 1, 1)}"),
+            InlineKeyboardButton(text="▶️", callback_data=f"fastflow_day_{min(day + 1, days_total)}"),
+            InlineKeyboardButton(text="⏭", callback_data=f"fastflow_day_{days_total}")
+        ],
+        [
+            InlineKeyboardButton(text="🔄 Заново | Restart", callback_data="fastflow_restart")
+        ],
+        [
+            InlineKeyboardButton(text="◀️ К симуляторам | Back to simulators", callback_data="back_to_simulators")
+        ]
+    ])
+    return keyboard
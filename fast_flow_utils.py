@@ -2,6 +2,11 @@
 Утилиты для работы с быстрым потоком
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
 from fast_flow_states import FastFlowData
 from fast_flow_config import get_fast_flow_option, FAST_FLOW_DAYS
 from config import CURRENCY_SYMBOLS, ECR_BUY_RATE, CURRENCY_RATES
@@ -64,6 +69,39 @@ def process_day(flow_data):
     
     return flow_data
 
+@lru_cache(maxsize=256)
+def _build_fast_flow_schedule(total_amount: float, daily_payment: float, days_total: int):
+    """Расчет графика для параметров потока (курсы валют на график не влияют). | Schedule calculation for the flow parameters (currency rates do not affect it)."""
+    # Индекс массива соответствует номеру дня: 0 - до начислений, days_total - последний день
+    days = np.arange(days_total + 1)
+    savings = days * daily_payment
+    balance = total_amount - savings
+    
+    # График общий для всех пользователей с такими параметрами - запрещаем изменение массивов
+    for array in (days, savings, balance):
+        array.setflags(write=False)
+    return MappingProxyType({
+        "day": days,
+        "savings": savings,
+        "balance": balance,
+    })
+
+def calculate_fast_flow_schedule(flow_data):
+    """Весь график быстрого потока: считается за один проход и кэшируется по параметрам потока. | The whole fast flow schedule: calculated at once and cached by the flow parameters."""
+    return _build_fast_flow_schedule(float(flow_data.total_amount), float(flow_data.daily_payment),
+                                     int(flow_data.days_total))
+
+def apply_fast_flow_day(flow_data, schedule, day):
+    """Переводит данные потока на указанный день графика. | Moves the flow data to the given day of the schedule."""
+    day = max(0, min(int(day), flow_data.days_total))
+    
+    flow_data.day_counter = day
+    flow_data.current_balance = float(schedule["balance"][day])
+    flow_data.savings = float(schedule["savings"][day])
+    flow_data.completed = day >= flow_data.days_total
+    
+    return flow_data
+
 def format_fast_flow_confirmation(flow_data):
     """Форматирует сообщение подтверждения быстрого потока. | Formats the fast flow confirmation message."""
     currency_symbol = CURRENCY_SYMBOLS[flow_data.currency]
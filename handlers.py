@@ -18,6 +18,8 @@ from keyboards import (
     get_money_flows_menu
 )
 from fast_flow_keyboards import get_fast_flow_currency_keyboard
+from message_renderer import render_message
+from image_registry import answer_photo_cached
 from states import GrowingFlowState, FlowData
 from utils import (
     calculate_flow_data,
@@ -85,7 +87,8 @@ async def back_to_main(callback: CallbackQuery, state: FSMContext):
 # Обработчик нажатия на кнопку "СИМУЛЯТОРЫ"
 @router.callback_query(F.data == "simulators")
 async def show_simulators(callback: CallbackQuery):
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите симулятор:*\n\n"
         "*Select a simulator:*\n\n"
         "👇👇👇",
@@ -98,7 +101,8 @@ async def show_simulators(callback: CallbackQuery):
 @router.callback_query(F.data == "growing_flow")
 async def start_growing_flow(callback: CallbackQuery, state: FSMContext):
     await state.set_state(GrowingFlowState.selecting_currency)
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту для симулятора растущего потока:*\n\n"
         "*Select the currency for the growing flow simulator:*\n\n"
         "👇👇👇",
@@ -128,7 +132,8 @@ async def process_currency_selection(callback: CallbackQuery, state: FSMContext)
     await state.update_data(currency=currency)
     await state.set_state(GrowingFlowState.entering_amount)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"Вы выбрали: {currency_name}. Введите начальную сумму.\n"
         f"*Цифрами без пробелов от: {min_amount} до: {max_amount}{currency_symbol}*\n\n"
         f"You selected: {currency_name}. Enter the initial amount.\n"
@@ -228,7 +233,8 @@ async def confirm_amount(callback: CallbackQuery, state: FSMContext):
     message_text = format_daily_stats(flow_data)
     keyboard = get_flow_control_with_withdraw_keyboard() if flow_data.savings > 0 else get_flow_control_keyboard()
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=keyboard,
         parse_mode="Markdown"
@@ -293,7 +299,8 @@ async def add_income(callback: CallbackQuery, state: FSMContext):
     message_text = format_daily_stats(flow_data)
     keyboard = get_flow_control_with_withdraw_keyboard() if flow_data.savings > 0 else get_flow_control_keyboard()
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         message_text,
         reply_markup=keyboard,
         parse_mode="Markdown"
@@ -318,7 +325,8 @@ async def prompt_withdraw(callback: CallbackQuery, state: FSMContext):
     ])
     
     currency_symbol = CURRENCY_SYMBOLS[flow_data.currency]
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"*В копилке доступно: {flow_data.savings:.2f}{currency_symbol}*\n"
         f"Введите сумму для вывода или нажмите 'Вывести все'\n\n"
         f"*Available in the savings: {flow_data.savings:.2f}{currency_symbol}*\n"
@@ -352,7 +360,8 @@ async def handle_withdraw_all(callback: CallbackQuery, state: FSMContext):
     message_text = format_daily_stats(flow_data)
     keyboard = get_flow_control_keyboard()
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"*Средства успешно выведены!*\n\n{message_text}\n\n"
         f"*Funds successfully withdrawn!*\n\n{message_text}\n\n"
         f"👇👇👇",
@@ -375,7 +384,7 @@ async def handle_cancel_withdraw(callback: CallbackQuery, state: FSMContext):
     message_text = format_daily_stats(flow_data)
     keyboard = get_flow_control_with_withdraw_keyboard() if flow_data.savings > 0 else get_flow_control_keyboard()
     
-    await callback.message.answer(message_text, reply_markup=keyboard, parse_mode="Markdown")
+    await render_message(callback, message_text, reply_markup=keyboard)
     await callback.answer()
 
 # Обработчик ввода суммы для вывода
@@ -424,7 +433,8 @@ async def handle_withdraw_amount(message: Message, state: FSMContext):
 async def prompt_add_funds(callback: CallbackQuery, state: FSMContext):
     await state.set_state(GrowingFlowState.adding_funds)  # Новое состояние для пополнения
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         f"Введите сумму пополнения Растущего Потока.\n"
         f"*Цифрами без пробелов от: {MIN_AMOUNT} до: {MAX_AMOUNT}*\n\n"
         f"Enter the amount to replenish the Growing Flow.\n"
@@ -519,7 +529,8 @@ async def restart_simulator(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.set_state(GrowingFlowState.selecting_currency)
     
-    await callback.message.answer(
+    await render_message(
+        callback,
         "*Выберите валюту:*\n\n"
         "*Select the currency:*\n\n"
         "👇👇👇",
@@ -561,13 +572,9 @@ async def savings_flow(callback: CallbackQuery):
     
     # Отправляем картинку с текстом в подписи
     try:
-        from aiogram.types import FSInputFile
-        image_path = "images/accumulative_flow.jpg"
-        photo = FSInputFile(image_path)
-        
-        # Отправляем фото
-        await callback.message.answer_photo(
-            photo=photo,
+        await answer_photo_cached(
+            callback.message,
+            "images/accumulative_flow.jpg",
             caption="Схема работы Накопительного Потока | Scheme of work of the Savings Flow"
         )
     except Exception as e:
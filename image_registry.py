@@ -0,0 +1,81 @@
+"""
+Реестр изображений бота: каждое изображение загружается в Telegram один раз,
+дальше отправляется по сохраненному file_id
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Корень проекта - пути к изображениям указываются относительно него
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Файл с сохраненными file_id (свой для каждого бота, в git не хранится)
+FILE_IDS_PATH = os.path.join(BASE_DIR, "images", "file_ids.json")
+
+def _load_file_ids() -> Dict[str, str]:
+    """Загружает сохраненные file_id изображений."""
+    try:
+        with open(FILE_IDS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении {FILE_IDS_PATH}: {e}")
+        return {}
+
+# Путь к изображению -> file_id в Telegram
+_file_ids: Dict[str, str] = _load_file_ids()
+
+def _save_file_ids():
+    """Атомарно сохраняет file_id изображений на диск."""
+    tmp_path = f"{FILE_IDS_PATH}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_file_ids, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, FILE_IDS_PATH)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении {FILE_IDS_PATH}: {e}")
+
+async def answer_photo_cached(message: Message, image_path: str, **kwargs) -> Optional[Message]:
+    """
+    Отправляет изображение в чат сообщения, загружая файл только при первой отправке.
+
+    Args:
+        message: Сообщение, в чат которого отправляется изображение
+        image_path: Путь к изображению относительно корня проекта
+        **kwargs: Параметры answer_photo (caption, reply_markup, parse_mode и т.д.)
+
+    Returns:
+        Отправленное сообщение или None, если файла изображения нет
+    """
+    file_id = _file_ids.get(image_path)
+    if file_id:
+        try:
+            return await message.answer_photo(photo=file_id, **kwargs)
+        except TelegramBadRequest as e:
+            # file_id мог стать недействительным (например, сменился токен бота) - загружаем заново
+            logger.warning(f"file_id для {image_path} недействителен, загружаем файл заново: {e}")
+            _file_ids.pop(image_path, None)
+
+    full_path = os.path.join(BASE_DIR, image_path)
+    if not os.path.exists(full_path):
+        logger.error(f"Изображение не найдено: {full_path}")
+        return None
+
+    sent_message = await message.answer_photo(photo=FSInputFile(full_path), **kwargs)
+
+    # Запоминаем file_id самого большого варианта изображения
+    if sent_message.photo:
+        _file_ids[image_path] = sent_message.photo[-1].file_id
+        _save_file_ids()
+        logger.info(f"Изображение {image_path} загружено, file_id сохранен")
+
+    return sent_message
@@ -0,0 +1,280 @@
+"""
+Определение намерения (intent) вопроса пользователя для AI-ассистента.
+
+Ключевые слова всех намерений компилируются в одно регулярное выражение (альтернативы
+свернуты в префиксное дерево), поэтому вопрос просматривается один раз вместо
+отдельного поиска по каждому списку слов.
+Семантика прежняя: намерение срабатывает, если любое его ключевое слово входит
+в текст как подстрока.
+
+Дополнительно (INTENT_EMBEDDINGS=1) вопросы, не распознанные по словам, сравниваются
+с эмбеддингами вопросов-прототипов - используется уже загруженная модель эмбеддингов.
+
+Использование:
+    python intent_router.py benchmark   # сверка с прежним поиском по спискам и замер скорости
+"""
+
+import logging
+import re
+import sys
+import time
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Намерения
+INTENT_FOUNDER = "founder"            # вопрос об основателе проекта
+INTENT_REFERRAL = "referral"          # регистрация, реферальные ссылки
+INTENT_CALCULATION = "calculation"    # расчет заработка - отправляем в симуляторы
+INTENT_OBJECTION = "objection"        # возражение - отдельный промпт
+INTENT_GENERAL = "general"            # обычный вопрос к базе знаний
+
+# Служебная метка: слова о потоках и заработке (расчет - только вместе с ними)
+CALCULATION_TOPIC = "calculation_topic"
+
+# Намерения, на которые отвечаем без поиска по базе знаний
+STATIC_INTENTS = (INTENT_FOUNDER, INTENT_REFERRAL, INTENT_CALCULATION)
+
+INTENT_KEYWORDS: Dict[str, Sequence[str]] = {
+    INTENT_FOUNDER: (
+        "васадин", "дмитрий васадин", "основатель", "создатель", "дмитрий",
+        "кто такой васадин", "васадин кто", "кто основатель", "основатель проекта",
+        "создатель проекта", "кто создал", "кто создатель",
+    ),
+    INTENT_REFERRAL: (
+        "реферал", "реферальная", "ссылка", "ссылки", "регистрация", "зарегистрироваться",
+        "начать", "старт", "как начать", "как зарегистрироваться", "как получить ссылку",
+        "пригласить", "приглашение", "пригласи", "приглашай",
+    ),
+    INTENT_CALCULATION: (
+        "посчитать", "расчет", "рассчитать", "сколько", "заработок", "доход",
+        "прибыль", "выгода", "выгодно", "выгоднее", "калькулятор", "калькуляция",
+    ),
+    CALCULATION_TOPIC: (
+        "поток", "потоки", "заработать", "доход", "деньги", "инвестиции",
+        "инвестировать", "вложить", "вложения", "процент", "проценты",
+    ),
+    INTENT_OBJECTION: (
+        "пирамида", "скам", "развод", "обман", "мошенник", "не верю", "лохотрон",
+        "ponzi", "scam", "fraud", "обманули", "хайп", "млм", "mlm",
+        "не работает", "потеряю", "деньги пропадут", "рискованно",
+        "нелегально", "запрещено", "уже был в",
+    ),
+}
+
+# Английские ключевые слова: вопросы на английском получают ответы по шаблонам на английском
+ENGLISH_INTENT_KEYWORDS: Dict[str, Sequence[str]] = {
+    INTENT_FOUNDER: ("vasadin", "founder", "who created"),
+    INTENT_REFERRAL: ("referral", "register", "registration", "sign up", "invite"),
+}
+
+# Ключевые слова маршрутизатора по умолчанию: прежние списки и английские слова
+ROUTER_KEYWORDS: Dict[str, Sequence[str]] = {
+    label: (*words, *ENGLISH_INTENT_KEYWORDS.get(label, ())) for label, words in INTENT_KEYWORDS.items()
+}
+
+# Вопросы-прототипы для распознавания намерения по смыслу
+INTENT_PROTOTYPES: Dict[str, Sequence[str]] = {
+    INTENT_FOUNDER: (
+        "Кто основал проект?",
+        "Расскажи про человека, который придумал эту платформу",
+    ),
+    INTENT_REFERRAL: (
+        "Как мне присоединиться к проекту?",
+        "Где зарегистрироваться на платформе?",
+        "Дай ссылку для входа в проект",
+    ),
+    INTENT_CALCULATION: (
+        "Сколько я заработаю, если вложу 1000 долларов?",
+        "Посчитай мою прибыль за год",
+    ),
+}
+
+# Порядок проверки намерений (как в прежней цепочке проверок answer_query)
+INTENT_PRIORITY = (INTENT_FOUNDER, INTENT_REFERRAL, INTENT_CALCULATION, INTENT_OBJECTION)
+
+# Количество запомненных результатов разбора (один вопрос проверяется несколько раз за обработку)
+INTENT_CACHE_SIZE = 1024
+
+def trie_pattern(words: Sequence[str]) -> str:
+    """
+    Строит регулярное выражение, совпадающее с любым из слов, в виде префиксного дерева.
+
+    Общие префиксы проверяются один раз ("поток|потоки" -> "поток(?:и)?"), а жадные
+    необязательные группы находят самое длинное слово в позиции.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """Поиск всех ключевых слов за один проход регулярного выражения"""
+
+    def __init__(self, keywords: Dict[str, Sequence[str]]):
+        """
+        Компилирует ключевые слова.
+
+        Args:
+            keywords: Метка -> ключевые слова (в нижнем регистре)
+        """
+        labels: Dict[str, set] = {}
+        for label, words in keywords.items():
+            for word in words:
+                labels.setdefault(word, set()).add(label)
+
+        # В каждой позиции регулярное выражение находит самое длинное слово, поэтому слово
+        # наследует метки всех слов, которые в него входят ("как начать" содержит "начать")
+        self.labels: Dict[str, FrozenSet[str]] = {
+            word: frozenset().union(*(labels[other] for other in labels if other in word))
+            for word in labels
+        }
+
+        # Опережающая проверка (?=...) проверяет каждую позицию текста, включая
+        # пересекающиеся вхождения - как поиск подстроки по каждому слову отдельно
+        self.pattern = re.compile(f"(?=({trie_pattern(list(labels))}))")
+
+    def match(self, text: str) -> FrozenSet[str]:
+        """Возвращает метки всех ключевых слов, найденных в тексте (текст - в нижнем регистре)."""
+        found = {match.group(1) for match in self.pattern.finditer(text)}
+        return frozenset().union(*(self.labels[word] for word in found))
+
+class IntentRouter:
+    """Маршрутизатор вопросов по намерениям"""
+
+    def __init__(self, keywords: Dict[str, Sequence[str]] = ROUTER_KEYWORDS,
+                 encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 prototypes: Dict[str, Sequence[str]] = INTENT_PROTOTYPES,
+                 similarity_threshold: float = 0.8):
+        """
+        Инициализирует маршрутизатор.
+
+        Args:
+            keywords: Ключевые слова намерений
+            encoder: Функция кодирования списка текстов в эмбеддинги (None - только ключевые слова)
+            prototypes: Вопросы-прототипы намерений для распознавания по смыслу
+            similarity_threshold: Минимальное косинусное сходство с прототипом
+        """
+        self.matcher = KeywordMatcher(keywords)
+        self.similarity_threshold = similarity_threshold
+        self.stats = {intent: 0 for intent in (*INTENT_PRIORITY, INTENT_GENERAL)}
+        self.stats["by_embedding"] = 0
+        self._labels = lru_cache(maxsize=INTENT_CACHE_SIZE)(self._scan)
+
+        # Матрица нормализованных эмбеддингов прототипов и намерение каждой строки
+        self.prototype_matrix: Optional[np.ndarray] = None
+        self.prototype_intents: List[str] = []
+        if encoder is not None:
+            texts = [text for intent in prototypes for text in prototypes[intent]]
+            self.prototype_intents = [intent for intent in prototypes for _ in prototypes[intent]]
+            matrix = np.asarray(encoder(texts), dtype=np.float32)
+            self.prototype_matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def _scan(self, query: str) -> FrozenSet[str]:
+        """Находит метки ключевых слов в вопросе."""
+        return self.matcher.match(query.lower())
+
+    def labels(self, query: str) -> FrozenSet[str]:
+        """Возвращает все найденные в вопросе метки (с учетом результатов предыдущих разборов)."""
+        return self._labels(query)
+
+    def route(self, query: str) -> str:
+        """
+        Определяет намерение по ключевым словам.
+
+        Args:
+            query: Вопрос пользователя
+
+        Returns:
+            Намерение с наивысшим приоритетом или INTENT_GENERAL
+        """
+        labels = self.labels(query)
+        for intent in INTENT_PRIORITY:
+            if intent in labels and (intent != INTENT_CALCULATION or CALCULATION_TOPIC in labels):
+                self.stats[intent] += 1
+                return intent
+        self.stats[INTENT_GENERAL] += 1
+        return INTENT_GENERAL
+
+    def is_objection(self, query: str) -> bool:
+        """Проверяет, содержит ли вопрос возражение."""
+        return INTENT_OBJECTION in self.labels(query)
+
+    @property
+    def has_prototypes(self) -> bool:
+        """Распознавание по смыслу включено."""
+        return self.prototype_matrix is not None
+
+    def route_by_embedding(self, query_embedding: np.ndarray) -> Optional[str]:
+        """
+        Определяет намерение по близости к вопросам-прототипам.
+
+        Args:
+            query_embedding: Нормализованный эмбеддинг вопроса
+
+        Returns:
+            Намерение ближайшего прототипа или None, если сходство ниже порога
+        """
+        if self.prototype_matrix is None:
+            return None
+        similarities = self.prototype_matrix @ np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        intent = self.prototype_intents[best]
+        self.stats["by_embedding"] += 1
+        logger.info(f"Намерение {intent} определено по смыслу (сходство {similarities[best]:.3f})")
+        return intent
+
+    def get_stats(self) -> Dict[str, int]:
+        """Возвращает количество вопросов по намерениям."""
+        return dict(self.stats)
+
+def benchmark(repeats: int = 2000):
+    """Сверяет метки с прежним поиском по спискам слов и сравнивает скорость."""
+    from bm25_index import BENCHMARK_QUERIES
+
+    queries = list(BENCHMARK_QUERIES) + [
+        "Кто такой Дмитрий Васадин?", "Дай реферальную ссылку", "Сколько можно заработать в потоке?",
+        "Это же пирамида, деньги пропадут", "Как начать инвестировать?", "Расскажи о проекте",
+    ]
+    matcher = KeywordMatcher(INTENT_KEYWORDS)
+
+    def scan_lists(text: str) -> FrozenSet[str]:
+        return frozenset(label for label, words in INTENT_KEYWORDS.items() if any(word in text for word in words))
+
+    lowered = [query.lower() for query in queries]
+    mismatches = [query for query, text in zip(queries, lowered) if matcher.match(text) != scan_lists(text)]
+    print(f"Совпадение меток: {len(queries) - len(mismatches)}/{len(queries)}")
+    for query in mismatches:
+        print(f"  расхождение: {query}")
+
+    for name, scan in (("списки слов", scan_lists), ("одно выражение", matcher.match)):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for text in lowered:
+                scan(text)
+        per_query_us = (time.perf_counter() - started) / (repeats * len(lowered)) * 1e6
+        print(f"{name:>15}: {per_query_us:.1f} мкс на вопрос")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "benchmark":
+        benchmark()
+    else:
+        print(__doc__)
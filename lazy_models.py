@@ -0,0 +1,111 @@
+"""
+Ленивая загрузка тяжелых моделей (RAG-ассистент, Whisper) в фоновом потоке.
+
+Бот начинает принимать обновления сразу, а модели загружаются в фоне после старта
+или при первом обращении. Пока модель не готова, обработчики получают None и
+отвечают пользователю, что ассистент еще загружается.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Один поток для загрузки: модели загружаются по очереди и не конкурируют за CPU и память
+_loader_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+class LazyModel:
+    """Держатель модели, которая создается в фоновом потоке при первой необходимости"""
+
+    NOT_STARTED = "not_started"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name: str, factory: Callable[[], Any], on_ready: Optional[Callable[[Any], None]] = None):
+        """
+        Инициализирует держатель.
+
+        Args:
+            name: Название модели для логов
+            factory: Функция без аргументов, создающая модель (выполняется в фоновом потоке)
+            on_ready: Вызывается с готовой моделью в цикле событий (например, для запуска фоновых задач)
+        """
+        self.name = name
+        self.factory = factory
+        self.on_ready = on_ready
+        self.instance: Optional[Any] = None
+        self.state = self.NOT_STARTED
+        self.error: Optional[Exception] = None
+        self.load_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Модель загружена и готова к работе."""
+        return self.state == self.READY
+
+    @property
+    def is_failed(self) -> bool:
+        """Загрузка модели завершилась ошибкой."""
+        return self.state == self.FAILED
+
+    def _create(self) -> Any:
+        """Создает модель (вызывается в фоновом потоке)."""
+        started = time.perf_counter()
+        logger.info(f"Загрузка: {self.name}...")
+        instance = self.factory()
+        self.load_seconds = time.perf_counter() - started
+        logger.info(f"{self.name} загружен за {self.load_seconds:.1f} с")
+        return instance
+
+    async def _load(self):
+        """Загружает модель в фоновом потоке, не блокируя цикл событий."""
+        loop = asyncio.get_running_loop()
+        try:
+            self.instance = await loop.run_in_executor(_loader_executor, self._create)
+            self.state = self.READY
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке ({self.name}): {e}")
+            self.error = e
+            self.state = self.FAILED
+            return
+
+        if self.on_ready:
+            try:
+                self.on_ready(self.instance)
+            except Exception as e:
+                logger.error(f"Ошибка при запуске ({self.name}): {e}")
+
+    def start(self) -> asyncio.Task:
+        """Запускает загрузку, если она еще не запущена, и возвращает задачу загрузки."""
+        if self._task is None:
+            self.state = self.LOADING
+            self._task = asyncio.create_task(self._load())
+        return self._task
+
+    def get(self) -> Optional[Any]:
+        """
+        Возвращает модель, если она готова; иначе запускает загрузку и возвращает None.
+        """
+        if self.state == self.NOT_STARTED:
+            self.start()
+        return self.instance
+
+    async def wait(self) -> Optional[Any]:
+        """Дожидается окончания загрузки и возвращает модель (None при ошибке)."""
+        await self.start()
+        return self.instance
+
+    def get_status(self) -> Dict[str, Any]:
+        """Возвращает состояние загрузки для логов и диагностики."""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": str(self.error) if self.error else None,
+        }
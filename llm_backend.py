@@ -0,0 +1,728 @@
+"""
+Бэкенды LLM для AI-ассистента: единый интерфейс generate / stream / count_tokens.
+
+Промпт передается двумя частями (см. prompt_builder.Prompt): статическая часть
+(инструкции, реферальные ссылки) уходит системной инструкцией, которую провайдер может
+закэшировать, а в каждом запросе меняется только часть с контекстом и вопросом.
+
+Бэкенд выбирается переменной окружения LLM_PROVIDER:
+    gemini - Google Gemini (google-generativeai)
+    openai - любой сервер с OpenAI-совместимым API /v1/chat/completions
+             (в том числе локальный fake_llm_server.py для проверок и замеров)
+    fake   - детерминированные ответы в процессе, с настраиваемой задержкой и долей ошибок
+Несколько бэкендов через запятую (например, "gemini,openai") - при ошибке запрос
+переходит к следующему.
+
+Все запросы проходят через ResilientBackend - единственный слой повторных попыток:
+таймаут попытки, повтор с экспоненциальной задержкой, circuit breaker (после серии
+ошибок запросы сразу отклоняются, пока пробный запрос не пройдет успешно) и, по желанию,
+хеджирование - дублирующий запрос, если ответ задерживается дольше p95.
+"""
+
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from dotenv import load_dotenv
+
+from prompt_builder import Prompt, as_prompt, estimate_tokens
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Бэкенды в порядке приоритета, через запятую
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+
+# Передавать статическую часть промпта системной инструкцией (0 - одним текстом, как раньше)
+LLM_SYSTEM_INSTRUCTION = os.getenv("LLM_SYSTEM_INSTRUCTION", "1") == "1"
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+# OpenAI-совместимый сервер
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:8089/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "fake-llm")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Фейковый бэкенд: задержка ответа и ее разброс (мс), доля запросов, завершающихся ошибкой
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "100"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+# Повторные попытки: таймаут одной попытки (с), количество повторов и начальная задержка (с)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "1"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "1"))
+
+# Circuit breaker: после скольких ошибок подряд запросы отклоняются и через сколько секунд
+# пропускается пробный запрос
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Хеджирование: дублирующий запрос, если ответ задерживается дольше перцентиля задержки
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Сколько последних задержек учитывается при расчете перцентиля
+LATENCY_WINDOW = 200
+
+QUESTION_PREFIX = "Вопрос пользователя:"
+
+class LLMBackendError(Exception):
+    """Ошибка запроса к LLM"""
+
+class CircuitOpenError(LLMBackendError):
+    """Запрос отклонен: LLM недоступен (circuit breaker разомкнут)"""
+
+class LLMResponse(NamedTuple):
+    """Ответ модели с метриками запроса"""
+
+    text: str
+    input_tokens: int
+    cached_tokens: int
+    output_tokens: int
+    latency: float
+
+class LLMBackend(abc.ABC):
+    """Базовый бэкенд LLM: единый интерфейс и метрики токенов и задержки"""
+
+    name = "llm"
+
+    def __init__(self, use_system_instruction: bool = LLM_SYSTEM_INSTRUCTION):
+        """
+        Инициализирует бэкенд.
+
+        Args:
+            use_system_instruction: Передавать статическую часть промпта системной инструкцией
+        """
+        self.use_system_instruction = use_system_instruction
+        self.stats = {"requests": 0, "errors": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                      "latency": 0.0}
+
+    def _split(self, prompt: Union[str, Prompt]) -> Tuple[str, str]:
+        """Возвращает (системная часть, часть запроса) с учетом режима бэкенда."""
+        prompt = as_prompt(prompt)
+        if self.use_system_instruction:
+            return prompt.system, prompt.user
+        return "", prompt.text
+
+    def _record(self, response: LLMResponse) -> LLMResponse:
+        """Учитывает ответ в метриках."""
+        self.stats["requests"] += 1
+        self.stats["input_tokens"] += response.input_tokens
+        self.stats["cached_tokens"] += response.cached_tokens
+        self.stats["output_tokens"] += response.output_tokens
+        self.stats["latency"] += response.latency
+        return response
+
+    @abc.abstractmethod
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        """
+        Выполняет запрос к модели.
+
+        Args:
+            prompt: Промпт (строка или Prompt со статической частью)
+
+        Returns:
+            Ответ модели с метриками
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        """
+        Потоковый запрос: отдает фрагменты текста по мере генерации.
+
+        Args:
+            prompt: Промпт (строка или Prompt со статической частью)
+
+        Yields:
+            Очередной фрагмент текста ответа
+        """
+        raise NotImplementedError
+        yield ""
+
+    async def count_tokens(self, prompt: Union[str, Prompt]) -> int:
+        """
+        Считает входные токены промпта.
+
+        По умолчанию - оценка по длине текста; бэкенды с точным подсчетом переопределяют метод.
+
+        Args:
+            prompt: Промпт (строка или Prompt со статической частью)
+
+        Returns:
+            Количество токенов
+        """
+        return estimate_tokens(as_prompt(prompt).text)
+
+    async def close(self):
+        """Освобождает ресурсы бэкенда (HTTP-сессии и т.п.)."""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики запросов: суммы и средние на запрос."""
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "avg_input_tokens": self.stats["input_tokens"] / requests if requests else 0.0,
+            "avg_cached_tokens": self.stats["cached_tokens"] / requests if requests else 0.0,
+            "avg_latency": self.stats["latency"] / requests if requests else 0.0,
+        }
+
+class GeminiBackend(LLMBackend):
+    """Бэкенд Google Gemini"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, use_system_instruction: bool = LLM_SYSTEM_INSTRUCTION):
+        """
+        Инициализирует бэкенд.
+
+        Args:
+            model_name: Название модели Gemini
+            use_system_instruction: Передавать статическую часть промпта системной инструкцией
+        """
+        super().__init__(use_system_instruction)
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise ValueError("Не найден GOOGLE_API_KEY. Добавьте его в .env файл")
+
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self._genai = genai
+        self.model_name = model_name
+
+        # Модели по системной инструкции: статических промптов немного (обычный и для возражений).
+        # Явный кэш контекста (CachedContent) не создаем: статическая часть (~500 токенов) намного
+        # меньше минимального размера кэша, повторяющийся префикс Gemini кэширует неявно
+        self._models: Dict[str, Any] = {}
+
+    def _get_model(self, system: str) -> Any:
+        """Возвращает модель для системной инструкции (создает при первом обращении)."""
+        model = self._models.get(system)
+        if model is not None:
+            return model
+
+        try:
+            model = self._genai.GenerativeModel(self.model_name, system_instruction=system or None)
+        except TypeError:
+            # Старые версии google-generativeai не поддерживают системные инструкции
+            logger.warning("google-generativeai не поддерживает system_instruction, промпт передается одним текстом")
+            self.use_system_instruction = False
+            model = self._genai.GenerativeModel(self.model_name)
+
+        self._models[system] = model
+        return model
+
+    def _prepare(self, prompt: Union[str, Prompt]) -> Tuple[Any, str]:
+        """Возвращает модель и текст запроса."""
+        system, user = self._split(prompt)
+        model = self._get_model(system)
+        if system and not self.use_system_instruction:
+            # Откат на время _get_model: системная инструкция не поддерживается
+            system, user = self._split(prompt)
+        return model, user
+
+    @staticmethod
+    def _usage(response: Any) -> Tuple[int, int, int]:
+        """Извлекает (входные, закэшированные, выходные) токены из ответа."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return 0, 0, 0
+        return (
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "cached_content_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        model, user = self._prepare(prompt)
+        started = time.perf_counter()
+        response = await model.generate_content_async(user)
+        latency = time.perf_counter() - started
+        return self._record(LLMResponse(response.text, *self._usage(response), latency))
+
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        model, user = self._prepare(prompt)
+        started = time.perf_counter()
+        response = await model.generate_content_async(user, stream=True)
+        parts = []
+        async for chunk in response:
+            if chunk.text:
+                parts.append(chunk.text)
+                yield chunk.text
+        latency = time.perf_counter() - started
+        self._record(LLMResponse("".join(parts), *self._usage(response), latency))
+
+    async def count_tokens(self, prompt: Union[str, Prompt]) -> int:
+        model, user = self._prepare(prompt)
+        response = await model.count_tokens_async(user)
+        return response.total_tokens
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Бэкенд сервера с OpenAI-совместимым API (/v1/chat/completions)"""
+
+    name = "openai"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, model: str = OPENAI_MODEL, api_key: str = OPENAI_API_KEY,
+                 use_system_instruction: bool = LLM_SYSTEM_INSTRUCTION):
+        """
+        Инициализирует бэкенд.
+
+        Args:
+            base_url: Адрес API (например, http://127.0.0.1:8089/v1)
+            model: Название модели
+            api_key: Ключ API (если сервер его требует)
+            use_system_instruction: Передавать статическую часть промпта системным сообщением
+        """
+        super().__init__(use_system_instruction)
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key
+        self._session = None
+        self._session_loop = None
+
+    def _get_session(self):
+        """Возвращает HTTP-сессию для текущего event loop."""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._session = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=OPENAI_TIMEOUT))
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        """Закрывает HTTP-сессию."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _payload(self, prompt: Union[str, Prompt], stream: bool) -> Dict[str, Any]:
+        """Формирует тело запроса."""
+        system, user = self._split(prompt)
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": user})
+        payload = {"model": self.model, "messages": messages, "stream": stream}
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @staticmethod
+    def _usage(usage: Optional[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Извлекает (входные, закэшированные, выходные) токены из поля usage."""
+        if not usage:
+            return 0, 0, 0
+        details = usage.get("prompt_tokens_details") or {}
+        return usage.get("prompt_tokens", 0), details.get("cached_tokens", 0), usage.get("completion_tokens", 0)
+
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        started = time.perf_counter()
+        async with self._get_session().post(self.url, json=self._payload(prompt, stream=False)) as response:
+            response.raise_for_status()
+            data = await response.json()
+        latency = time.perf_counter() - started
+        text = data["choices"][0]["message"]["content"]
+        return self._record(LLMResponse(text, *self._usage(data.get("usage")), latency))
+
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        parts, usage = [], None
+        async with self._get_session().post(self.url, json=self._payload(prompt, stream=True)) as response:
+            response.raise_for_status()
+            # Server-sent events: строки "data: {...}", завершаются "data: [DONE]"
+            async for line in response.content:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices", []):
+                    text = choice.get("delta", {}).get("content")
+                    if text:
+                        parts.append(text)
+                        yield text
+        latency = time.perf_counter() - started
+        self._record(LLMResponse("".join(parts), *self._usage(usage), latency))
+
+def fake_answer(user_text: str) -> str:
+    """Детерминированный ответ на вопрос пользователя из промпта."""
+    question = user_text.rsplit(QUESTION_PREFIX, 1)[-1].strip().split("\n", 1)[0]
+    digest = hashlib.sha1(question.encode("utf-8")).hexdigest()[:8]
+    return f"Тестовый ответ [{digest}] на вопрос: {question}"
+
+class FakeLLMBackend(LLMBackend):
+    """Детерминированный бэкенд в процессе: для нагрузочных замеров и работы без сети"""
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS, jitter_ms: float = FAKE_LLM_JITTER_MS,
+                 error_rate: float = FAKE_LLM_ERROR_RATE, seed: Optional[int] = None):
+        """
+        Инициализирует бэкенд.
+
+        Args:
+            latency_ms: Средняя задержка ответа (мс)
+            jitter_ms: Разброс задержки (мс, равномерно в обе стороны)
+            error_rate: Доля запросов, завершающихся LLMBackendError
+            seed: Начальное значение генератора (для воспроизводимых задержек и ошибок)
+        """
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    async def _respond(self, prompt: Union[str, Prompt]) -> Tuple[str, float]:
+        """Ждет заданную задержку и возвращает (ответ, задержка) или выбрасывает ошибку."""
+        started = time.perf_counter()
+        delay = max(self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms), 0.0)
+        await asyncio.sleep(delay / 1000)
+        if self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise LLMBackendError("Фейковый LLM: имитация ошибки")
+        return fake_answer(as_prompt(prompt).user), time.perf_counter() - started
+
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        text, latency = await self._respond(prompt)
+        input_tokens = await self.count_tokens(prompt)
+        return self._record(LLMResponse(text, input_tokens, 0, estimate_tokens(text), latency))
+
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        text, latency = await self._respond(prompt)
+        for word in text.split(" "):
+            yield word + " "
+        self._record(LLMResponse(text, await self.count_tokens(prompt), 0, estimate_tokens(text), latency))
+
+class FailoverBackend(LLMBackend):
+    """Несколько бэкендов по приоритету: при ошибке запрос переходит к следующему"""
+
+    name = "failover"
+
+    def __init__(self, backends: Sequence[LLMBackend]):
+        """
+        Инициализирует бэкенд.
+
+        Args:
+            backends: Бэкенды в порядке приоритета
+        """
+        super().__init__()
+        if not backends:
+            raise ValueError("Не задан ни один бэкенд LLM")
+        self.backends = list(backends)
+        self.stats["failovers"] = 0
+
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            try:
+                response = await backend.generate(prompt)
+                self.stats["requests"] += 1
+                return response
+            except Exception as e:
+                last_error = self._on_error(backend, e)
+        raise LLMBackendError(f"Все бэкенды LLM недоступны: {last_error}") from last_error
+
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            started = False
+            try:
+                async for text in backend.stream(prompt):
+                    started = True
+                    yield text
+                self.stats["requests"] += 1
+                return
+            except Exception as e:
+                # Часть ответа уже отправлена пользователю - продолжить другим бэкендом нельзя
+                if started:
+                    raise
+                last_error = self._on_error(backend, e)
+        raise LLMBackendError(f"Все бэкенды LLM недоступны: {last_error}") from last_error
+
+    def _on_error(self, backend: LLMBackend, error: Exception) -> Exception:
+        """Учитывает ошибку бэкенда и переход к следующему."""
+        self.stats["errors"] += 1
+        if backend is not self.backends[-1]:
+            self.stats["failovers"] += 1
+            logger.warning(f"LLM {backend.name}: ошибка ({error}), переключаемся на следующий бэкенд")
+        return error
+
+    async def count_tokens(self, prompt: Union[str, Prompt]) -> int:
+        return await self.backends[0].count_tokens(prompt)
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики: общие и по каждому бэкенду (токены и задержка - по бэкендам)."""
+        stats = {**self.stats, "backends": [{"name": backend.name, **backend.get_stats()} for backend in self.backends]}
+        for key in ("input_tokens", "cached_tokens", "output_tokens", "latency"):
+            stats[key] = sum(backend.stats[key] for backend in self.backends)
+        requests = sum(backend.stats["requests"] for backend in self.backends)
+        stats["avg_input_tokens"] = stats["input_tokens"] / requests if requests else 0.0
+        stats["avg_cached_tokens"] = stats["cached_tokens"] / requests if requests else 0.0
+        stats["avg_latency"] = stats["latency"] / requests if requests else 0.0
+        return stats
+
+class CircuitBreaker:
+    """Circuit breaker: отключает запросы к недоступному сервису после серии ошибок"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET):
+        """
+        Инициализирует breaker.
+
+        Args:
+            failure_threshold: Количество ошибок подряд, после которого запросы отклоняются
+            reset_timeout: Через сколько секунд после размыкания пропускается пробный запрос
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Проверяет, можно ли выполнить запрос (в полуоткрытом состоянии - только один пробный)."""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """Снимает отметку пробного запроса, если запрос прерван без результата (отмена, закрытие потока)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        """Учитывает успешный запрос: breaker замыкается."""
+        if self.state != self.CLOSED:
+            logger.info("LLM снова доступен, circuit breaker замкнут")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """Учитывает ошибку: после failure_threshold ошибок подряд (или ошибки пробного запроса) breaker размыкается."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"LLM недоступен ({self.failures} ошибок подряд), запросы отклоняются "
+                               f"на {self.reset_timeout:g} с")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class ResilientBackend(LLMBackend):
+    """Обертка бэкенда: таймауты, повторные попытки, circuit breaker и хеджирование запросов"""
+
+    def __init__(self, backend: LLMBackend, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None, hedge: bool = LLM_HEDGE):
+        """
+        Инициализирует обертку.
+
+        Args:
+            backend: Бэкенд LLM
+            timeout: Таймаут одной попытки (для потока - ожидания очередного фрагмента), с
+            retries: Количество повторных попыток после ошибки
+            breaker: Circuit breaker (по умолчанию - с параметрами из окружения)
+            hedge: Отправлять дублирующий запрос, если ответ задерживается дольше перцентиля задержки
+        """
+        super().__init__()
+        self.backend = backend
+        self.name = backend.name
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"retries": 0, "rejected": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0}
+
+    def _check_breaker(self):
+        """Отклоняет запрос сразу, если breaker разомкнут."""
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError("LLM временно недоступен")
+
+    async def _on_failure(self, error: Exception, attempt: int) -> bool:
+        """
+        Учитывает ошибку попытки и ждет перед повтором.
+
+        Returns:
+            True, если можно повторить запрос
+        """
+        self.breaker.record_failure()
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats["timeouts"] += 1
+        logger.error(f"LLM {self.name}: попытка {attempt + 1}/{self.retries + 1} не удалась: {error!r}")
+        if attempt >= self.retries:
+            return False
+        self.stats["retries"] += 1
+        backoff = LLM_RETRY_BACKOFF * 2 ** attempt
+        # Случайная добавка, чтобы повторы от разных пользователей не совпадали по времени
+        await asyncio.sleep(backoff + random.uniform(0, 0.1 * backoff))
+        return True
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Задержка, после которой отправляется дублирующий запрос (None - не хеджировать)."""
+        if not self.hedge or len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * LLM_HEDGE_PERCENTILE / 100), len(latencies) - 1)]
+
+    async def _attempt(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        """Одна попытка запроса: с таймаутом и, если задержка превышает перцентиль, с дублирующим запросом."""
+        tasks = {asyncio.ensure_future(asyncio.wait_for(self.backend.generate(prompt), self.timeout))}
+        primary = next(iter(tasks))
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    self.stats["hedged"] += 1
+                    tasks.add(asyncio.ensure_future(asyncio.wait_for(self.backend.generate(prompt), self.timeout)))
+
+            # Первый успешный ответ; ошибка - только если не удались все запросы
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate(self, prompt: Union[str, Prompt]) -> LLMResponse:
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                response = await self._attempt(prompt)
+            except Exception as e:
+                if not await self._on_failure(e, attempt):
+                    raise LLMBackendError(f"LLM {self.name} не ответил: {e!r}") from e
+                attempt += 1
+                continue
+            except BaseException:
+                # Запрос отменен: результата нет, но пробный запрос breaker должен освободиться
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            self.latencies.append(response.latency)
+            return response
+
+    async def stream(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        attempt = 0
+        while True:
+            self._check_breaker()
+            started = time.perf_counter()
+            chunks = self.backend.stream(prompt).__aiter__()
+            sent = False
+            try:
+                while True:
+                    try:
+                        text = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    sent = True
+                    yield text
+            except Exception as e:
+                # Часть ответа уже отправлена пользователю - повторять запрос поздно
+                if sent:
+                    self.breaker.record_failure()
+                    raise
+                if not await self._on_failure(e, attempt):
+                    raise LLMBackendError(f"LLM {self.name} не ответил: {e!r}") from e
+                attempt += 1
+                continue
+            except BaseException:
+                # Отмена или закрытие потока потребителем (GeneratorExit) - освобождаем пробный запрос
+                self.breaker.release()
+                raise
+            finally:
+                await chunks.aclose()
+            self.breaker.record_success()
+            self.latencies.append(time.perf_counter() - started)
+            return
+
+    async def count_tokens(self, prompt: Union[str, Prompt]) -> int:
+        return await self.backend.count_tokens(prompt)
+
+    async def close(self):
+        await self.backend.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики бэкенда, повторов, хеджирования и состояние breaker."""
+        hedge_delay = self._hedge_delay()
+        return {
+            **self.backend.get_stats(),
+            **self.stats,
+            "breaker": self.breaker.state,
+            "hedge_delay": hedge_delay,
+        }
+
+BACKEND_FACTORIES = {
+    "gemini": GeminiBackend,
+    "openai": OpenAICompatibleBackend,
+    "fake": FakeLLMBackend,
+}
+
+def create_llm_backend(providers: str = LLM_PROVIDER, resilient: bool = True) -> LLMBackend:
+    """
+    Создает бэкенд LLM по списку провайдеров.
+
+    Провайдеры, которые не удалось создать (например, нет GOOGLE_API_KEY), пропускаются
+    с предупреждением; если их несколько, используется FailoverBackend.
+
+    Args:
+        providers: Названия бэкендов через запятую в порядке приоритета
+        resilient: Обернуть бэкенд в ResilientBackend (повторы, circuit breaker, хеджирование)
+
+    Returns:
+        Бэкенд LLM
+    """
+    backends: List[LLMBackend] = []
+    for provider in (name.strip() for name in providers.split(",") if name.strip()):
+        factory = BACKEND_FACTORIES.get(provider)
+        if factory is None:
+            logger.warning(f"Неизвестный бэкенд LLM: {provider}")
+            continue
+        try:
+            backends.append(factory())
+        except Exception as e:
+            logger.warning(f"Бэкенд LLM {provider} недоступен: {e}")
+
+    if not backends:
+        raise ValueError(f"Не удалось создать ни один бэкенд LLM из LLM_PROVIDER={providers}")
+    logger.info(f"LLM: {', '.join(backend.name for backend in backends)}")
+    backend = backends[0] if len(backends) == 1 else FailoverBackend(backends)
+    return ResilientBackend(backend) if resilient else backend
@@ -0,0 +1,93 @@
+"""
+Общий слой отрисовки сообщений симуляторов.
+
+Вместо отправки нового сообщения на каждое нажатие кнопки редактирует текущее
+сообщение (текст и клавиатуру), пропускает вызов API, если содержимое не изменилось,
+и отправляет новое сообщение, только если редактирование невозможно.
+"""
+
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Максимальное количество сообщений, для которых запоминается отрисованное содержимое
+RENDER_CACHE_SIZE = 10000
+
+# (chat_id, message_id) -> отпечаток последнего отрисованного содержимого
+_rendered_messages: "OrderedDict[tuple, str]" = OrderedDict()
+
+# Счетчики вызовов: edit - editMessageText, send - sendMessage, skip - вызов не понадобился
+_render_stats = Counter()
+
+def _fingerprint(text: str, reply_markup: Optional[InlineKeyboardMarkup], parse_mode: Optional[str]) -> str:
+    """Отпечаток содержимого сообщения для сравнения без хранения текста."""
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup else ""
+    return hashlib.sha1(f"{parse_mode}\x00{text}\x00{markup}".encode("utf-8")).hexdigest()
+
+def _remember(message: Message, fingerprint: str):
+    """Запоминает содержимое сообщения, вытесняя самые старые записи."""
+    key = (message.chat.id, message.message_id)
+    _rendered_messages[key] = fingerprint
+    _rendered_messages.move_to_end(key)
+    while len(_rendered_messages) > RENDER_CACHE_SIZE:
+        _rendered_messages.popitem(last=False)
+
+async def render_message(
+    callback: CallbackQuery,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = "Markdown"
+) -> Message:
+    """
+    Отрисовывает экран симулятора в сообщении, к которому привязана кнопка.
+
+    Args:
+        callback: Callback-запрос от нажатой кнопки
+        text: Текст сообщения
+        reply_markup: Клавиатура сообщения (None - убрать клавиатуру)
+        parse_mode: Режим разметки текста
+
+    Returns:
+        Сообщение, в котором отображается экран
+    """
+    message = callback.message
+    fingerprint = _fingerprint(text, reply_markup, parse_mode)
+
+    # Содержимое не изменилось - вызов API не нужен
+    if _rendered_messages.get((message.chat.id, message.message_id)) == fingerprint:
+        _render_stats["skip"] += 1
+        return message
+
+    # Редактировать текст можно только у текстовых сообщений (не у фото с подписью)
+    if message.text is not None:
+        try:
+            await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            _render_stats["edit"] += 1
+            _remember(message, fingerprint)
+            return message
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                _render_stats["edit"] += 1
+                _remember(message, fingerprint)
+                return message
+            logger.warning(f"Не удалось отредактировать сообщение, отправляем новое: {e}")
+
+    sent_message = await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    _render_stats["send"] += 1
+    _remember(sent_message, fingerprint)
+    return sent_message
+
+def get_render_stats() -> Dict[str, int]:
+    """Возвращает счетчики вызовов API слоя отрисовки."""
+    return {
+        "edit": _render_stats["edit"],
+        "send": _render_stats["send"],
+        "skip": _render_stats["skip"],
+    }
@@ -0,0 +1,240 @@
+"""
+ONNX-бэкенд для кодирования запросов моделью all-MiniLM-L6-v2 на CPU.
+
+Модель экспортируется из SentenceTransformers в ONNX, квантуется в int8
+(динамическая квантизация) и выполняется через onnxruntime без загрузки PyTorch.
+
+Использование:
+    python onnx_encoder.py export   # экспорт и квантизация модели
+    python onnx_encoder.py parity   # сверка с PyTorch-моделью на базе знаний
+"""
+
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Пути к данным
+MODEL_NAME = "all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.path.join("models", f"{MODEL_NAME}-onnx")
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "encoder_config.json"
+
+# Пороги сверки с PyTorch-моделью: int8 допускает небольшие отклонения, но не должен менять выдачу заметно
+PARITY_MIN_COSINE_FP32 = 0.999
+PARITY_MIN_COSINE_INT8 = 0.98
+PARITY_MIN_TOP_K_OVERLAP = 0.8
+
+class OnnxSentenceEncoder:
+    """
+    Кодировщик предложений на onnxruntime с тем же интерфейсом encode, что у SentenceTransformer
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = True, num_threads: int = 0):
+        """
+        Загружает экспортированную модель.
+
+        Args:
+            model_dir: Директория с экспортированной моделью и токенизатором
+            quantized: Использовать int8-модель вместо fp32
+            num_threads: Количество потоков onnxruntime (0 - по умолчанию)
+        """
+        # Необязательные зависимости импортируем только при выборе этого бэкенда
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Не найдена ONNX-модель {model_path}. Сначала выполните: python onnx_encoder.py export")
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), "r") as f:
+            self.config = json.load(f)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.config["max_seq_length"]
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Создает нормализованные эмбеддинги текстов (mean pooling, как в SentenceTransformers).
+
+        Args:
+            texts: Список текстов
+            batch_size: Размер батча
+
+        Returns:
+            Массив эмбеддингов формы (len(texts), dimension)
+        """
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            token_embeddings = self.session.run(None, feed)[0]
+
+            # Усредняем эмбеддинги токенов с учетом маски внимания
+            mask = encoded["attention_mask"].astype(np.float32)[:, :, np.newaxis]
+            summed = (token_embeddings * mask).sum(axis=1)
+            counts = np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings = summed / counts
+
+            norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            results.append((embeddings / norms).astype(np.float32))
+
+        if not results:
+            return np.zeros((0, self.config["dimension"]), dtype=np.float32)
+        return np.vstack(results)
+
+def export_onnx_model(model_name: str = MODEL_NAME, output_dir: str = ONNX_MODEL_DIR):
+    """
+    Экспортирует модель SentenceTransformers в ONNX и создает int8-версию.
+
+    Args:
+        model_name: Название модели SentenceTransformers
+        output_dir: Директория для сохранения
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class LastHiddenState(torch.nn.Module):
+        """Обертка, возвращающая только эмбеддинги токенов."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    sample = tokenizer(["пример запроса"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, ONNX_FP32_FILE)
+
+    # Начиная с torch 2.9 по умолчанию работает экспортер dynamo (нужен onnxscript, другие
+    # правила динамических осей) - используем прежний экспортер TorchScript
+    export_options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    print(f"Экспорт {model_name} в {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+            **export_options
+        )
+
+    int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+    print(f"Динамическая квантизация в int8: {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+        }, f)
+
+    for file_name in (ONNX_FP32_FILE, ONNX_INT8_FILE):
+        size_mb = os.path.getsize(os.path.join(output_dir, file_name)) / 1024 / 1024
+        print(f"{file_name}: {size_mb:.1f} МБ")
+
+def embedding_cosines(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Косинусное сходство соответствующих эмбеддингов двух моделей (по строкам)."""
+    reference = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    candidate = candidate / np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    return np.sum(reference * candidate, axis=1)
+
+def check_parity(model_dir: str = ONNX_MODEL_DIR, vector_db_path: str = "vector_db", k: int = 5):
+    """
+    Сверяет ONNX-кодировщик с PyTorch-моделью на чанках базы знаний и тестовых запросах.
+
+    Печатает минимальное косинусное сходство эмбеддингов, совпадение top-k при поиске
+    и время кодирования одного запроса. Возвращает код завершения (0 - сверка пройдена).
+    """
+    from sentence_transformers import SentenceTransformer
+    from vector_store import load_documents, load_index, resolve_generation_path
+
+    vector_db_path = resolve_generation_path(vector_db_path)
+    texts = list(load_documents(vector_db_path)[0])
+    index = load_index(vector_db_path)
+    queries = [
+        "Как начать зарабатывать?", "Что такое ECR?", "Это пирамида?", "Кто основатель проекта?",
+        "Как вывести деньги?", "Чем отличается быстрый поток от растущего?", "Что такое AML политика?",
+    ]
+
+    torch_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    report = {}
+    for quantized in (False, True):
+        encoder = OnnxSentenceEncoder(model_dir, quantized=quantized)
+        name = "int8" if quantized else "fp32"
+
+        reference = torch_model.encode(texts + queries, normalize_embeddings=True)
+        candidate = encoder.encode(texts + queries)
+        min_cosine = float(np.min(embedding_cosines(reference, candidate)))
+
+        _, ref_ids = index.search(np.ascontiguousarray(reference[len(texts):], dtype=np.float32), k)
+        _, cand_ids = index.search(np.ascontiguousarray(candidate[len(texts):], dtype=np.float32), k)
+        overlap = np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_ids, cand_ids)])
+
+        started = time.perf_counter()
+        for query in queries:
+            encoder.encode([query])
+        latency_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+        report[name] = (min_cosine, overlap)
+        print(f"[{name}] мин. косинусное сходство: {min_cosine:.4f}, совпадение top-{k}: {overlap:.2%}, "
+              f"задержка запроса: {latency_ms:.1f} мс")
+
+    started = time.perf_counter()
+    for query in queries:
+        torch_model.encode([query])
+    print(f"[torch] задержка запроса: {(time.perf_counter() - started) / len(queries) * 1000:.1f} мс")
+
+    passed = (report["fp32"][0] >= PARITY_MIN_COSINE_FP32 and report["int8"][0] >= PARITY_MIN_COSINE_INT8
+              and report["int8"][1] >= PARITY_MIN_TOP_K_OVERLAP)
+    print("Сверка пройдена" if passed else "Сверка НЕ пройдена")
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "export":
+        export_onnx_model()
+    elif command == "parity":
+        sys.exit(check_parity())
+    else:
+        print(__doc__)
@@ -0,0 +1,235 @@
+"""
+Сборка промпта AI-ассистента в пределах бюджета токенов.
+
+Статическая часть (инструкции, реферальные ссылки) подготавливается один раз, а контекст
+базы знаний и история диалога ужимаются под оставшийся бюджет: чанки отбираются по
+релевантности, повторы удаляются, длинные чанки обрезаются до самых релевантных
+предложений, старые реплики диалога сворачиваются в краткое резюме.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Union
+
+from bm25_index import tokenize
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Оценка длины в токенах: для русского текста токенизатор Gemini дает ~3 символа на токен
+CHARS_PER_TOKEN = 3.0
+
+# Доля бюджета (после статической части и вопроса), которую может занять история диалога
+HISTORY_SHARE = 0.35
+
+# Сколько последних сообщений истории передается дословно (остальные - в резюме)
+RECENT_MESSAGES = 4
+
+# Максимальная длина реплики в резюме старой части диалога (символы)
+SUMMARY_MESSAGE_CHARS = 160
+
+# Доля общих терминов, начиная с которой чанк считается повтором уже выбранного
+DUPLICATE_OVERLAP = 0.8
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+class Prompt(NamedTuple):
+    """Промпт из статической части (системная инструкция) и части, зависящей от запроса"""
+
+    system: str
+    user: str
+
+    @property
+    def text(self) -> str:
+        """Промпт одним текстом - для моделей без системных инструкций."""
+        return f"{self.system}\n\n{self.user}" if self.system else self.user
+
+def as_prompt(prompt: Union[str, Prompt]) -> Prompt:
+    """Приводит строку к Prompt без системной части."""
+    return prompt if isinstance(prompt, Prompt) else Prompt("", prompt)
+
+def estimate_tokens(text: str) -> int:
+    """Оценивает количество токенов в тексте без обращения к API."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+def split_sentences(text: str) -> List[str]:
+    """Разбивает текст на предложения (и строки списков)."""
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+class PromptBuilder:
+    """Сборщик промпта с ограничением размера"""
+
+    def __init__(self, token_budget: int = 2500):
+        """
+        Инициализирует сборщик.
+
+        Args:
+            token_budget: Максимальный размер промпта в токенах (по оценке estimate_tokens)
+        """
+        self.token_budget = token_budget
+        self.stats = {"prompts": 0, "tokens": 0, "chunks_dropped": 0, "chunks_trimmed": 0, "history_summarized": 0}
+
+    def select_context(self, query: str, docs: Sequence[Dict[str, Any]], budget: int) -> str:
+        """
+        Отбирает контекст базы знаний в пределах бюджета.
+
+        Чанки берутся в порядке ранжирования поиска; повторы уже выбранных чанков и
+        предложений пропускаются; чанк, который не помещается целиком, обрезается до
+        предложений с наибольшим пересечением с запросом.
+
+        Args:
+            query: Запрос пользователя
+            docs: Найденные документы (по убыванию релевантности)
+            budget: Бюджет токенов на контекст
+
+        Returns:
+            Текст контекста для промпта
+        """
+        query_terms = set(tokenize(query))
+        seen_sentences: Set[str] = set()
+        selected_terms: List[Set[str]] = []
+        sections = []
+        remaining = budget
+
+        for doc in docs:
+            terms = set(tokenize(doc["text"]))
+            if any(len(terms & other) / max(len(terms), 1) >= DUPLICATE_OVERLAP for other in selected_terms):
+                self.stats["chunks_dropped"] += 1
+                continue
+
+            # Предложения, уже попавшие в промпт из другого чанка, не повторяем
+            sentences = [s for s in split_sentences(doc["text"]) if s not in seen_sentences]
+            header = f"### {doc['metadata']['source'].replace('_', ' ')}:"
+            available = remaining - estimate_tokens(header) - 1
+            if not sentences or available <= 0:
+                self.stats["chunks_dropped"] += 1
+                continue
+
+            text = " ".join(sentences)
+            if estimate_tokens(text) > available:
+                sentences = self._most_relevant_sentences(sentences, query_terms, available)
+                if not sentences:
+                    self.stats["chunks_dropped"] += 1
+                    continue
+                text = " ".join(sentences)
+                self.stats["chunks_trimmed"] += 1
+
+            sections.append(f"{header}\n{text}")
+            seen_sentences.update(sentences)
+            selected_terms.append(terms)
+            remaining -= estimate_tokens(sections[-1]) + 1
+
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _most_relevant_sentences(sentences: List[str], query_terms: Set[str], budget: int) -> List[str]:
+        """Выбирает предложения с наибольшим пересечением с запросом, сохраняя исходный порядок."""
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: (-len(query_terms & set(tokenize(sentences[i]))), i)
+        )
+        chosen, used = [], 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i]) + 1
+            if used + cost <= budget:
+                chosen.append(i)
+                used += cost
+        return [sentences[i] for i in sorted(chosen)]
+
+    def format_history(self, messages: Sequence[Dict[str, str]], budget: int) -> str:
+        """
+        Форматирует историю диалога в пределах бюджета.
+
+        Последние RECENT_MESSAGES сообщений передаются дословно, более старые
+        сворачиваются в резюме из первых предложений реплик. Если и так не помещается,
+        сначала отбрасывается резюме, затем обрезаются самые старые из последних сообщений.
+        """
+        if not messages or budget <= 0:
+            return ""
+
+        def line(message: Dict[str, str], text: str) -> str:
+            prefix = "Пользователь: " if message["role"] == "user" else "Ассистент: "
+            return f"{prefix}{text}"
+
+        older, recent = messages[:-RECENT_MESSAGES], messages[-RECENT_MESSAGES:]
+
+        summary_lines = []
+        for message in older:
+            first_sentence = (split_sentences(message["content"]) or [""])[0]
+            summary_lines.append(line(message, first_sentence[:SUMMARY_MESSAGE_CHARS]))
+        if summary_lines:
+            self.stats["history_summarized"] += 1
+
+        recent_lines = [line(message, message["content"]) for message in recent]
+
+        summary = "Кратко о начале диалога:\n" + "\n".join(summary_lines) if summary_lines else ""
+        text = "\n\n".join(part for part in (summary, "\n\n".join(recent_lines)) if part)
+        if estimate_tokens(text) <= budget:
+            return text
+
+        # Не помещается: оставляем только последние сообщения и обрезаем их с начала
+        remaining = budget
+        kept = []
+        for recent_line in reversed(recent_lines):
+            max_chars = int(remaining * CHARS_PER_TOKEN)
+            if max_chars <= 0:
+                break
+            if len(recent_line) > max_chars:
+                recent_line = recent_line[:max_chars].rsplit(" ", 1)[0] + "…"
+            kept.append(recent_line)
+            remaining -= estimate_tokens(recent_line) + 1
+        return "\n\n".join(reversed(kept))
+
+    def build(self, static_prompt: str, query: str, docs: Sequence[Dict[str, Any]],
+              user_name: Optional[str] = None, history_messages: Sequence[Dict[str, str]] = (),
+              instruction: str = "") -> Prompt:
+        """
+        Собирает промпт.
+
+        Args:
+            static_prompt: Неизменная часть промпта (подготавливается один раз)
+            query: Вопрос пользователя
+            docs: Найденные документы базы знаний
+            user_name: Имя пользователя
+            history_messages: Сообщения истории диалога ({"role", "content"})
+            instruction: Завершающая инструкция (приветствовать или нет)
+
+        Returns:
+            Промпт для модели: статическая часть отдельно от части, зависящей от запроса
+        """
+        user_info = f"Информация о пользователе:\n- Имя: {user_name}" if user_name else ""
+        question = f"Вопрос пользователя: {query}"
+
+        fixed_tokens = sum(estimate_tokens(part) for part in (static_prompt, user_info, question, instruction))
+        remaining = max(self.token_budget - fixed_tokens, 0)
+
+        # Контекст базы знаний важнее истории: история получает не больше HISTORY_SHARE
+        history_full_tokens = sum(estimate_tokens(m["content"]) + 5 for m in history_messages)
+        history_reserve = min(history_full_tokens, int(remaining * HISTORY_SHARE))
+        context = self.select_context(query, docs, remaining - history_reserve)
+        history = self.format_history(history_messages, remaining - estimate_tokens(context))
+
+        parts = []
+        if context:
+            parts.append(f"Данные базы знаний:\n{context}")
+        if user_info:
+            parts.append(user_info)
+        if history:
+            parts.append(f"История диалога:\n{history}")
+        parts.append(question)
+        if instruction:
+            parts.append(instruction)
+        prompt = Prompt(static_prompt, "\n\n".join(parts))
+
+        tokens = estimate_tokens(prompt.text)
+        self.stats["prompts"] += 1
+        self.stats["tokens"] += tokens
+        logger.debug(f"Промпт: ~{tokens} токенов (бюджет {self.token_budget})")
+        return prompt
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики сборки промптов, включая средний размер."""
+        return {
+            **self.stats,
+            "avg_tokens": self.stats["tokens"] / self.stats["prompts"] if self.stats["prompts"] else 0.0,
+        }
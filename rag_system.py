@@ -1,118 +1,243 @@
 import os
-from typing import List, Dict, Any, Optional
+import sys
+import asyncio
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Union
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-import pickle
-import json
-import google.generativeai as genai
+from answer_cache import SemanticAnswerCache
+from vector_store import VectorDBGeneration, get_vector_db_version, ids_to_positions
+from bm25_index import reciprocal_rank_fusion
+from prompt_builder import Prompt, PromptBuilder
+from prompts import (
+    CALCULATION_ANSWER, CONTINUATION_INSTRUCTION, FIRST_MESSAGE_INSTRUCTION, STATIC_OBJECTION_PROMPT,
+    STATIC_SYSTEM_PROMPT, USER_NAME_PLACEHOLDER
+)
+from intent_router import INTENT_CALCULATION, STATIC_INTENTS, IntentRouter
+from template_answers import TemplateAnswers, detect_language
+from dialog_store import DialogHistory, DialogStore
+from llm_backend import CircuitOpenError, create_llm_backend
 from dotenv import load_dotenv
 import logging
 import time
-import random
 import re
 
 # Загружаем переменные окружения
 load_dotenv()
 
-# Проверка наличия API-ключа
-if not os.getenv("GOOGLE_API_KEY"):
-    raise ValueError("Не найден GOOGLE_API_KEY. Добавьте его в .env файл")
-
 # Пути к данным
 VECTOR_DB_PATH = "vector_db"
 MODEL_NAME = "all-MiniLM-L6-v2"  # Модель для эмбеддингов
-GEMINI_MODEL = "gemini-1.5-flash"  # Используем 1.5-flash (бесплатная версия) или 1.5-pro, или 1.0-pro
-
-# Настраиваем Gemini API
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-# Промпт-шаблоны
-SYSTEM_PROMPT = """
-Ты — AI-ассистент проекта PotokCash, который общается в стиле лидера проекта: просто, искренне, с духовным посылом.
-Твоя задача — помогать пользователям понять принципы работы финансовых потоков и преимущества проекта.
+# Бэкенд кодирования запросов: torch (SentenceTransformers) или onnx (int8-модель на onnxruntime)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("models", f"{MODEL_NAME}-onnx"))
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "1") == "1"
 
-Используй следующие данные для ответов:
-{context}
+# Максимальное количество одновременных запросов к LLM (остальные ждут в очереди)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
 
-Всегда стремись быть полезным, вдохновляющим и убедительным.
+# Количество потоков для поиска по векторной БД (эмбеддинг запроса + FAISS)
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "2"))
 
-Если нужно выдать информацию о Васаилии Мутусевич то его фамилия не склоняется
+# Количество чанков базы знаний в промпте и кандидатов каждого поиска (dense и BM25) для слияния
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "12"))
 
-Если вопрос  про сдату основания то отвечай что проект был основан 15 января 2013 года. На сегодняшний день ему уже более 12 лет!
+# Гибридный поиск: векторный + BM25 с объединением reciprocal rank fusion.
+# Включается явно, пока не подтвержден замером (python bm25_index.py benchmark)
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "0") == "1"
 
-Если пользователь спрашивает о том, как начать зарабатывать, как получить реферальную ссылку или как зарегистрироваться, 
-предложи ему полный список реферальных ссылок для разных регионов:
+# Распознавание намерений по смыслу (сходство с вопросами-прототипами), если ключевые слова не сработали
+INTENT_EMBEDDINGS = os.getenv("INTENT_EMBEDDINGS", "0") == "1"
+INTENT_SIMILARITY_THRESHOLD = float(os.getenv("INTENT_SIMILARITY_THRESHOLD", "0.8"))
 
-МОЯ 1-я ЛИНИЯ И ЛИЧНОЕ СОПРОВОЖДЕНИЕ НА ВСЕХ ПЛАТФОРМАХ 👇😉
+# Бюджет размера промпта в токенах (контекст и история ужимаются под него)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
 
-‼️Регистрация и вход на платформы через вкл. VPN 👇
+# Как часто проверять, не пересобрана ли векторная БД (секунды; 0 - не проверять)
+VECTOR_DB_RELOAD_INTERVAL = float(os.getenv("VECTOR_DB_RELOAD_INTERVAL", "30"))
 
-🇷🇺 РФ и СНГ — https://potok.cash/ref/HPLTzKyq
-🇪🇺 EURO — https://eur.cashflow.fund/ref/ncPTzKyq
-🇪🇸 Испания — https://es.cashflow.fund/ref/nmbTzKyq
-🇵🇱 Польша — https://pl.cashflow.fund/ref/3sHTzKyq
-🇰🇬 Кыргызстан — https://cashflow-kg.fund/ref/XsPTzKyq
-🇬🇧 Великобритания — https://gb.cashflow.fund/ref/XZbTzKyq
-🇨🇳 Китай — https://cn.cashflow.fund/ref/XsbTzKyq
+# Количество эмбеддингов запросов в LRU-кэше
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
 
-СВЯЗАТЬСЯ И ПООБЩАТЬСЯ С ДЕЙСТВУЮЩИМ ЛИДЕРОМ ВАСИЛИЕМ МАТУСЕВИЧ - ТЕЛЕГРАМ — https://t.me/konvict171
+# Микро-батчинг эмбеддингов: сколько ждать попутные запросы (мс) и максимальный размер батча
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
 
+# Семантический кэш ответов: порог косинусного сходства вопросов, время жизни (с) и размер
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
 
+# Порог сходства для ответа из кэша, когда LLM недоступен (ниже обычного: лучше близкий ответ, чем ошибка)
+FALLBACK_CACHE_THRESHOLD = float(os.getenv("FALLBACK_CACHE_THRESHOLD", "0.8"))
 
-Если пользователь спрашивает о расчете заработка или хочет посчитать потенциальный доход, 
-предложи ему воспользоваться симуляторами в боте (кнопка "🎮 СИМУЛЯТОРЫ | SIMULATORS" в главном меню).
-"""
+TECHNICAL_ERROR_ANSWER = ("Извините, возникли технические проблемы при обработке вашего запроса. "
+                          "Пожалуйста, повторите вопрос через несколько секунд.")
 
-OBJECTION_PROMPT = """
-Пользователь высказал возражение: "{query}"
-Используй следующую информацию для работы с этим возражением:
-{context}
+# Пометка в конце ответа, если поток от LLM оборвался после части текста
+STREAM_INTERRUPTED_NOTE = ("\n\n⚠️ Ответ прервался из-за технической ошибки. "
+                           "Пожалуйста, повторите вопрос через несколько секунд.")
 
-Отвечай искренне, с пониманием точки зрения пользователя, но убедительно объясняя ошибочность опасений.
-Приведи факты и истории успеха, которые опровергают возражение.
-"""
-
-class DialogHistory:
-    """Класс для управления историей диалога с пользователем"""
+class EmbeddingBatcher:
+    """
+    Сервис эмбеддингов с микро-батчингом: запросы, пришедшие в течение нескольких
+    миллисекунд, кодируются одним вызовом encode
+    """
+    
+    # Границы корзин гистограмм: размер батча и время ожидания в очереди (мс)
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+    QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
     
-    def __init__(self, max_history: int = 5):
+    def __init__(self, model: Any, max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+                 max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE):
         """
-        Инициализирует историю диалога.
+        Инициализирует сервис.
         
         Args:
-            max_history: Максимальное количество сообщений в истории
+            model: Модель для создания эмбеддингов (любой объект с методом encode)
+            max_wait_ms: Сколько ждать попутные запросы после первого запроса батча
+            max_batch_size: Максимальный размер батча
         """
-        self.messages = []
-        self.max_history = max_history
+        self.model = model
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        
+        self._stats_lock = threading.Lock()
+        self.batch_size_histogram = [0] * (len(self.BATCH_SIZE_BUCKETS) + 1)
+        self.queue_wait_histogram = [0] * (len(self.QUEUE_WAIT_MS_BUCKETS) + 1)
+        self.stats = {"batches": 0, "texts": 0}
     
-    def add_message(self, role: str, content: str):
+    def submit(self, text: str) -> Future:
         """
-        Добавляет сообщение в историю.
+        Ставит текст в очередь на кодирование.
         
         Args:
-            role: Роль отправителя сообщения ('user' или 'assistant')
-            content: Содержание сообщения
+            text: Текст для создания эмбеддинга
+            
+        Returns:
+            Future с нормализованным эмбеддингом
         """
-        self.messages.append({"role": role, "content": content})
-        
-        # Если история стала слишком длинной, удаляем самые старые сообщения
-        if len(self.messages) > self.max_history * 2:  # * 2, так как каждое взаимодействие - это 2 сообщения
-            self.messages = self.messages[-self.max_history * 2:]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
     
-    def get_history_text(self) -> str:
+    def encode(self, text: str) -> np.ndarray:
+        """Синхронно возвращает нормализованный эмбеддинг текста."""
+        return self.submit(text).result()
+    
+    def _ensure_worker(self):
+        """Запускает фоновый поток обработки при первом запросе."""
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+    
+    def _run(self):
+        """Цикл фонового потока: собирает батч и кодирует его одним вызовом."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            self._encode_batch(batch)
+    
+    def _encode_batch(self, batch: List[tuple]):
+        """Кодирует батч и передает результаты в Future запросов."""
+        started = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+        
+        try:
+            embeddings = np.ascontiguousarray(self.model.encode(texts), dtype=np.float32)
+            # Нормализуем для косинусного сходства
+            faiss.normalize_L2(embeddings)
+            embeddings.setflags(write=False)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        
+        for i, (_, future, _) in enumerate(batch):
+            future.set_result(embeddings[i])
+        
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            self.batch_size_histogram[self._bucket(len(batch), self.BATCH_SIZE_BUCKETS)] += 1
+            for _, _, enqueued in batch:
+                wait_ms = (started - enqueued) * 1000
+                self.queue_wait_histogram[self._bucket(wait_ms, self.QUEUE_WAIT_MS_BUCKETS)] += 1
+    
+    @staticmethod
+    def _bucket(value: float, buckets: tuple) -> int:
+        """Индекс корзины гистограммы (последняя корзина - больше максимальной границы)."""
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                return i
+        return len(buckets)
+    
+    def get_stats(self) -> Dict[str, Any]:
         """
-        Возвращает историю диалога в виде текста.
+        Возвращает метрики сервиса.
         
         Returns:
-            Текст истории диалога
+            Количество батчей и текстов, средний размер батча и гистограммы
+            {"<=граница": количество} для размера батча и ожидания в очереди (мс)
         """
-        history_text = ""
-        for message in self.messages:
-            prefix = "Пользователь: " if message["role"] == "user" else "Ассистент: "
-            history_text += f"{prefix}{message['content']}\n\n"
-        
-        return history_text.strip()
+        def histogram(counts, buckets):
+            labels = [f"<={bound}" for bound in buckets] + [f">{buckets[-1]}"]
+            return dict(zip(labels, counts))
+        
+        with self._stats_lock:
+            return {
+                **self.stats,
+                "avg_batch_size": self.stats["texts"] / self.stats["batches"] if self.stats["batches"] else 0.0,
+                "batch_size_histogram": histogram(self.batch_size_histogram, self.BATCH_SIZE_BUCKETS),
+                "queue_wait_ms_histogram": histogram(self.queue_wait_histogram, self.QUEUE_WAIT_MS_BUCKETS),
+            }
+
+def load_embedding_model():
+    """
+    Загружает модель для эмбеддингов запросов согласно EMBEDDING_BACKEND.
+
+    ONNX-бэкенд не требует PyTorch; если он недоступен (нет onnxruntime или не выполнен
+    экспорт модели), используется модель SentenceTransformers.
+
+    Returns:
+        Объект с методом encode(texts) -> np.ndarray
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        try:
+            from onnx_encoder import OnnxSentenceEncoder
+            model = OnnxSentenceEncoder(ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED)
+            logging.info(f"Эмбеддинги запросов: ONNX ({'int8' if ONNX_QUANTIZED else 'fp32'}) из {ONNX_MODEL_DIR}")
+            return model
+        except Exception as e:
+            logging.error(f"Не удалось загрузить ONNX-модель, используем SentenceTransformers: {e}")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
 
 class RAGAssistant:
     """
@@ -122,30 +247,57 @@ class RAGAssistant:
     def __init__(self):
         """Инициализирует RAG-ассистента."""
         # Загружаем модель для эмбеддингов
-        self.model = SentenceTransformer(MODEL_NAME)
+        self.model = load_embedding_model()
         
         # Проверяем наличие векторной БД
         if not os.path.exists(VECTOR_DB_PATH):
             raise FileNotFoundError(f"Не найдена векторная БД в {VECTOR_DB_PATH}. Сначала создайте эмбеддинги.")
         
-        # Загружаем информацию о модели
-        with open(os.path.join(VECTOR_DB_PATH, "model_info.json"), "r") as f:
-            self.model_info = json.load(f)
+        # Текущее поколение векторной БД (индекс, тексты и метаданные чанков отображаются в память).
+        # Заменяется целиком при пересборке БД, поэтому запросы берут ссылку на него один раз
+        self.generation = VectorDBGeneration.load(VECTOR_DB_PATH, with_bm25=HYBRID_RETRIEVAL)
+        self._watcher_task = None
+        
+        # Бэкенд LLM (Gemini, OpenAI-совместимый сервер или фейковый, см. llm_backend.py)
+        self.llm = create_llm_backend()
         
-        # Загружаем FAISS индекс
-        self.index = faiss.read_index(os.path.join(VECTOR_DB_PATH, "faiss_index.bin"))
+        # Истории диалогов с пользователями (ограничены по объему, по желанию сохраняются в SQLite)
+        self.dialog_store = DialogStore()
         
-        # Загружаем документы
-        with open(os.path.join(VECTOR_DB_PATH, "documents.pkl"), "rb") as f:
-            documents_data = pickle.load(f)
-            self.texts = documents_data["texts"]
-            self.metadatas = documents_data["metadatas"]
+        # Определение намерения вопроса (ключевые слова и, по желанию, сходство с прототипами)
+        self.intent_router = IntentRouter(
+            encoder=self.model.encode if INTENT_EMBEDDINGS else None,
+            similarity_threshold=INTENT_SIMILARITY_THRESHOLD
+        )
+        
+        # Готовые ответы на вопросы о регистрации и основателе (модель только перефразирует их в фоне)
+        self.template_answers = TemplateAnswers(self._generate_or_none_async)
+        
+        # Сборщик промптов с ограничением размера
+        self.prompt_builder = PromptBuilder(PROMPT_TOKEN_BUDGET)
+        
+        # Отдельный пул потоков для поиска, чтобы не занимать пул по умолчанию (там работает Whisper)
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="rag-retrieve")
         
-        # Инициализируем Gemini
-        self.gemini_model = genai.GenerativeModel(GEMINI_MODEL)
+        # Ограничение одновременных запросов к LLM и метрики очереди
+        self._llm_semaphore = None
+        self._llm_semaphore_loop = None
+        self.llm_stats = {"in_flight": 0, "waiting": 0, "max_waiting": 0, "requests": 0}
         
-        # Создаем словарь для хранения истории диалогов с пользователями
-        self.dialog_histories = {}
+        # Сервис эмбеддингов: одновременные запросы кодируются одним батчем
+        self.embedding_batcher = EmbeddingBatcher(self.model)
+        
+        # LRU-кэш эмбеддингов запросов: хэш нормализованного текста -> нормализованный эмбеддинг
+        self.embedding_cache = OrderedDict()
+        self.embedding_cache_lock = threading.Lock()
+        self.embedding_cache_stats = {"hits": 0, "misses": 0}
+        
+        # Семантический кэш ответов на частые вопросы
+        self.answer_cache = SemanticAnswerCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=SEMANTIC_CACHE_TTL,
+            max_size=SEMANTIC_CACHE_SIZE
+        )
     
     def get_user_history(self, user_id: str) -> DialogHistory:
         """
@@ -158,52 +310,133 @@ class RAGAssistant:
         Returns:
             История диалога пользователя
         """
-        if user_id not in self.dialog_histories:
-            self.dialog_histories[user_id] = DialogHistory()
+        return self.dialog_store.get(user_id)
+    
+    async def get_user_history_async(self, user_id: str) -> DialogHistory:
+        """Получает историю диалога, не блокируя цикл событий (загрузка из SQLite - в пуле потоков поиска)."""
+        history = self.dialog_store.peek(user_id)
+        if history is not None:
+            return history
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.retrieval_executor, self.dialog_store.get, user_id)
+    
+    def clear_history(self, user_id: str):
+        """
+        Очищает историю диалога пользователя.
         
-        return self.dialog_histories[user_id]
+        Args:
+            user_id: Идентификатор пользователя
+        """
+        self.dialog_store.clear(user_id)
+    
+    @staticmethod
+    def _embedding_cache_key(text: str) -> tuple:
+        """Возвращает нормализованный текст и ключ кэша эмбеддингов для него."""
+        # Модель не различает регистр, поэтому нормализованный текст дает тот же эмбеддинг
+        normalized_text = " ".join(text.lower().split())
+        return normalized_text, hashlib.sha1(normalized_text.encode("utf-8")).hexdigest()
+    
+    def _get_cached_embedding(self, cache_key: str) -> Optional[np.ndarray]:
+        """Возвращает эмбеддинг из LRU-кэша или None."""
+        with self.embedding_cache_lock:
+            embedding = self.embedding_cache.get(cache_key)
+            if embedding is not None:
+                self.embedding_cache.move_to_end(cache_key)
+                self.embedding_cache_stats["hits"] += 1
+                return embedding
+            self.embedding_cache_stats["misses"] += 1
+        return None
+    
+    def _store_cached_embedding(self, cache_key: str, embedding: np.ndarray):
+        """Сохраняет эмбеддинг в LRU-кэш, вытесняя самые старые записи."""
+        with self.embedding_cache_lock:
+            self.embedding_cache[cache_key] = embedding
+            while len(self.embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self.embedding_cache.popitem(last=False)
     
     def create_embedding(self, text: str) -> np.ndarray:
         """
-        Создает эмбеддинг для текста с помощью SentenceTransformers.
+        Создает нормализованный эмбеддинг для текста с помощью SentenceTransformers.
+        Повторные запросы с тем же текстом (с точностью до регистра и пробелов) берутся из LRU-кэша.
         
         Args:
             text: Текст для создания эмбеддинга
             
         Returns:
-            Эмбеддинг в виде numpy-массива
+            Эмбеддинг в виде numpy-массива (только для чтения)
         """
-        embedding = self.model.encode([text])[0]
-        # Нормализуем для косинусного сходства
-        faiss.normalize_L2(np.array([embedding], dtype=np.float32))
+        normalized_text, cache_key = self._embedding_cache_key(text)
+        
+        embedding = self._get_cached_embedding(cache_key)
+        if embedding is None:
+            embedding = self.embedding_batcher.encode(normalized_text)
+            self._store_cached_embedding(cache_key, embedding)
+        
         return embedding
     
-    def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def retrieve(self, query: str, k: int = RETRIEVAL_TOP_K,
+                 query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """
         Ищет наиболее релевантные документы по запросу.
         
+        Если есть индекс BM25, кандидаты векторного и лексического поиска объединяются
+        методом reciprocal rank fusion, и возвращаются k лучших.
+        
         Args:
             query: Запрос пользователя
             k: Количество документов для возврата
+            query_embedding: Готовый эмбеддинг запроса (если уже посчитан)
             
         Returns:
-            Список найденных документов с метаданными
+            Список найденных документов ({"id" - идентификатор чанка в индексе, "text", "metadata", "score"})
         """
         # Создаем эмбеддинг для запроса
-        query_embedding = self.create_embedding(query)
-        
+        if query_embedding is None:
+            query_embedding = self.create_embedding(query)
+        
+        # Запрос целиком выполняется на одном поколении, даже если его заменят во время поиска
+        generation = self._acquire_generation()
+        try:
+            return self._retrieve_from(generation, query, query_embedding, k)
+        finally:
+            generation.release()
+    
+    def _acquire_generation(self) -> VectorDBGeneration:
+        """Возвращает текущее поколение, отмеченное как используемое запросом."""
+        while True:
+            generation = self.generation
+            # Поколение могли заменить и закрыть между чтением ссылки и отметкой - берем новое
+            if generation.acquire():
+                return generation
+    
+    def _retrieve_from(self, generation: VectorDBGeneration, query: str, query_embedding: np.ndarray,
+                       k: int) -> List[Dict[str, Any]]:
+        """Поиск по одному поколению векторной БД (для retrieve)."""
         # Поиск ближайших соседей
-        scores, indices = self.index.search(np.array([query_embedding], dtype=np.float32), k=k)
+        n_candidates = max(k, RETRIEVAL_CANDIDATES) if generation.bm25_index else k
+        scores, ids = generation.index.search(np.array([query_embedding], dtype=np.float32), k=n_candidates)
+        indices = ids_to_positions(generation.chunk_ids, ids)
+        
+        # Иногда FAISS может вернуть отрицательные индексы, если не найдено достаточно соседей
+        dense_scores = {
+            int(idx): float(score)
+            for score, idx in zip(scores[0], indices[0])
+            if 0 <= idx < len(generation.texts)
+        }
+        
+        if generation.bm25_index:
+            bm25_ids = [doc_id for doc_id, _ in generation.bm25_index.search(query, n_candidates)]
+            ranked = reciprocal_rank_fusion([list(dense_scores), bm25_ids])[:k]
+        else:
+            ranked = list(dense_scores.items())[:k]
         
         results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx < 0 or idx >= len(self.texts):
-                continue  # Иногда FAISS может вернуть отрицательные индексы, если не найдено достаточно соседей
-            
+        for idx, score in ranked:
             results.append({
-                "text": self.texts[idx],
-                "metadata": self.metadatas[idx],
-                "score": float(score)
+                "id": generation.index_id(idx),
+                "text": generation.texts[idx],
+                "metadata": generation.metadatas[idx],
+                "score": score
             })
         
         return results
@@ -218,22 +451,14 @@ class RAGAssistant:
         Returns:
             True, если запрос похож на возражение, иначе False
         """
-        objection_keywords = [
-            "пирамида", "скам", "развод", "обман", "мошенник", "не верю", "лохотрон", 
-            "ponzi", "scam", "fraud", "обманули", "хайп", "млм", "mlm",
-            "не работает", "потеряю", "деньги пропадут", "рискованно",
-            "нелегально", "запрещено", "уже был в"
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in objection_keywords)
+        return self.intent_router.is_objection(query)
     
     def generate_prompt(self, query: str, context: List[Dict[str, Any]], 
                         user_info: Optional[Dict[str, Any]] = None,
                         history: Optional[DialogHistory] = None,
-                        is_first_message: bool = False) -> str:
+                        is_first_message: bool = False) -> Prompt:
         """
-        Создает промпт для модели на основе запроса и контекста.
+        Создает промпт для модели на основе запроса и контекста в пределах PROMPT_TOKEN_BUDGET.
         
         Args:
             query: Запрос пользователя
@@ -243,59 +468,275 @@ class RAGAssistant:
             is_first_message: Флаг, указывающий, является ли это первым сообщением
             
         Returns:
-            Готовый промпт для модели
-        """
-        # Формируем контекстную информацию
-        context_str = ""
-        for i, doc in enumerate(context):
-            source = doc["metadata"]["source"].replace("_", " ")
-            context_str += f"### {source}: \n{doc['text']}\n\n"
-        
-        # Добавляем информацию о пользователе, если она есть
-        user_info_str = ""
-        if user_info:
-            user_name = user_info.get("name", "Участник")
-            user_info_str = f"""
-Информация о пользователе:
-- Имя: {user_name}
-"""
-        
-        # Добавляем историю диалога, если она есть
-        history_str = ""
-        if history and history.messages:
-            history_str = f"""
-История диалога:
-{history.get_history_text()}
-"""
-        
+            Готовый промпт: статическая часть (системная инструкция) и часть, зависящая от запроса
+        """
         # Выбираем шаблон промпта в зависимости от типа запроса
         if self.is_objection(query):
-            prompt_template = OBJECTION_PROMPT
+            static_prompt = STATIC_OBJECTION_PROMPT
         else:
-            prompt_template = SYSTEM_PROMPT
+            static_prompt = STATIC_SYSTEM_PROMPT
         
-        # Формируем полный промпт
-        prompt = prompt_template.format(
-            context=context_str,
-            query=query
-        )
+        # Информация о пользователе и история диалога, если они есть
+        user_name = user_info.get("name", "Участник") if user_info else None
+        history_messages = history.messages if history else []
         
-        # Добавляем информацию о пользователе и историю диалога
-        if user_info_str or history_str:
-            prompt = f"{user_info_str}\n{history_str}\n{prompt}"
+        # Добавляем специальные инструкции в зависимости от того, первое ли это сообщение
+        instruction = FIRST_MESSAGE_INSTRUCTION if is_first_message else CONTINUATION_INSTRUCTION
         
-        # Добавляем сам вопрос
-        prompt += f"\n\nВопрос пользователя: {query}\n\n"
+        return self.prompt_builder.build(static_prompt, query, context, user_name, history_messages, instruction)
+    
+    def _get_llm_semaphore(self) -> asyncio.Semaphore:
+        """Возвращает семафор ограничения запросов к LLM для текущего event loop."""
+        loop = asyncio.get_running_loop()
+        if self._llm_semaphore is None or self._llm_semaphore_loop is not loop:
+            self._llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            self._llm_semaphore_loop = loop
+        return self._llm_semaphore
+    
+    def get_llm_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики запросов к LLM.
         
-        # Добавляем специальные инструкции в зависимости от того, первое ли это сообщение
+        Returns:
+            Словарь: in_flight - запросов выполняется, waiting - ждут в очереди,
+            max_waiting - максимальная глубина очереди, requests - всего запросов,
+            а также метрики клиента LLM (входные и закэшированные токены, задержка)
+        """
+        return {**self.llm.get_stats(), **self.llm_stats}
+    
+    @asynccontextmanager
+    async def _llm_slot(self):
+        """Занимает слот для запроса к LLM (ожидая в очереди, если все слоты заняты)."""
+        semaphore = self._get_llm_semaphore()
+        
+        self.llm_stats["waiting"] += 1
+        self.llm_stats["max_waiting"] = max(self.llm_stats["max_waiting"], self.llm_stats["waiting"])
+        try:
+            await semaphore.acquire()
+        finally:
+            self.llm_stats["waiting"] -= 1
+        
+        self.llm_stats["in_flight"] += 1
+        self.llm_stats["requests"] += 1
+        try:
+            yield
+        finally:
+            self.llm_stats["in_flight"] -= 1
+            semaphore.release()
+    
+    async def _generate_async(self, prompt: Union[str, Prompt]) -> str:
+        """
+        Выполняет один асинхронный запрос к LLM с учетом ограничения параллельности.
+        
+        Args:
+            prompt: Промпт для модели
+            
+        Returns:
+            Текст ответа модели
+        """
+        async with self._llm_slot():
+            response = await self.llm.generate(prompt)
+            return response.text
+    
+    async def _generate_stream_async(self, prompt: Union[str, Prompt]) -> AsyncIterator[str]:
+        """
+        Потоковый запрос к LLM: отдает фрагменты текста по мере генерации.
+        
+        Args:
+            prompt: Промпт для модели
+            
+        Yields:
+            Очередной фрагмент текста ответа
+        """
+        async with self._llm_slot():
+            async for chunk_text in self.llm.stream(prompt):
+                yield chunk_text
+    
+    async def _generate_or_none_async(self, prompt: Union[str, Prompt]) -> Optional[str]:
+        """
+        Запрос к LLM; повторные попытки и circuit breaker - в бэкенде (ResilientBackend).
+        
+        Args:
+            prompt: Промпт для модели
+            
+        Returns:
+            Текст ответа или None, если LLM недоступен
+        """
+        try:
+            return await self._generate_async(prompt)
+        except CircuitOpenError as e:
+            logging.warning(f"Запрос к LLM отклонен: {e}")
+        except Exception as e:
+            logging.error(f"Не удалось получить ответ от LLM: {e}")
+        return None
+    
+    async def retrieve_async(self, query: str, k: int = RETRIEVAL_TOP_K,
+                             query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Выполняет retrieve в отдельном пуле потоков поиска."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.retrieval_executor, self.retrieve, query, k, query_embedding)
+    
+    @property
+    def index_version(self) -> str:
+        """Версия загруженной векторной БД (при смене сбрасывается семантический кэш ответов)."""
+        return self.generation.version
+    
+    def _swap_generation(self, generation: VectorDBGeneration) -> bool:
+        """
+        Делает загруженное поколение текущим.
+        
+        Returns:
+            True, если поколение заменено
+        """
+        model_name = generation.model_info.get("model_name")
+        if model_name != self.generation.model_info.get("model_name"):
+            # Эмбеддинги запросов создаются загруженной моделью - другая модель требует перезапуска
+            logging.error(f"Новая векторная БД создана моделью {model_name}, нужен перезапуск бота")
+            return False
+        
+        # Присваивание ссылки атомарно: запросы, начатые раньше, дорабатывают на старом поколении,
+        # а его файлы закрываются после последнего из них
+        old_generation = self.generation
+        self.generation = generation
+        old_generation.retire()
+        old_version = old_generation.version
+        logging.info(f"Векторная БД обновлена: {old_version} -> {generation.version} "
+                     f"({len(generation.texts)} чанков, индекс {generation.index_type})")
+        return True
+    
+    def reload_vector_db(self) -> bool:
+        """
+        Синхронно загружает новое поколение векторной БД, если она была пересобрана.
+        
+        Returns:
+            True, если поколение заменено
+        """
+        if get_vector_db_version(VECTOR_DB_PATH) == self.generation.version:
+            return False
+        return self._swap_generation(VectorDBGeneration.load(VECTOR_DB_PATH, with_bm25=HYBRID_RETRIEVAL))
+    
+    async def watch_vector_db(self, interval: float = VECTOR_DB_RELOAD_INTERVAL):
+        """Периодически проверяет версию векторной БД и подменяет поколение без остановки бота."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if get_vector_db_version(VECTOR_DB_PATH) == self.generation.version:
+                    continue
+                # Загрузка идет в пуле потоков поиска (пул по умолчанию занят Whisper) и не блокирует цикл событий
+                generation = await loop.run_in_executor(
+                    self.retrieval_executor, lambda: VectorDBGeneration.load(VECTOR_DB_PATH, with_bm25=HYBRID_RETRIEVAL)
+                )
+                self._swap_generation(generation)
+            except Exception as e:
+                # БД могла быть в процессе записи - попробуем при следующей проверке
+                logging.error(f"Ошибка при перезагрузке векторной БД: {e}")
+    
+    def start_vector_db_watcher(self):
+        """Запускает отслеживание пересборки векторной БД (вызывается из работающего цикла событий)."""
+        if VECTOR_DB_RELOAD_INTERVAL > 0 and self._watcher_task is None:
+            self._watcher_task = asyncio.get_running_loop().create_task(self.watch_vector_db())
+    
+    async def embed_async(self, text: str) -> np.ndarray:
+        """Асинхронный create_embedding: ожидание батча не занимает потоки."""
+        normalized_text, cache_key = self._embedding_cache_key(text)
+        
+        embedding = self._get_cached_embedding(cache_key)
+        if embedding is None:
+            embedding = await asyncio.wrap_future(self.embedding_batcher.submit(normalized_text))
+            self._store_cached_embedding(cache_key, embedding)
+        
+        return embedding
+    
+    def _get_cached_answer(self, query_embedding: np.ndarray, user_info: Optional[Dict[str, Any]],
+                           is_first_message: bool, threshold: Optional[float] = None) -> Optional[str]:
+        """
+        Ищет в семантическом кэше ответ на похожий вопрос.
+        
+        Args:
+            query_embedding: Эмбеддинг запроса
+            user_info: Информация о пользователе
+            is_first_message: Флаг первого сообщения в диалоге
+            threshold: Порог сходства (по умолчанию - порог кэша)
+            
+        Returns:
+            Ответ, подготовленный для пользователя, или None
+        """
+        entry = self.answer_cache.lookup(query_embedding, self.index_version, threshold)
+        if not entry:
+            return None
+        
+        logging.info(f"Ответ найден в семантическом кэше (сходство {entry['similarity']:.3f})")
+        
+        user_name = (user_info or {}).get("name", "Участник")
+        answer = entry["answer"].replace(USER_NAME_PLACEHOLDER, user_name)
         if is_first_message:
-            prompt += "\nЭто первое сообщение в диалоге. Поприветствуй пользователя и представься как AI-ассистент проекта PotokCash.\n"
-        else:
-            prompt += "\nЭто продолжение диалога. НЕ ПРИВЕТСТВУЙ пользователя снова, просто ответь на вопрос.\n"
+            answer = f"Здравствуйте, {user_name}! 👋\n\n{answer}"
+        return answer
+    
+    def _fallback_answer(self, query_embedding: np.ndarray, user_info: Optional[Dict[str, Any]],
+                         is_first_message: bool) -> str:
+        """Ответ, когда LLM недоступен: ближайший ответ из кэша или сообщение о технических проблемах."""
+        cached_answer = self._get_cached_answer(query_embedding, user_info, is_first_message, FALLBACK_CACHE_THRESHOLD)
+        return cached_answer or TECHNICAL_ERROR_ANSWER
+    
+    def _cache_answer(self, query_embedding: np.ndarray, answer: str, docs: List[Dict[str, Any]],
+                      user_info: Optional[Dict[str, Any]]):
+        """
+        Сохраняет ответ в семантический кэш без приветствия и имени пользователя.
+        
+        Args:
+            query_embedding: Эмбеддинг запроса
+            answer: Ответ модели
+            docs: Документы, на основе которых получен ответ
+            user_info: Информация о пользователе
+        """
+        answer = remove_greetings(answer).strip()
+        user_name = (user_info or {}).get("name")
+        if user_name and len(user_name) > 1:
+            answer = answer.replace(user_name, USER_NAME_PLACEHOLDER)
+        
+        doc_ids = [doc["id"] for doc in docs]
+        self.answer_cache.store(query_embedding, answer, doc_ids, self.index_version)
+    
+    async def _answer_intent(self, intent: str, query: str, user_info: Optional[Dict[str, Any]],
+                             history: Optional[DialogHistory], user_id: Optional[str]) -> str:
+        """
+        Отвечает на вопрос с намерением из STATIC_INTENTS без обращения к модели.
+        
+        Args:
+            intent: Намерение (основатель, регистрация или расчеты)
+            query: Запрос пользователя
+            user_info: Информация о пользователе (имя, язык)
+            history: История диалога (опционально)
+            user_id: Идентификатор пользователя
+            
+        Returns:
+            Ответ на запрос
+        """
+        # Расчеты - в симуляторах бота (в историю диалога не записываем, как и раньше)
+        if intent == INTENT_CALCULATION:
+            return CALCULATION_ANSWER
+        
+        # Регистрация и основатель: готовый ответ с именем пользователя на языке вопроса
+        user_info = user_info or {}
+        language = detect_language(query, user_info.get("language"))
+        answer = self.template_answers.render(intent, user_info.get("name", "Участник"), language)
         
-        return prompt
+        # Сохраняем в историю диалога
+        if user_id:
+            history.add_exchange(query, answer)
+        
+        return answer
     
     def answer_query(self, query: str, user_info: Optional[Dict[str, Any]] = None, user_id: Optional[str] = None) -> str:
+        """
+        Синхронная обертка над answer_query_async для скриптов и тестов.
+        В боте используйте answer_query_async.
+        """
+        return asyncio.run(self.answer_query_async(query, user_info, user_id))
+    
+    async def answer_query_async(self, query: str, user_info: Optional[Dict[str, Any]] = None, user_id: Optional[str] = None) -> str:
         """
         Отвечает на запрос пользователя с использованием RAG-подхода.
         
@@ -308,239 +749,219 @@ class RAGAssistant:
             Ответ на запрос
         """
         # Получаем историю диалога для пользователя, если есть user_id
-        history = self.get_user_history(user_id) if user_id else None
+        history = await self.get_user_history_async(user_id) if user_id else None
         
         # Определяем, является ли это первым сообщением в диалоге
-        is_first_message = history is None or len(history.messages) == 0
-        
-        # Проверяем, является ли запрос вопросом о Васадине
-        if is_vasadin_query(query):
-            # Создаем специальный запрос для поиска информации о Васадине
-            vasadin_search_query = "Дмитрий Васадин основатель проекта"
-            
-            # Получаем релевантные документы о Васадине из базы знаний
-            vasadin_docs = self.retrieve(vasadin_search_query, k=3)
-            
-            # Создаем специальный промпт для ответа о Васадине
-            vasadin_prompt = f"""
-Пользователь спрашивает о Дмитрии Васадине, основателе проекта PotokCash.
-Используй следующую информацию для ответа:
-{self._format_context(vasadin_docs)}
-
-Важно:
-1. Обязательно укажи, что Дмитрий Васадин - основатель проекта PotokCash (Поток Кеш) и сообщества Меркурий
-2. Объясни, с какой целью он создал проект
-3. Если есть информация о его Telegram-канале, укажи её
-4. Ответ должен быть кратким, но информативным
-
-Вопрос пользователя: {query}
-"""
-            
-            # Генерируем ответ с помощью Gemini
-            try:
-                response = self.gemini_model.generate_content(vasadin_prompt)
-                vasadin_response = response.text
-                
-                # Сохраняем в историю диалога
+        is_first_message = history is None or len(history) == 0
+        
+        # Основатель, регистрация, расчеты - готовые ответы без поиска и обращения к модели
+        intent = self.intent_router.route(query)
+        if intent in STATIC_INTENTS:
+            return await self._answer_intent(intent, query, user_info, history, user_id)
+        
+        # Эмбеддинг запроса нужен и для семантического кэша, и для поиска
+        query_embedding = await self.embed_async(query)
+        
+        # Намерение, не распознанное по ключевым словам, проверяем по смыслу
+        intent = self.intent_router.route_by_embedding(query_embedding)
+        if intent in STATIC_INTENTS:
+            return await self._answer_intent(intent, query, user_info, history, user_id)
+        
+        # Вопросы, зависящие от контекста диалога, из кэша не отвечаются
+        cacheable = not needs_personal_context(query)
+        if cacheable:
+            cached_answer = self._get_cached_answer(query_embedding, user_info, is_first_message)
+            if cached_answer:
                 if user_id:
-                    history.add_message("user", query)
-                    history.add_message("assistant", vasadin_response)
-                
-                return vasadin_response
-            except Exception as e:
-                logging.error(f"Ошибка при генерации ответа о Васадине: {e}")
-                # Если произошла ошибка, возвращаем запасной вариант ответа
-                fallback_response = "Дмитрий Васадин — основатель проекта PotokCash (Поток Кеш) и сообщества Меркурий. Он создал эту платформу с целью дать людям возможность достичь финансовой независимости. Его Telegram-канал: https://t.me/kodvasadin"
-                
-                if user_id:
-                    history.add_message("user", query)
-                    history.add_message("assistant", fallback_response)
-                
-                return fallback_response
-        
-        # Проверяем тип запроса
-        if is_referral_request(query):
-            # Сначала получаем релевантные документы для контекста
-            relevant_docs = self.retrieve(query)
-            
-            # Создаем специальный промпт для регистрации
-            registration_prompt = f"""
-Ты — AI-ассистент проекта PotokCash. Пользователь интересуется регистрацией в проекте.
-Используй следующую информацию для ответа:
-{self._format_context(relevant_docs)}
-
-Задача: Дать искренний, дружелюбный и мотивирующий ответ о том, как начать в проекте.
-Важно:
-1. Объясни, что регистрация — это первый шаг к финансовой свободе
-2. Подчеркни, что у пользователя есть два пути:
-   - Самостоятельная регистрация через реферальные ссылки
-   - Личное общение с лидером проекта для получения поддержки и ответов на вопросы
-3. Сохраняй стиль лидера проекта: просто, искренне, с духовным посылом
-4. Не используй шаблонные фразы, говори от сердца
-
-Вопрос пользователя: {query}
-"""
-            
-            # Генерируем персонализированный ответ
-            response = self.gemini_model.generate_content(registration_prompt)
-            personalized_answer = response.text
-            
-            # Добавляем реферальные ссылки
-            referral_links = """
-МОЯ 1-я ЛИНИЯ И ЛИЧНОЕ СОПРОВОЖДЕНИЕ НА ВСЕХ ПЛАТФОРМАХ 👇😉
-
-‼️Регистрация и вход на платформы через вкл. VPN 👇
-
-🇷🇺 РФ и СНГ — https://potok.cash/ref/HPLTzKyq
-🇪🇺 EURO — https://eur.cashflow.fund/ref/ncPTzKyq
-🇪🇸 Испания — https://es.cashflow.fund/ref/nmbTzKyq
-🇵🇱 Польша — https://pl.cashflow.fund/ref/3sHTzKyq
-🇰🇬 Кыргызстан — https://cashflow-kg.fund/ref/XsPTzKyq
-🇬🇧 Великобритания — https://gb.cashflow.fund/ref/XZbTzKyq
-🇨🇳 Китай — https://cn.cashflow.fund/ref/XsbTzKyq
-
-СВЯЗАТЬСЯ И ПООБЩАТЬСЯ С ДЕЙСТВУЮЩИМ ЛИДЕРОМ ВАСИЛИЕМ МАТУСЕВИЧ - ТЕЛЕГРАМ — https://t.me/konvict171
-"""
-            
-            # Объединяем персонализированный ответ с реферальными ссылками
-            final_answer = f"{personalized_answer}\n\n{referral_links}"
-            
-            # Сохраняем в историю диалога
-            if user_id:
-                history.add_message("user", query)
-                history.add_message("assistant", final_answer)
-            
-            return final_answer
-
-        if is_calculation_request(query):
-            return """Для расчета потенциального заработка и моделирования различных сценариев, 
-рекомендую воспользоваться нашими симуляторами. Они помогут вам:
-- Рассчитать доходность разных потоков
-- Смоделировать различные стратегии инвестирования
-- Увидеть, как работает сложный процент
-- Понять преимущества каждого типа потока
-
-Нажмите на кнопку "🎮 СИМУЛЯТОРЫ | SIMULATORS" в главном меню, чтобы начать расчеты."""
-
+                    history.add_exchange(query, cached_answer)
+                return cached_answer
+        
         # Получаем релевантные документы
-        relevant_docs = self.retrieve(query)
+        relevant_docs = await self.retrieve_async(query, query_embedding=query_embedding)
         
         # Создаем промпт с учетом того, первое ли это сообщение
         prompt = self.generate_prompt(query, relevant_docs, user_info, history, is_first_message)
         
-        # Генерируем ответ с помощью Gemini с механизмом повторных попыток
-        max_retries = 3
-        retry_count = 0
-        backoff_time = 1  # начальное время ожидания в секундах
+        # Генерируем ответ с помощью LLM
+        answer = await self._generate_or_none_async(prompt)
         
-        while retry_count < max_retries:
-            try:
-                # Попытка получить ответ от API
-                response = self.gemini_model.generate_content(prompt)
-                answer = response.text
-                
+        if answer is None:
+            answer = self._fallback_answer(query_embedding, user_info, is_first_message)
+        else:
+            # В кэш попадают только ответы, полученные без истории диалога
+            if cacheable and is_first_message:
+                self._cache_answer(query_embedding, answer, relevant_docs, user_info)
+            if not is_first_message:
                 # Если это не первое сообщение, удаляем приветствие из ответа
-                if not is_first_message:
-                    # Шаблоны приветствий для удаления
-                    greetings = [
-                        r"Здравствуйте.*?\n\n",
-                        r"Привет.*?\n\n",
-                        r"Добрый день.*?\n\n",
-                        r"Доброе утро.*?\n\n",
-                        r"Добрый вечер.*?\n\n"
-                    ]
-                    
-                    for greeting in greetings:
-                        answer = re.sub(greeting, "", answer, flags=re.IGNORECASE | re.DOTALL)
-                
-                break  # Если успешно, выходим из цикла
-            except Exception as e:
-                retry_count += 1
-                error_message = str(e)
-                
-                # Логируем ошибку
-                logging.error(f"Попытка {retry_count}/{max_retries}: Ошибка при обращении к API Gemini: {error_message}")
-                
-                # Если это последняя попытка, возвращаем сообщение об ошибке
-                if retry_count == max_retries:
-                    logging.error(f"Все попытки исчерпаны. Не удалось получить ответ от API.")
-                    answer = "Извините, возникли технические проблемы при обработке вашего запроса. Пожалуйста, повторите вопрос через несколько секунд."
-                    break
-                
-                # Экспоненциальная задержка перед следующей попыткой
-                jitter = random.uniform(0, 0.1 * backoff_time)  # добавляем случайное значение для предотвращения синхронизации запросов
-                wait_time = backoff_time + jitter
-                logging.info(f"Ожидание {wait_time:.2f} секунд перед повторной попыткой...")
-                time.sleep(wait_time)
-                backoff_time *= 2  # увеличиваем время ожидания в 2 раза
+                answer = remove_greetings(answer)
         
         # Если есть user_id, сохраняем сообщения в историю диалога
-        if user_id and "Извините, возникли технические проблемы" not in answer:
-            history.add_message("user", query)
-            history.add_message("assistant", answer)
+        if user_id and answer != TECHNICAL_ERROR_ANSWER:
+            history.add_exchange(query, answer)
         
         return answer
 
-    def _format_context(self, docs: List[Dict[str, Any]]) -> str:
-        """Форматирует контекстные документы для промпта."""
-        context_str = ""
-        for i, doc in enumerate(docs):
-            source = doc["metadata"]["source"].replace("_", " ")
-            context_str += f"### {source}: \n{doc['text']}\n\n"
-        return context_str
-
-# Добавляем функцию для определения запросов о Васадине
-def is_vasadin_query(query: str) -> bool:
-    """Определяет, является ли запрос вопросом о Дмитрии Васадине."""
-    vasadin_keywords = [
-        "васадин", "дмитрий васадин", "основатель", "создатель", "дмитрий", 
-        "кто такой васадин", "васадин кто", "кто основатель", "основатель проекта",
-        "создатель проекта", "кто создал", "кто создатель"
-    ]
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in vasadin_keywords)
-
-# Добавляем функцию для определения запросов о реферальных ссылках
-def is_referral_request(query: str) -> bool:
-    """Определяет, является ли запрос просьбой о реферальной ссылке или регистрации."""
-    referral_keywords = [
-        "реферал", "реферальная", "ссылка", "ссылки", "регистрация", "зарегистрироваться",
-        "начать", "старт", "как начать", "как зарегистрироваться", "как получить ссылку",
-        "пригласить", "приглашение", "пригласи", "приглашай"
-    ]
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in referral_keywords)
-
-# Добавляем функцию для определения запросов о расчетах
-def is_calculation_request(query: str) -> bool:
-    """Определяет, является ли запрос просьбой о расчете заработка в потоках."""
-    # Ключевые слова для определения запроса о расчете
-    calculation_keywords = [
-        "посчитать", "расчет", "рассчитать", "сколько", "заработок", "доход",
-        "прибыль", "выгода", "выгодно", "выгоднее", "калькулятор", "калькуляция"
-    ]
-    
-    # Ключевые слова, связанные с потоками и заработком
-    flow_keywords = [
-        "поток", "потоки", "заработать", "доход", "деньги", "инвестиции", 
-        "инвестировать", "вложить", "вложения", "процент", "проценты"
-    ]
-    
-    query_lower = query.lower()
-    
-    # Проверяем наличие слов о расчетах
-    has_calculation_keyword = any(keyword in query_lower for keyword in calculation_keywords)
-    
-    # Проверяем наличие слов о потоках и заработке
-    has_flow_keyword = any(keyword in query_lower for keyword in flow_keywords)
-    
-    # Запрос должен содержать и слова о расчетах, и слова о потоках/заработке
-    return has_calculation_keyword and has_flow_keyword
+    async def answer_query_stream(self, query: str, user_info: Optional[Dict[str, Any]] = None,
+                                  user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Отвечает на запрос в потоковом режиме.
+        
+        Для вопросов с намерениями из STATIC_INTENTS (основатель, регистрация, расчеты) ответ отдается целиком.
+        
+        Args:
+            query: Запрос пользователя
+            user_info: Информация о пользователе (имя, реферальная ссылка и т.д.)
+            user_id: Идентификатор пользователя для отслеживания истории диалога
+            
+        Yields:
+            Текст ответа, накопленный к текущему моменту; последнее значение - окончательный ответ
+        """
+        # Получаем историю диалога для пользователя, если есть user_id
+        history = await self.get_user_history_async(user_id) if user_id else None
+        
+        intent = self.intent_router.route(query)
+        if intent in STATIC_INTENTS:
+            yield await self._answer_intent(intent, query, user_info, history, user_id)
+            return
+        
+        # Определяем, является ли это первым сообщением в диалоге
+        is_first_message = history is None or len(history) == 0
+        
+        # Эмбеддинг запроса нужен и для семантического кэша, и для поиска
+        query_embedding = await self.embed_async(query)
+        
+        intent = self.intent_router.route_by_embedding(query_embedding)
+        if intent in STATIC_INTENTS:
+            yield await self._answer_intent(intent, query, user_info, history, user_id)
+            return
+        
+        # Вопросы, зависящие от контекста диалога, из кэша не отвечаются
+        cacheable = not needs_personal_context(query)
+        if cacheable:
+            cached_answer = self._get_cached_answer(query_embedding, user_info, is_first_message)
+            if cached_answer:
+                if user_id:
+                    history.add_exchange(query, cached_answer)
+                yield cached_answer
+                return
+        
+        # Получаем релевантные документы и создаем промпт
+        relevant_docs = await self.retrieve_async(query, query_embedding=query_embedding)
+        prompt = self.generate_prompt(query, relevant_docs, user_info, history, is_first_message)
+        
+        # Повторные попытки до первого фрагмента и circuit breaker - в бэкенде (ResilientBackend)
+        answer = ""
+        completed = False
+        try:
+            async for chunk_text in self._generate_stream_async(prompt):
+                answer += chunk_text
+                yield answer
+            completed = True
+        except CircuitOpenError as e:
+            logging.warning(f"Запрос к LLM отклонен: {e}")
+        except Exception as e:
+            # Если часть ответа уже показана, оставляем ее с пометкой об обрыве
+            logging.error(f"Ошибка при потоковом обращении к LLM: {e}")
+        
+        interrupted = bool(answer) and not completed
+        if not answer:
+            answer = self._fallback_answer(query_embedding, user_info, is_first_message)
+        else:
+            # В кэш попадают только полные ответы (поток не оборвался), полученные без истории диалога
+            if completed and cacheable and is_first_message:
+                self._cache_answer(query_embedding, answer, relevant_docs, user_info)
+            if not is_first_message:
+                # Если это не первое сообщение, удаляем приветствие из ответа
+                answer = remove_greetings(answer)
+            if interrupted:
+                answer += STREAM_INTERRUPTED_NOTE
+        
+        # Если есть user_id, сохраняем сообщения в историю диалога (оборванный ответ не сохраняем)
+        if user_id and answer != TECHNICAL_ERROR_ANSWER and not interrupted:
+            history.add_exchange(query, answer)
+        
+        yield answer
+
+# Шаблоны приветствий, которые удаляются из ответов в продолжении диалога
+GREETING_PATTERNS = [
+    re.compile(pattern, flags=re.IGNORECASE | re.DOTALL)
+    for pattern in (
+        r"Здравствуйте.*?\n\n",
+        r"Привет.*?\n\n",
+        r"Добрый день.*?\n\n",
+        r"Доброе утро.*?\n\n",
+        r"Добрый вечер.*?\n\n"
+    )
+]
+
+def remove_greetings(answer: str) -> str:
+    """Удаляет приветствия из ответа модели."""
+    for greeting in GREETING_PATTERNS:
+        answer = greeting.sub("", answer)
+    return answer
+
+# Слова, указывающие, что вопрос опирается на предыдущие сообщения или личную ситуацию пользователя
+PERSONAL_CONTEXT_WORDS = {
+    "мой", "моя", "моё", "мое", "мои", "мою", "моего", "моему", "моей", "моим", "моих", "мне", "меня", "мной",
+    "выше", "ранее", "этого", "этому", "этом", "этой", "него", "нему", "ней", "подробнее", "поясни"
+}
+PERSONAL_CONTEXT_PREFIXES = ("предыдущ",)
+PERSONAL_CONTEXT_STARTS = ("а ", "и ", "тогда ")
+
+def needs_personal_context(query: str) -> bool:
+    """Определяет, зависит ли ответ от контекста диалога или личной ситуации пользователя."""
+    query_lower = query.lower().strip()
+    if query_lower.startswith(PERSONAL_CONTEXT_STARTS):
+        return True
+    words = re.findall(r"\w+", query_lower)
+    return any(word in PERSONAL_CONTEXT_WORDS or word.startswith(PERSONAL_CONTEXT_PREFIXES) for word in words)
+
+async def benchmark_answer_query(assistant: RAGAssistant, total: int = 200, concurrency: int = 20):
+    """
+    Нагрузочный замер answer_query_async: пропускная способность и перцентили задержки.
+    
+    Для замера без обращения к внешнему API запустите с LLM_PROVIDER=fake
+    (задержка и доля ошибок - FAKE_LLM_LATENCY_MS, FAKE_LLM_ERROR_RATE).
+    
+    Args:
+        assistant: RAG-ассистент
+        total: Количество запросов
+        concurrency: Количество одновременных пользователей
+    """
+    from bm25_index import BENCHMARK_QUERIES
+    
+    queries = list(BENCHMARK_QUERIES)
+    latencies = []
+    counter = iter(range(total))
+    
+    async def user_loop(worker: int):
+        for i in counter:
+            started = time.perf_counter()
+            await assistant.answer_query_async(queries[i % len(queries)], {"name": "Участник"}, f"benchmark-{worker}")
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(user_loop(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    latencies_ms = np.array(latencies) * 1000
+    print(f"Запросов: {total}, одновременно: {concurrency}, LLM: {assistant.llm.name}")
+    print(f"Пропускная способность: {total / elapsed:.1f} запросов/с")
+    print(f"Задержка: p50 = {np.percentile(latencies_ms, 50):.0f} мс, p95 = {np.percentile(latencies_ms, 95):.0f} мс, "
+          f"max = {latencies_ms.max():.0f} мс")
+    print(f"LLM: {assistant.get_llm_stats()}")
+    print(f"Кэш ответов: {assistant.answer_cache.get_stats()}")
+    print(f"Истории диалогов: {assistant.dialog_store.get_stats()}")
 
 # Пример использования
 if __name__ == "__main__":
     assistant = RAGAssistant()
     
+    # python rag_system.py benchmark [запросов] [одновременно]
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        asyncio.run(benchmark_answer_query(assistant, *(int(arg) for arg in sys.argv[2:4])))
+        sys.exit(0)
+    
     # Тестовый запрос
     query = "Расскажи мне о растущем потоке"
     user_info = {
@@ -0,0 +1,160 @@
+"""
+Готовые ответы AI-ассистента на типовые вопросы (регистрация, основатель проекта).
+
+Ответ собирается из шаблона без обращения к модели: имя пользователя подставляется
+вместо метки, ссылки и контакты всегда берутся из неизменной части шаблона.
+По желанию (TEMPLATE_PARAPHRASE=1) модель в фоне перефразирует вступительную часть,
+чтобы ответы не повторялись дословно; варианты кэшируются отдельно для каждого языка.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from intent_router import INTENT_FOUNDER, INTENT_REFERRAL
+from prompts import (
+    FOUNDER_ANSWER, FOUNDER_ANSWER_EN, FOUNDER_CONTACTS, FOUNDER_CONTACTS_EN, PARAPHRASE_PROMPT,
+    REFERRAL_INTRO, REFERRAL_INTRO_EN, REFERRAL_LINKS, USER_NAME_PLACEHOLDER
+)
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Перефразировать вступления готовых ответов в фоне и сколько вариантов хранить на язык
+TEMPLATE_PARAPHRASE = os.getenv("TEMPLATE_PARAPHRASE", "0") == "1"
+TEMPLATE_VARIANTS = int(os.getenv("TEMPLATE_VARIANTS", "3"))
+
+DEFAULT_LANGUAGE = "ru"
+
+# Названия языков для промпта перефразирования
+LANGUAGE_NAMES = {"ru": "русский", "en": "English"}
+
+# Намерение -> язык -> (вступление, которое можно перефразировать; неизменная часть со ссылками)
+TEMPLATES: Dict[str, Dict[str, Tuple[str, str]]] = {
+    INTENT_REFERRAL: {
+        "ru": (REFERRAL_INTRO, REFERRAL_LINKS),
+        "en": (REFERRAL_INTRO_EN, REFERRAL_LINKS),
+    },
+    INTENT_FOUNDER: {
+        "ru": (FOUNDER_ANSWER, FOUNDER_CONTACTS),
+        "en": (FOUNDER_ANSWER_EN, FOUNDER_CONTACTS_EN),
+    },
+}
+
+CYRILLIC_PATTERN = re.compile(r"[а-яё]", re.IGNORECASE)
+LATIN_PATTERN = re.compile(r"[a-z]", re.IGNORECASE)
+URL_PATTERN = re.compile(r"https?://|t\.me/|www\.", re.IGNORECASE)
+
+def detect_language(query: str, language_code: Optional[str] = None) -> str:
+    """
+    Определяет язык ответа: по буквам вопроса, иначе по языку интерфейса Telegram.
+
+    Args:
+        query: Вопрос пользователя
+        language_code: Язык пользователя в Telegram (например, "ru", "en-US")
+
+    Returns:
+        Код языка, для которого есть шаблоны
+    """
+    if CYRILLIC_PATTERN.search(query):
+        return "ru"
+    if LATIN_PATTERN.search(query):
+        return "en"
+    language = (language_code or DEFAULT_LANGUAGE).split("-")[0].lower()
+    return language if language in LANGUAGE_NAMES else DEFAULT_LANGUAGE
+
+class TemplateAnswers:
+    """Готовые ответы с подстановкой имени и фоновым перефразированием"""
+
+    def __init__(self, generate: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+                 paraphrase: bool = TEMPLATE_PARAPHRASE, max_variants: int = TEMPLATE_VARIANTS):
+        """
+        Инициализирует готовые ответы.
+
+        Args:
+            generate: Запрос к модели (промпт -> текст или None), нужен только для перефразирования
+            paraphrase: Перефразировать вступления в фоне
+            max_variants: Сколько перефразированных вариантов хранить для каждого намерения и языка
+        """
+        self.generate = generate
+        self.paraphrase = paraphrase and generate is not None
+        self.max_variants = max_variants
+
+        # (намерение, язык) -> перефразированные вступления
+        self.variants: Dict[Tuple[str, str], List[str]] = {}
+        self._pending: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.stats = {"served": 0, "paraphrased": 0, "paraphrases_rejected": 0}
+
+    def supports(self, intent: str) -> bool:
+        """Проверяет, есть ли готовый ответ для намерения."""
+        return intent in TEMPLATES
+
+    def render(self, intent: str, user_name: str, language: str = DEFAULT_LANGUAGE) -> str:
+        """
+        Собирает готовый ответ.
+
+        Args:
+            intent: Намерение (регистрация или основатель)
+            user_name: Имя пользователя
+            language: Язык ответа
+
+        Returns:
+            Текст ответа
+        """
+        templates = TEMPLATES[intent]
+        language = language if language in templates else DEFAULT_LANGUAGE
+        intro, fixed = templates[language]
+
+        key = (intent, language)
+        intro = random.choice([intro, *self.variants.get(key, ())])
+        self._schedule_paraphrase(key, templates[language][0])
+
+        self.stats["served"] += 1
+        return f"{intro}\n\n{fixed}".replace(USER_NAME_PLACEHOLDER, user_name)
+
+    def _schedule_paraphrase(self, key: Tuple[str, str], intro: str):
+        """Запускает фоновое перефразирование, если вариантов еще недостаточно."""
+        if not self.paraphrase or key in self._pending or len(self.variants.get(key, ())) >= self.max_variants:
+            return
+        self._pending.add(key)
+        task = asyncio.create_task(self._paraphrase(key, intro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _paraphrase(self, key: Tuple[str, str], intro: str):
+        """Перефразирует вступление и сохраняет вариант, если он прошел проверку."""
+        try:
+            prompt = PARAPHRASE_PROMPT.format(
+                language=LANGUAGE_NAMES[key[1]], placeholder=USER_NAME_PLACEHOLDER, text=intro
+            )
+            text = await self.generate(prompt)
+            if text and self._is_valid_paraphrase(intro, text.strip()):
+                self.variants.setdefault(key, []).append(text.strip())
+                self.stats["paraphrased"] += 1
+            elif text:
+                self.stats["paraphrases_rejected"] += 1
+        except Exception as e:
+            logger.warning(f"Не удалось перефразировать готовый ответ {key}: {e}")
+        finally:
+            self._pending.discard(key)
+
+    @staticmethod
+    def _is_valid_paraphrase(original: str, text: str) -> bool:
+        """Проверяет вариант: метка имени на месте, нет новых ссылок, длина близка к исходной."""
+        if (USER_NAME_PLACEHOLDER in original) != (text.count(USER_NAME_PLACEHOLDER) == 1):
+            return False
+        if URL_PATTERN.search(text) and not URL_PATTERN.search(original):
+            return False
+        return 0.5 * len(original) <= len(text) <= 2 * len(original)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики готовых ответов и количество вариантов по языкам."""
+        return {
+            **self.stats,
+            "variants": {f"{intent}:{language}": len(texts) for (intent, language), texts in self.variants.items()},
+        }
@@ -0,0 +1,65 @@
+"""
+Потоковый вывод ответа ассистента при ограничении частоты запросов Telegram.
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage, TelegramMethod
+from aiogram.types import Chat, Message
+
+import ai_assistant_handlers
+
+CHAT_ID = 1001
+
+class FloodBot(Bot):
+    """Бот-заглушка: первые flood_waits запросов получают TelegramRetryAfter"""
+
+    def __init__(self, flood_waits: int):
+        super().__init__("42:TEST")
+        self.flood_waits = flood_waits
+        self.calls: Counter = Counter()
+        self.text = None
+
+    def _message(self, text: str, message_id: int = 2) -> Message:
+        return Message(message_id=message_id, date=datetime.now(), chat=Chat(id=CHAT_ID, type="private"),
+                       text=text).as_(self)
+
+    async def __call__(self, method: TelegramMethod, request_timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.flood_waits:
+            self.flood_waits -= 1
+            raise TelegramRetryAfter(method, "Flood control exceeded", retry_after=0)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self.text = method.text
+            return self._message(method.text)
+        raise AssertionError(f"Неожиданный вызов API: {type(method).__name__}")
+
+class StreamingAssistant:
+    """Ассистент, который отдает накопленный ответ по фрагментам"""
+
+    async def answer_query_stream(self, question, user_info, user_id):
+        answer = ""
+        for chunk in ("Первый фрагмент. ", "Второй фрагмент. ", "Конец."):
+            answer += chunk
+            yield answer
+
+def test_flood_wait_on_first_send_does_not_abort_reply(monkeypatch):
+    monkeypatch.setattr(ai_assistant_handlers.assistant_holder, "instance", StreamingAssistant())
+
+    async def scenario():
+        bot = FloodBot(flood_waits=1)
+        question = bot._message("Вопрос", message_id=1)
+        response = await ai_assistant_handlers.stream_answer(question, "Вопрос", {"name": "Аня"}, "1")
+        await bot.session.close()
+        return bot, response
+
+    bot, response = asyncio.run(scenario())
+    assert response == "Первый фрагмент. Второй фрагмент. Конец."
+    # Первая отправка отклонена, ответ отправлен после паузы и оформлен окончательно
+    assert bot.calls["SendMessage"] == 2
+    assert bot.text == response
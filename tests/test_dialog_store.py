@@ -0,0 +1,88 @@
+"""
+Учет объема историй и сохранение в SQLite в хранилище диалогов.
+"""
+
+import threading
+
+from dialog_store import DialogStore
+
+def assert_bytes_consistent(store: DialogStore):
+    assert store.total_bytes == sum(history.size_bytes for history in store.histories.values())
+
+def contents(history) -> list:
+    return [message["content"] for message in history.messages]
+
+def test_late_answer_to_evicted_history_is_merged_into_new_one():
+    store = DialogStore(max_history=3, max_bytes=1500, db_path=None)
+    old = store.get("u")
+    old.add_exchange("q", "a")
+    # Длинная история другого пользователя вытесняет "u", затем "u" пишет снова
+    store.get("v").add_exchange("x" * 1000, "y")
+    new = store.get("u")
+    assert new is not old
+    new.add_exchange("q2", "a2")
+
+    # Ответ, сформированный по вытесненной истории, дописывается в новую - ничего не теряется
+    old.add_exchange("late", "answer")
+    assert store.get("u") is new
+    assert contents(new) == ["q2", "a2", "late", "answer"]
+    assert_bytes_consistent(store)
+
+def test_late_answer_to_evicted_history_is_persisted(tmp_path):
+    store = DialogStore(max_history=3, max_bytes=1500, db_path=str(tmp_path / "dialogs.db"))
+    old = store.get("u")
+    old.add_exchange("q", "a")
+    store.get("v").add_exchange("x" * 1000, "y")
+    assert "u" not in store.histories
+
+    # Истории в памяти нет - ответ только записывается и загружается при следующем вопросе
+    old.add_exchange("late", "answer")
+    assert "u" not in store.histories
+    assert contents(store.get("u")) == ["q", "a", "late", "answer"]
+    assert_bytes_consistent(store)
+    store.close()
+
+def test_loading_one_user_does_not_block_others(tmp_path):
+    store = DialogStore(max_history=3, db_path=str(tmp_path / "dialogs.db"))
+    store.get("ready").add_exchange("q", "a")
+
+    load = store._load
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load(user_id):
+        if user_id == "slow":
+            loading.set()
+            release.wait(5)
+        return load(user_id)
+
+    store._load = slow_load
+    thread = threading.Thread(target=store.get, args=("slow",))
+    thread.start()
+    assert loading.wait(5)
+
+    # Пока история "slow" загружается, другие пользователи получают и пополняют свои истории
+    store.get("ready").add_exchange("q2", "a2")
+    assert len(store.get("other")) == 0
+    release.set()
+    thread.join(5)
+    assert "slow" in store.histories
+    store.close()
+
+def test_history_survives_restart(tmp_path):
+    db_path = str(tmp_path / "dialogs.db")
+    store = DialogStore(max_history=2, db_path=db_path)
+    for i in range(5):
+        store.get("u").add_exchange(f"q{i}", f"a{i}")
+    store.clear("cleared")
+    store.close()
+
+    store = DialogStore(max_history=2, db_path=db_path)
+    assert [message["content"] for message in store.get("u").messages] == ["q3", "a3", "q4", "a4"]
+    store.clear("u")
+    assert len(store.get("u")) == 0
+    store.close()
+
+    store = DialogStore(max_history=2, db_path=db_path)
+    assert len(store.get("u")) == 0
+    assert store.get_stats()["persist_errors"] == 0
+    store.close()
@@ -0,0 +1,16 @@
+"""
+Клавиатуры выбора номинала быстрого потока.
+"""
+
+from fast_flow_keyboards import get_fast_flow_amount_keyboard
+
+def test_amount_keyboard_is_not_shared_between_calls():
+    keyboard = get_fast_flow_amount_keyboard("RUB")
+    expected = [[(button.text, button.callback_data) for button in row] for row in keyboard.inline_keyboard]
+
+    # Изменение выданной клавиатуры не попадает к следующему пользователю
+    keyboard.inline_keyboard[0][0].text = "изменено"
+    keyboard.inline_keyboard.pop()
+    fresh = get_fast_flow_amount_keyboard("RUB")
+    assert fresh is not keyboard
+    assert [[(button.text, button.callback_data) for button in row] for row in fresh.inline_keyboard] == expected
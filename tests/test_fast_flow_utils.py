@@ -0,0 +1,32 @@
+"""
+График быстрого потока: совпадение с пошаговой симуляцией и кэширование.
+"""
+
+import numpy as np
+import pytest
+
+from fast_flow_config import get_fast_flow_options
+from fast_flow_utils import apply_fast_flow_day, calculate_fast_flow_data, calculate_fast_flow_schedule, process_day
+
+def test_schedule_matches_day_by_day_simulation():
+    option = get_fast_flow_options("RUB")[0]
+    flow_data = calculate_fast_flow_data("RUB", option["amount"])
+    schedule = calculate_fast_flow_schedule(flow_data)
+
+    simulated = calculate_fast_flow_data("RUB", option["amount"])
+    for day in range(1, flow_data.days_total + 1):
+        process_day(simulated)
+        apply_fast_flow_day(flow_data, schedule, day)
+        assert flow_data.current_balance == pytest.approx(simulated.current_balance)
+        assert flow_data.savings == pytest.approx(simulated.savings)
+        assert flow_data.completed == simulated.completed
+
+def test_schedule_is_cached_and_read_only():
+    option = get_fast_flow_options("RUB")[0]
+    schedule = calculate_fast_flow_schedule(calculate_fast_flow_data("RUB", option["amount"]))
+    assert calculate_fast_flow_schedule(calculate_fast_flow_data("RUB", option["amount"])) is schedule
+
+    with pytest.raises(ValueError):
+        schedule["balance"][0] = 0.0
+    with pytest.raises(TypeError):
+        schedule["balance"] = np.zeros(1)
@@ -0,0 +1,66 @@
+"""
+Маршрутизатор намерений: совпадение с прежним поиском подстрок по спискам слов.
+"""
+
+import pytest
+
+from bm25_index import BENCHMARK_QUERIES
+from intent_router import (CALCULATION_TOPIC, INTENT_CALCULATION, INTENT_FOUNDER, INTENT_KEYWORDS,
+                           INTENT_OBJECTION, INTENT_REFERRAL, IntentRouter, KeywordMatcher)
+
+# Прежние проверки из rag_system.py (до маршрутизатора) - эталон поведения
+LEGACY_VASADIN = [
+    "васадин", "дмитрий васадин", "основатель", "создатель", "дмитрий",
+    "кто такой васадин", "васадин кто", "кто основатель", "основатель проекта",
+    "создатель проекта", "кто создал", "кто создатель"
+]
+LEGACY_REFERRAL = [
+    "реферал", "реферальная", "ссылка", "ссылки", "регистрация", "зарегистрироваться",
+    "начать", "старт", "как начать", "как зарегистрироваться", "как получить ссылку",
+    "пригласить", "приглашение", "пригласи", "приглашай"
+]
+LEGACY_CALCULATION = [
+    "посчитать", "расчет", "рассчитать", "сколько", "заработок", "доход",
+    "прибыль", "выгода", "выгодно", "выгоднее", "калькулятор", "калькуляция"
+]
+LEGACY_FLOW = [
+    "поток", "потоки", "заработать", "доход", "деньги", "инвестиции",
+    "инвестировать", "вложить", "вложения", "процент", "проценты"
+]
+LEGACY_OBJECTION = [
+    "пирамида", "скам", "развод", "обман", "мошенник", "не верю", "лохотрон",
+    "ponzi", "scam", "fraud", "обманули", "хайп", "млм", "mlm",
+    "не работает", "потеряю", "деньги пропадут", "рискованно",
+    "нелегально", "запрещено", "уже был в"
+]
+
+QUERIES = list(BENCHMARK_QUERIES) + [
+    "Кто такой Дмитрий Васадин?", "Дай реферальную ссылку", "Сколько можно заработать в потоке?",
+    "Это же пирамида, деньги пропадут", "Как начать инвестировать?", "Расскажи о проекте",
+    "Кто создатель проекта и как зарегистрироваться?", "Какой доход?", "Это scam или MLM?",
+    "Я уже был в похожем проекте, он не работает", "Посчитай проценты по вложениям", "",
+    "Who is the founder? How do I sign up?",
+]
+
+def contains_any(query: str, keywords) -> bool:
+    return any(keyword in query.lower() for keyword in keywords)
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_router_matches_legacy_keyword_checks(query):
+    labels = IntentRouter(INTENT_KEYWORDS).labels(query)
+    assert (INTENT_FOUNDER in labels) == contains_any(query, LEGACY_VASADIN)
+    assert (INTENT_REFERRAL in labels) == contains_any(query, LEGACY_REFERRAL)
+    assert (INTENT_CALCULATION in labels and CALCULATION_TOPIC in labels) == \
+        (contains_any(query, LEGACY_CALCULATION) and contains_any(query, LEGACY_FLOW))
+    assert (INTENT_OBJECTION in labels) == contains_any(query, LEGACY_OBJECTION)
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_single_pass_matches_substring_scan(query):
+    text = query.lower()
+    expected = frozenset(label for label, words in INTENT_KEYWORDS.items() if any(word in text for word in words))
+    assert KeywordMatcher(INTENT_KEYWORDS).match(text) == expected
+
+def test_english_questions_reach_templates():
+    router = IntentRouter()
+    assert router.route("Who is the founder of the project?") == INTENT_FOUNDER
+    assert router.route("How do I sign up?") == INTENT_REFERRAL
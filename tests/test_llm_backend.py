@@ -0,0 +1,98 @@
+import asyncio
+
+from llm_backend import CircuitBreaker, LLMBackend, LLMResponse, ResilientBackend
+
+class SlowBackend(LLMBackend):
+    """Бэкенд, который отвечает через delay секунд (или падает, пока fail=True)"""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.fail = False
+
+    async def generate(self, prompt):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("сбой")
+        return LLMResponse("ответ", 1, 0, 1, self.delay)
+
+    async def stream(self, prompt):
+        for word in ("один", "два", "три"):
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("сбой")
+            yield word
+
+def tripped_backend(delay: float) -> ResilientBackend:
+    """Обертка с разомкнутым breaker, который уже готов пропустить пробный запрос."""
+    backend = SlowBackend(delay)
+    resilient = ResilientBackend(backend, timeout=5, retries=0,
+                                 breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0), hedge=False)
+    resilient.breaker.record_failure()
+    assert resilient.breaker.state == CircuitBreaker.OPEN
+    return resilient
+
+def test_cancelled_probe_releases_breaker():
+    async def scenario():
+        resilient = tripped_backend(delay=0.5)
+        probe = asyncio.ensure_future(resilient.generate("вопрос"))
+        await asyncio.sleep(0.05)
+        assert resilient.breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+        # Следующий запрос становится новым пробным и замыкает breaker
+        resilient.backend.delay = 0
+        response = await resilient.generate("вопрос")
+        assert response.text == "ответ"
+        assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+def test_probe_timed_out_by_caller_releases_breaker():
+    async def scenario():
+        resilient = tripped_backend(delay=0.5)
+        try:
+            await asyncio.wait_for(resilient.generate("вопрос"), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        assert resilient.breaker.allow()
+
+    asyncio.run(scenario())
+
+def test_closed_stream_probe_releases_breaker():
+    async def scenario():
+        resilient = tripped_backend(delay=0)
+        stream = resilient.stream("вопрос")
+        assert await stream.__anext__() == "один"
+        await stream.aclose()
+
+        chunks = [chunk async for chunk in resilient.stream("вопрос")]
+        assert chunks == ["один", "два", "три"]
+        assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+def test_failed_probe_reopens_breaker():
+    async def scenario():
+        resilient = tripped_backend(delay=0)
+        resilient.backend.fail = True
+        try:
+            await resilient.generate("вопрос")
+        except Exception:
+            pass
+        assert resilient.breaker.state == CircuitBreaker.OPEN
+
+    asyncio.run(scenario())
+
+def test_backend_must_implement_stream():
+    class GenerateOnlyBackend(LLMBackend):
+        async def generate(self, prompt):
+            return LLMResponse("ответ", 1, 0, 1, 0.0)
+
+    try:
+        GenerateOnlyBackend()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("бэкенд без stream создан")
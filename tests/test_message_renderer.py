@@ -0,0 +1,130 @@
+"""
+Подсчет вызовов Telegram API в симуляторе быстрого потока.
+
+Заглушка бота не обращается к Telegram: она считает вызванные методы API и ведет
+список сообщений чата. Сценарий нажимает кнопки последнего сообщения бота так же,
+как пользователь, и проходит обработчики через Dispatcher.
+
+Использование:
+    python tests/test_message_renderer.py   # напечатать количество вызовов по методам
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage, SendPhoto, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+import image_registry
+from fast_flow_handlers import fast_flow_router
+
+CHAT_ID = 1001
+USER = User(id=CHAT_ID, is_bot=False, first_name="Тест")
+
+class CountingBot(Bot):
+    """Бот-заглушка: считает вызовы методов API и хранит сообщения чата"""
+
+    def __init__(self):
+        super().__init__("42:TEST")
+        self.calls: Counter = Counter()
+        self.messages: Dict[int, Message] = {}
+        self._next_message_id = 1
+
+    def _message(self, message_id: Optional[int] = None, **fields) -> Message:
+        """Создает (или заменяет) сообщение бота в чате."""
+        if message_id is None:
+            message_id, self._next_message_id = self._next_message_id, self._next_message_id + 1
+        message = Message(message_id=message_id, date=datetime.now(), chat=Chat(id=CHAT_ID, type="private"),
+                          **fields).as_(self)
+        self.messages[message_id] = message
+        return message
+
+    async def __call__(self, method: TelegramMethod, request_timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, SendMessage):
+            return self._message(text=method.text, reply_markup=method.reply_markup)
+        if isinstance(method, SendPhoto):
+            photo = [PhotoSize(file_id=f"photo-{self._next_message_id}", file_unique_id="u", width=1, height=1)]
+            return self._message(photo=photo, caption=method.caption, reply_markup=method.reply_markup)
+        if isinstance(method, EditMessageText):
+            return self._message(method.message_id, text=method.text, reply_markup=method.reply_markup)
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        raise AssertionError(f"Неожиданный вызов API: {type(method).__name__}")
+
+class ScriptedUser:
+    """Пользователь, нажимающий кнопки последнего сообщения бота"""
+
+    def __init__(self, bot: CountingBot, dispatcher: Dispatcher):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self._update_id = 0
+
+    async def tap(self, callback_prefix: str, message: Optional[Message] = None):
+        """Нажимает первую кнопку, callback_data которой начинается с callback_prefix."""
+        if message is None:
+            message = self.bot.messages[max(self.bot.messages)] if self.bot.messages else \
+                self.bot._message(text="Меню")
+        if message.reply_markup:
+            buttons = [button for row in message.reply_markup.inline_keyboard for button in row]
+            data = next(button.callback_data for button in buttons
+                        if button.callback_data and button.callback_data.startswith(callback_prefix))
+        else:
+            data = callback_prefix
+        self._update_id += 1
+        callback = CallbackQuery(id=str(self._update_id), from_user=USER, chat_instance="test",
+                                 message=message, data=data)
+        await self.dispatcher.feed_update(self.bot, Update(update_id=self._update_id, callback_query=callback))
+
+async def run_fast_flow(accruals: int = 30, repeated_taps: int = 5) -> Counter:
+    """
+    Проходит сценарий быстрого потока и возвращает количество вызовов API по методам.
+
+    Сценарий: меню -> валюта (фото) -> номинал -> подтверждение -> accruals начислений,
+    затем repeated_taps повторных нажатий на уже показанный день в режиме просмотра по дням.
+    """
+    bot = CountingBot()
+    dispatcher = Dispatcher()
+    dispatcher.include_router(fast_flow_router)
+    user = ScriptedUser(bot, dispatcher)
+
+    await user.tap("fast_flow")
+    await user.tap("fastflow_currency_RUB")
+    await user.tap("fastflow_amount_")
+    await user.tap("fastflow_confirm")
+    for _ in range(accruals):
+        await user.tap("fastflow_next_day")
+    await user.tap("fastflow_playback")
+    for _ in range(repeated_taps):
+        await user.tap("fastflow_day_1")
+        await user.tap("fastflow_day_1")
+
+    bot.calls["chat_messages"] = len(bot.messages)
+    await bot.session.close()
+    return bot.calls
+
+def test_fast_flow_edits_current_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_registry, "FILE_IDS_PATH", str(tmp_path / "file_ids.json"))
+    calls = asyncio.run(run_fast_flow(accruals=30, repeated_taps=5))
+
+    # Новые сообщения: фото валюты и экран подтверждения (фото нельзя отредактировать в текст)
+    assert calls["SendPhoto"] == 1
+    assert calls["SendMessage"] == 1
+    # Подтверждение, 30 начислений и переход к просмотру по дням - редактирование того же сообщения;
+    # первый переход на день 1 меняет экран, повторные нажатия вызовов не требуют
+    assert calls["EditMessageText"] == 1 + 30 + 1 + 1
+    assert calls["chat_messages"] == 3
+
+if __name__ == "__main__":
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    image_registry.FILE_IDS_PATH = os.path.join(os.environ.get("TMPDIR", "/tmp"), "file_ids_render_test.json")
+    for method, count in sorted(asyncio.run(run_fast_flow()).items()):
+        print(f"{method:>20}: {count}")
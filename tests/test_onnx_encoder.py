@@ -0,0 +1,84 @@
+"""
+Сверка ONNX-кодировщика с эталонной моделью SentenceTransformers.
+
+Тест с all-MiniLM-L6-v2 пропускается, если модель нельзя загрузить (нет кэша и доступа
+к Hugging Face Hub). Тест с маленькой случайно инициализированной BERT-моделью, собранной
+локально, проверяет тот же путь (экспорт, int8-квантизация, усреднение и нормализация)
+без загрузки весов.
+"""
+
+import os
+import string
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from onnx_encoder import (
+    MODEL_NAME, PARITY_MIN_COSINE_FP32, PARITY_MIN_COSINE_INT8, OnnxSentenceEncoder, embedding_cosines,
+    export_onnx_model
+)
+from vector_store import load_documents, resolve_generation_path
+
+QUERIES = [
+    "Как начать зарабатывать?", "Что такое ECR?", "Это пирамида?", "Кто основатель проекта?",
+    "Как вывести деньги?", "Чем отличается быстрый поток от растущего?", "Что такое AML политика?",
+]
+
+@pytest.fixture(scope="module")
+def texts():
+    """Чанки базы знаний и типовые вопросы."""
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    vector_db_path = resolve_generation_path(os.path.join(repo_dir, "vector_db"))
+    return list(load_documents(vector_db_path)[0]) + QUERIES
+
+def assert_parity(model_path: str, output_dir: str, texts):
+    """Экспортирует модель и сравнивает fp32- и int8-кодировщики с эталоном."""
+    export_onnx_model(model_path, output_dir)
+    reference = sentence_transformers.SentenceTransformer(model_path, device="cpu").encode(
+        texts, normalize_embeddings=True
+    )
+    for quantized, threshold in ((False, PARITY_MIN_COSINE_FP32), (True, PARITY_MIN_COSINE_INT8)):
+        candidate = OnnxSentenceEncoder(output_dir, quantized=quantized).encode(texts)
+        cosines = embedding_cosines(reference, candidate)
+        print(f"{'int8' if quantized else 'fp32'}: мин. косинусное сходство {cosines.min():.6f}")
+        assert cosines.min() >= threshold
+
+def test_onnx_matches_minilm(tmp_path, texts):
+    try:
+        sentence_transformers.SentenceTransformer(MODEL_NAME, device="cpu")
+    except Exception as e:
+        pytest.skip(f"Модель {MODEL_NAME} недоступна: {e}")
+    assert_parity(MODEL_NAME, str(tmp_path / "onnx"), texts)
+
+def test_onnx_matches_local_bert(tmp_path, texts):
+    from sentence_transformers import models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    # Словарь из отдельных символов - токенизатор WordPiece без загрузки с Hub
+    chars = sorted(set("".join(texts).lower()) | set(string.ascii_lowercase + string.digits + string.punctuation))
+    chars = [char for char in chars if not char.isspace()]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + chars + [f"##{char}" for char in chars]
+    vocab_path = tmp_path / "vocab.txt"
+    vocab_path.write_text("\n".join(vocab), encoding="utf-8")
+
+    bert_dir = str(tmp_path / "bert")
+    BertTokenizerFast(vocab_file=str(vocab_path), do_lower_case=True).save_pretrained(bert_dir)
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                         intermediate_size=128, max_position_embeddings=512)).save_pretrained(bert_dir)
+
+    model = sentence_transformers.SentenceTransformer(modules=[
+        models.Transformer(bert_dir, max_seq_length=256), models.Pooling(64, "mean"), models.Normalize()
+    ], device="cpu")
+    model_dir = str(tmp_path / "sentence_model")
+    model.save(model_dir)
+
+    assert_parity(model_dir, str(tmp_path / "onnx"), texts)
+
+def test_embedding_cosines_normalizes():
+    vectors = np.array([[3.0, 4.0], [1.0, 0.0]], dtype=np.float32)
+    assert np.allclose(embedding_cosines(vectors, vectors * 2), 1.0)
@@ -0,0 +1,90 @@
+"""
+Потоковые ответы RAG-ассистента: кэш ответов и история диалога при обрыве потока.
+
+Модель эмбеддингов заменяется детерминированным кодировщиком (без загрузки весов),
+LLM - бэкендом со сценарием фрагментов.
+"""
+
+import asyncio
+import hashlib
+
+import numpy as np
+import pytest
+
+import rag_system
+from llm_backend import LLMBackend, LLMBackendError, LLMResponse
+
+QUESTION = "Как устроен проект и сколько он существует?"
+
+class HashEncoder:
+    """Кодировщик: нормализованный псевдослучайный вектор, зависящий только от текста"""
+
+    def encode(self, texts, **kwargs):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "big")
+            vector = np.random.default_rng(seed).standard_normal(384)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.array(vectors, dtype=np.float32)
+
+class ScriptedBackend(LLMBackend):
+    """Бэкенд, который отдает фрагменты очередного сценария; None в сценарии - обрыв потока"""
+
+    def __init__(self, *scripts):
+        super().__init__()
+        self.scripts = list(scripts)
+
+    async def generate(self, prompt):
+        text = "".join(chunk for chunk in self.scripts.pop(0) if chunk is not None)
+        return LLMResponse(text, 1, 0, 1, 0.0)
+
+    async def stream(self, prompt):
+        for chunk in self.scripts.pop(0):
+            if chunk is None:
+                raise LLMBackendError("поток оборвался")
+            yield chunk
+
+@pytest.fixture
+def assistant(monkeypatch):
+    monkeypatch.setattr(rag_system, "load_embedding_model", lambda: HashEncoder())
+    monkeypatch.setattr(rag_system, "create_llm_backend", lambda: ScriptedBackend())
+    return rag_system.RAGAssistant()
+
+async def stream_answer(assistant, user_id: str) -> str:
+    answer = ""
+    async for answer in assistant.answer_query_stream(QUESTION, {"name": "Аня"}, user_id):
+        pass
+    return answer
+
+def test_broken_stream_is_not_cached(assistant):
+    assistant.llm = ScriptedBackend(["Начало ответа, ", "которое обрывается", None],
+                                    ["Полный ответ ", "на вопрос."])
+
+    async def scenario():
+        await stream_answer(assistant, "user1")
+        assert assistant.answer_cache.get_stats()["size"] == 0
+
+        # Второй пользователь получает ответ модели, а не оборванный текст из кэша
+        answer = await stream_answer(assistant, "user2")
+        assert "Полный ответ на вопрос." in answer
+        assert "обрывается" not in answer
+
+    asyncio.run(scenario())
+
+def test_complete_stream_is_cached(assistant):
+    assistant.llm = ScriptedBackend(["Полный ответ ", "на вопрос."])
+
+    async def scenario():
+        await stream_answer(assistant, "user1")
+        assert assistant.answer_cache.get_stats()["size"] == 1
+        assert "Полный ответ на вопрос." in await stream_answer(assistant, "user2")
+
+    asyncio.run(scenario())
+
+def test_broken_stream_is_marked_and_not_saved_to_history(assistant):
+    assistant.llm = ScriptedBackend(["Начало ответа, ", "которое обрывается", None])
+
+    answer = asyncio.run(stream_answer(assistant, "user1"))
+    assert answer.endswith(rag_system.STREAM_INTERRUPTED_NOTE)
+    assert "которое обрывается" in answer
+    assert len(assistant.get_user_history("user1")) == 0
@@ -0,0 +1,32 @@
+"""
+Закрытие файлов выведенного из работы поколения векторной БД.
+"""
+
+import pytest
+
+from vector_store import VectorDBGeneration, load_documents, write_documents
+
+def make_generation(tmp_path) -> VectorDBGeneration:
+    write_documents(str(tmp_path), ["первый чанк", "второй чанк"], [{"source": "a"}, {"source": "b"}])
+    texts, metadatas = load_documents(str(tmp_path))
+    return VectorDBGeneration(str(tmp_path), "1", {}, None, texts, metadatas, None)
+
+def test_retired_generation_closes_after_last_reader(tmp_path):
+    generation = make_generation(tmp_path)
+    assert generation.acquire()
+
+    # Начатый запрос дочитывает поколение, хотя его уже заменили
+    generation.retire()
+    assert generation.texts[1] == "второй чанк"
+    assert generation.metadatas[0] == {"source": "a"}
+    assert not generation.acquire()
+
+    generation.release()
+    with pytest.raises(ValueError):
+        generation.texts[0]
+
+def test_unused_generation_closes_on_retire(tmp_path):
+    generation = make_generation(tmp_path)
+    generation.retire()
+    with pytest.raises(ValueError):
+        generation.metadatas[0]
@@ -0,0 +1,92 @@
+"""
+Последовательная обработка сообщений одного пользователя с объединением серий сообщений.
+
+У каждого пользователя своя очередь и свой обработчик (задача asyncio): сообщения одного
+пользователя обрабатываются строго по порядку поступления, а разные пользователи
+обслуживаются параллельно. Сообщения, пришедшие подряд (в течение окна ожидания или
+пока обрабатывалось предыдущее), передаются обработчику одной пачкой - например,
+чтобы ответить на них одним запросом к модели.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+class UserQueue:
+    """Очереди сообщений по пользователям с обработкой пачками"""
+
+    def __init__(self, handler: Callable[[str, List[Any]], Awaitable[None]],
+                 coalesce_window: float = 0.0, max_batch: int = 5):
+        """
+        Инициализирует очереди.
+
+        Args:
+            handler: Обработчик пачки сообщений пользователя (id пользователя, элементы по порядку)
+            coalesce_window: Сколько секунд ждать продолжения серии после первого сообщения
+            max_batch: Максимальное количество сообщений в одной пачке
+        """
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+
+        # id пользователя -> ожидающие элементы с future, которая завершится после их обработки
+        self._pending: Dict[str, List[Tuple[Any, asyncio.Future]]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        self.stats = {"submitted": 0, "batches": 0, "coalesced": 0, "max_queue": 0}
+
+    def submit(self, user_id: str, item: Any) -> asyncio.Future:
+        """
+        Ставит элемент в очередь пользователя.
+
+        Args:
+            user_id: Идентификатор пользователя
+            item: Элемент для обработчика (например, сообщение с вопросом)
+
+        Returns:
+            Future, которая завершается, когда пачка с элементом обработана
+        """
+        done = asyncio.get_running_loop().create_future()
+        queue = self._pending.setdefault(user_id, [])
+        queue.append((item, done))
+        self.stats["submitted"] += 1
+        self.stats["max_queue"] = max(self.stats["max_queue"], len(queue))
+
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._worker(user_id))
+        return done
+
+    async def _worker(self, user_id: str):
+        """Обрабатывает очередь пользователя пачками, пока она не опустеет."""
+        try:
+            # Первое сообщение серии ждет продолжения; следующие пачки копятся, пока идет обработка
+            if self.coalesce_window > 0:
+                await asyncio.sleep(self.coalesce_window)
+
+            while self._pending.get(user_id):
+                queue = self._pending[user_id]
+                batch, self._pending[user_id] = queue[:self.max_batch], queue[self.max_batch:]
+                self.stats["batches"] += 1
+                self.stats["coalesced"] += len(batch) - 1
+
+                try:
+                    await self.handler(user_id, [item for item, _ in batch])
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке сообщений пользователя {user_id}: {e}")
+                finally:
+                    for _, done in batch:
+                        if not done.done():
+                            done.set_result(None)
+        finally:
+            # Между проверкой очереди и удалением обработчика нет await - новое сообщение не потеряется.
+            # Остаток очереди бывает только при отмене обработчика (остановка бота)
+            for _, done in self._pending.pop(user_id, []):
+                done.cancel()
+            self._workers.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики очередей и количество пользователей, чьи сообщения обрабатываются."""
+        return {**self.stats, "active_users": len(self._workers)}
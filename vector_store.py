@@ -0,0 +1,496 @@
+"""
+Формат хранения векторной БД без pickle.
+
+Тексты чанков и их метаданные (JSON) лежат в бинарных файлах UTF-8 подряд, а границы
+записей - в массиве смещений .npy. Файлы открываются через mmap, поэтому загрузка
+не зависит от размера базы знаний, а несколько процессов бота используют одни и те же
+страницы памяти. FAISS-индекс также читается с IO_FLAG_MMAP.
+
+Каждая сборка векторной БД пишется в отдельное поколение (generations/<номер>), а файл
+CURRENT атомарно переключается на новое поколение - читатели никогда не видят
+наполовину записанную БД.
+
+Использование:
+    python vector_store.py migrate   # перевести vector_db/documents.pkl в новый формат
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Файлы векторной БД
+INDEX_FILE = "faiss_index.bin"
+TEXTS_FILE = "texts.bin"
+TEXTS_OFFSETS_FILE = "texts_offsets.npy"
+METADATAS_FILE = "metadatas.bin"
+METADATAS_OFFSETS_FILE = "metadatas_offsets.npy"
+LEGACY_DOCUMENTS_FILE = "documents.pkl"
+MODEL_INFO_FILE = "model_info.json"
+CHUNK_IDS_FILE = "chunk_ids.npy"
+
+# Поколения векторной БД и указатель на текущее
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"
+
+# Сколько поколений хранить (предыдущее может еще использоваться запущенным ботом)
+KEEP_GENERATIONS = 2
+
+# Типы FAISS-индекса: точный поиск и приближенные (ANN) индексы для больших баз знаний
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# Границы размера корпуса для автоматического выбора индекса
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 200_000
+IVF_FLAT_MAX_VECTORS = 2_000_000
+
+# Минимальное количество векторов на кластер IVF для обучения (рекомендация FAISS - 39)
+IVF_MIN_POINTS_PER_LIST = 39
+
+class MmapStringList:
+    """Список строк только для чтения поверх отображенного в память файла"""
+
+    def __init__(self, data_path: str, offsets_path: str):
+        """
+        Открывает файлы списка.
+
+        Args:
+            data_path: Файл со строками в UTF-8, записанными подряд
+            offsets_path: Массив смещений длины n + 1 (int64)
+        """
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+
+        self._file = open(data_path, "rb")
+        if os.fstat(self._file.fileno()).st_size > 0:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # Пустой файл нельзя отобразить в память
+            self._data = b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("индекс вне диапазона")
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def close(self):
+        """Закрывает отображение файла."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+class MmapMetadataList:
+    """Список метаданных чанков, которые декодируются из JSON при обращении"""
+
+    def __init__(self, data_path: str, offsets_path: str):
+        self._strings = MmapStringList(data_path, offsets_path)
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return json.loads(self._strings[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def close(self):
+        """Закрывает отображение файла."""
+        self._strings.close()
+
+def _write_strings(strings: Sequence[str], data_path: str, offsets_path: str):
+    """Записывает строки подряд в UTF-8 и массив смещений к ним."""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(data_path, "wb") as f:
+        for i, string in enumerate(strings):
+            encoded = string.encode("utf-8")
+            f.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    # np.save дописывает .npy к имени без расширения - передаем открытый файл
+    with open(offsets_path, "wb") as f:
+        np.save(f, offsets)
+
+def write_documents(output_dir: str, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]):
+    """
+    Сохраняет тексты и метаданные чанков в формате для отображения в память.
+
+    Args:
+        output_dir: Директория векторной БД
+        texts: Тексты чанков
+        metadatas: Метаданные чанков (сериализуемые в JSON)
+    """
+    if len(texts) != len(metadatas):
+        raise ValueError("Количество текстов и метаданных не совпадает")
+
+    _write_strings(texts, os.path.join(output_dir, TEXTS_FILE), os.path.join(output_dir, TEXTS_OFFSETS_FILE))
+    _write_strings(
+        [json.dumps(metadata, ensure_ascii=False) for metadata in metadatas],
+        os.path.join(output_dir, METADATAS_FILE),
+        os.path.join(output_dir, METADATAS_OFFSETS_FILE)
+    )
+
+def load_documents(vector_db_path: str) -> Tuple[Sequence[str], Sequence[Dict[str, Any]]]:
+    """
+    Открывает тексты и метаданные чанков.
+
+    Если векторная БД создана старой версией (documents.pkl), загружает ее целиком
+    и предлагает выполнить миграцию.
+
+    Returns:
+        Кортеж (тексты, метаданные) с доступом по индексу
+    """
+    texts_path = os.path.join(vector_db_path, TEXTS_FILE)
+    if os.path.exists(texts_path):
+        texts = MmapStringList(texts_path, os.path.join(vector_db_path, TEXTS_OFFSETS_FILE))
+        metadatas = MmapMetadataList(
+            os.path.join(vector_db_path, METADATAS_FILE),
+            os.path.join(vector_db_path, METADATAS_OFFSETS_FILE)
+        )
+        return texts, metadatas
+
+    legacy_path = os.path.join(vector_db_path, LEGACY_DOCUMENTS_FILE)
+    if os.path.exists(legacy_path):
+        import pickle
+        logger.warning(f"Векторная БД в старом формате ({legacy_path}). Выполните: python vector_store.py migrate")
+        with open(legacy_path, "rb") as f:
+            documents_data = pickle.load(f)
+        return documents_data["texts"], documents_data["metadatas"]
+
+    raise FileNotFoundError(f"Не найдены тексты чанков в {vector_db_path}. Сначала создайте эмбеддинги.")
+
+def resolve_generation_path(vector_db_path: str) -> str:
+    """
+    Возвращает директорию текущего поколения векторной БД.
+
+    Если поколений нет (БД создана старой версией или поставляется в репозитории),
+    возвращает саму директорию vector_db_path.
+    """
+    try:
+        with open(os.path.join(vector_db_path, CURRENT_FILE), "r") as f:
+            generation = f.read().strip()
+    except FileNotFoundError:
+        return vector_db_path
+    return os.path.join(vector_db_path, GENERATIONS_DIR, generation)
+
+def new_generation_path(vector_db_path: str) -> str:
+    """Создает директорию для нового поколения векторной БД."""
+    path = os.path.join(vector_db_path, GENERATIONS_DIR, str(time.time_ns()))
+    os.makedirs(path)
+    return path
+
+def publish_generation(vector_db_path: str, generation_path: str):
+    """
+    Атомарно делает поколение текущим и удаляет устаревшие поколения.
+
+    Args:
+        vector_db_path: Директория векторной БД
+        generation_path: Полностью записанная директория нового поколения
+    """
+    generation = os.path.basename(generation_path)
+    tmp_path = os.path.join(vector_db_path, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(vector_db_path, CURRENT_FILE))
+
+    # Файлы, отображенные в память запущенным ботом, остаются доступны и после удаления
+    generations_dir = os.path.join(vector_db_path, GENERATIONS_DIR)
+    generations = sorted(os.listdir(generations_dir), key=int)
+    for old_generation in generations[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(generations_dir, old_generation), ignore_errors=True)
+
+def text_hash(text: str) -> str:
+    """Хэш содержимого чанка (ключ кэша эмбеддингов)."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def chunk_id(source: str, text: str) -> int:
+    """Стабильный идентификатор чанка в FAISS-индексе (63-битный хэш источника и текста)."""
+    digest = hashlib.sha1(f"{source}\x00{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+def write_chunk_ids(output_dir: str, ids: np.ndarray):
+    """Сохраняет идентификаторы чанков (в порядке текстов, по возрастанию)."""
+    with open(os.path.join(output_dir, CHUNK_IDS_FILE), "wb") as f:
+        np.save(f, np.asarray(ids, dtype=np.int64))
+
+def load_chunk_ids(vector_db_path: str) -> Optional[np.ndarray]:
+    """Открывает идентификаторы чанков или возвращает None, если индекс не использует идентификаторы."""
+    path = os.path.join(vector_db_path, CHUNK_IDS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+def ids_to_positions(chunk_ids: Optional[np.ndarray], ids: np.ndarray) -> np.ndarray:
+    """
+    Переводит идентификаторы, возвращенные FAISS, в номера чанков.
+
+    Идентификаторы хранятся по возрастанию, поэтому достаточно бинарного поиска.
+    Неизвестные идентификаторы (и -1 от FAISS) превращаются в -1.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if chunk_ids is None:
+        return ids
+    if len(chunk_ids) == 0:
+        return np.full_like(ids, -1)
+    positions = np.minimum(np.searchsorted(chunk_ids, ids), len(chunk_ids) - 1)
+    found = (ids >= 0) & (chunk_ids[positions] == ids)
+    return np.where(found, positions, -1)
+
+def get_vector_db_version(vector_db_path: str) -> str:
+    """
+    Возвращает версию векторной БД: имя текущего поколения или, для БД без поколений,
+    время изменения индекса. Дешевая проверка для отслеживания пересборки.
+    """
+    try:
+        with open(os.path.join(vector_db_path, CURRENT_FILE), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return str(os.stat(os.path.join(vector_db_path, INDEX_FILE)).st_mtime_ns)
+
+class VectorDBGeneration:
+    """Загруженное поколение векторной БД: индекс, тексты, метаданные и индекс BM25"""
+
+    def __init__(self, path: str, version: str, model_info: Dict[str, Any], index, texts: Sequence[str],
+                 metadatas: Sequence[Dict[str, Any]], chunk_ids: Optional[np.ndarray], bm25_index=None):
+        self.path = path
+        self.version = version
+        self.model_info = model_info
+        self.index = index
+        self.index_type = model_info.get("index_type", "flat")
+        self.texts = texts
+        self.metadatas = metadatas
+        self.chunk_ids = chunk_ids
+        self.bm25_index = bm25_index
+
+        # Число выполняющихся по поколению запросов; выведенное из работы поколение закрывается последним из них
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._retired = False
+
+    def acquire(self) -> bool:
+        """
+        Отмечает начало запроса к поколению.
+
+        Returns:
+            False, если поколение уже выведено из работы (нужно взять текущее)
+        """
+        with self._lock:
+            if self._retired:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self):
+        """Отмечает окончание запроса; закрывает выведенное из работы поколение после последнего запроса."""
+        with self._lock:
+            self._readers -= 1
+            close = self._retired and self._readers == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Выводит поколение из работы: файлы закрываются, как только завершатся начатые запросы."""
+        with self._lock:
+            self._retired = True
+            close = self._readers == 0
+        if close:
+            self.close()
+
+    def close(self):
+        """Закрывает отображенные в память тексты и метаданные (у БД старого формата это обычные списки)."""
+        for documents in (self.texts, self.metadatas):
+            if hasattr(documents, "close"):
+                documents.close()
+
+    def index_id(self, position: int) -> int:
+        """Идентификатор чанка в FAISS-индексе по номеру чанка (в БД без идентификаторов они совпадают)."""
+        return int(self.chunk_ids[position]) if self.chunk_ids is not None else int(position)
+
+    @classmethod
+    def load(cls, vector_db_path: str, with_bm25: bool = True) -> "VectorDBGeneration":
+        """
+        Загружает текущее поколение векторной БД.
+
+        Args:
+            vector_db_path: Директория векторной БД
+            with_bm25: Загрузить лексический индекс для гибридного поиска, если он есть
+        """
+        from bm25_index import BM25Index
+
+        # Версию читаем до загрузки: если БД пересоберут во время загрузки, это заметят при следующей проверке
+        version = get_vector_db_version(vector_db_path)
+        path = resolve_generation_path(vector_db_path)
+
+        with open(os.path.join(path, MODEL_INFO_FILE), "r") as f:
+            model_info = json.load(f)
+
+        # Индекс отображается в память; применяем параметры поиска его типа
+        index = load_index(path)
+        configure_search(index, model_info.get("index_type", "flat"), model_info.get("index_params", {}))
+
+        texts, metadatas = load_documents(path)
+
+        bm25_index = None
+        if with_bm25:
+            if BM25Index.exists(path):
+                bm25_index = BM25Index.load(path)
+            else:
+                logger.warning("Индекс BM25 не найден, используется только векторный поиск. "
+                               "Выполните: python bm25_index.py build")
+
+        return cls(path, version, model_info, index, texts, metadatas, load_chunk_ids(path), bm25_index)
+
+def load_index(vector_db_path: str):
+    """Загружает FAISS-индекс, отображая его в память, если тип индекса это поддерживает."""
+    index_path = os.path.join(vector_db_path, INDEX_FILE)
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        logger.warning(f"Индекс нельзя отобразить в память, загружаем целиком: {e}")
+        return faiss.read_index(index_path)
+
+def choose_index_type(n_vectors: int) -> str:
+    """Выбирает тип индекса по размеру корпуса."""
+    if n_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    if n_vectors <= IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+def default_index_params(index_type: str, n_vectors: int, dimension: int) -> Dict[str, Any]:
+    """
+    Возвращает параметры индекса по умолчанию.
+
+    Args:
+        index_type: Тип индекса (flat, hnsw, ivf_flat, ivf_pq)
+        n_vectors: Количество векторов
+        dimension: Размерность векторов
+
+    Returns:
+        Параметры построения и поиска
+    """
+    if index_type == "flat":
+        return {}
+    if index_type == "hnsw":
+        return {"M": 32, "ef_construction": 200, "ef_search": 64}
+
+    # Число кластеров ~ 4 * sqrt(n), но так, чтобы на каждый хватало точек для обучения
+    nlist = max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // IVF_MIN_POINTS_PER_LIST))
+    params = {"nlist": nlist, "nprobe": min(nlist, max(8, nlist // 16))}
+    if index_type == "ivf_pq":
+        # Количество подвекторов должно делить размерность
+        m = next(m for m in (48, 32, 24, 16, 12, 8, 6, 4, 3, 2, 1) if dimension % m == 0)
+        # Для 8 бит на подвектор нужно не меньше 256 точек обучения
+        params.update({"m": m, "nbits": min(8, int(np.log2(max(n_vectors, 2))))})
+    return params
+
+def supports_removal(index_type: str) -> bool:
+    """Можно ли удалять векторы из индекса этого типа (HNSW удаление не поддерживает)."""
+    return index_type in ("flat", "ivf_flat", "ivf_pq")
+
+def build_index(embeddings: np.ndarray, index_type: str = "auto", params: Dict[str, Any] = None,
+                ids: Optional[np.ndarray] = None):
+    """
+    Строит FAISS-индекс по нормализованным эмбеддингам (скалярное произведение = косинус).
+
+    Args:
+        embeddings: Нормализованные эмбеддинги (float32)
+        index_type: Тип индекса или "auto" для выбора по размеру корпуса
+        params: Параметры индекса (по умолчанию - default_index_params)
+        ids: Идентификаторы векторов (по умолчанию - номера по порядку)
+
+    Returns:
+        Кортеж (индекс, тип индекса, параметры)
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n_vectors, dimension = embeddings.shape
+
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Неизвестный тип индекса: {index_type}. Допустимые: {', '.join(INDEX_TYPES)}")
+
+    params = {**default_index_params(index_type, n_vectors, dimension), **(params or {})}
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, params["nlist"], params["m"], params["nbits"], faiss.METRIC_INNER_PRODUCT
+            )
+        index.train(embeddings)
+
+    if ids is None:
+        index.add(embeddings)
+    else:
+        # IVF хранит идентификаторы сам, остальным индексам нужна обертка
+        if index_type in ("flat", "hnsw"):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    configure_search(index, index_type, params)
+    return index, index_type, params
+
+def configure_search(index, index_type: str, params: Dict[str, Any]):
+    """Применяет параметры поиска (efSearch для HNSW, nprobe для IVF)."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if index_type == "hnsw":
+        index.hnsw.efSearch = params.get("ef_search", 64)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        index.nprobe = params.get("nprobe", 8)
+
+def migrate(vector_db_path: str = "vector_db"):
+    """Переводит documents.pkl в формат для отображения в память."""
+    import pickle
+
+    legacy_path = os.path.join(vector_db_path, LEGACY_DOCUMENTS_FILE)
+    with open(legacy_path, "rb") as f:
+        documents_data = pickle.load(f)
+
+    texts: List[str] = documents_data["texts"]
+    write_documents(vector_db_path, texts, documents_data["metadatas"])
+
+    # Проверяем, что новый формат читается так же
+    new_texts, new_metadatas = load_documents(vector_db_path)
+    assert list(new_texts) == texts and list(new_metadatas) == documents_data["metadatas"]
+
+    os.remove(legacy_path)
+    print(f"Перенесено {len(texts)} чанков, {legacy_path} удален")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate(sys.argv[2] if len(sys.argv) > 2 else "vector_db")
+    else:
+        print(__doc__)